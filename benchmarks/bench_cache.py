@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+渲染缓存基准：/convert 冷转换 vs 内存命中 vs 磁盘命中
+
+    python benchmarks/bench_cache.py [--repeat 5]
+"""
+
+import argparse
+import os
+import tempfile
+from io import BytesIO
+
+os.environ.setdefault('MD2E_CACHE_DIR', tempfile.mkdtemp(prefix='md2e-bench-cache-'))
+
+from common import corpus_files, fmt_ms, timeit
+import server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--format', default='html', choices=['html', 'docx'])
+    args = parser.parse_args()
+    
+    client = server.app.test_client()
+    files = [(f.name, f.read_bytes()) for f in corpus_files()]
+    
+    def post_all(expect='hit'):
+        for name, data in files:
+            response = client.post('/convert', data={
+                'file': (BytesIO(data), name),
+                'format': args.format,
+            })
+            # HTML 是流式响应，读完响应体才会写入缓存
+            body = response.data
+            assert response.status_code == 200, body
+            assert response.headers['X-Render-Cache'] == expect, (name, expect)
+    
+    def cold():
+        server.render_cache.clear()
+        post_all('miss')
+    
+    def disk_only():
+        # 只清空内存层，强制从磁盘读取
+        with server.render_cache._lock:
+            server.render_cache._memory.clear()
+            server.render_cache._memory_bytes = 0
+        post_all()
+    
+    print(f'语料: {len(files)} 篇报告, 格式 {args.format}')
+    best, _ = timeit(cold, args.repeat)
+    print(f'  未命中（完整转换）: {fmt_ms(best)}')
+    best, _ = timeit(disk_only, args.repeat)
+    print(f'  磁盘命中:           {fmt_ms(best)}')
+    best, _ = timeit(post_all, args.repeat)
+    print(f'  内存命中:           {fmt_ms(best)}')
+    print(f'\n计数: {server.render_cache.stats()}')
+
+
+if __name__ == '__main__':
+    main()
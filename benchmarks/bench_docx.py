@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+DOCX 前端阶段基准：直接取 Markdown 元素树 vs 旧的 HTML 字符串 + BeautifulSoup
+
+旧实现先把 Markdown 序列化为 HTML 字符串，再用 html.parser 解析成 soup 后遍历；
+新实现直接遍历树处理器输出的 ElementTree。这里比较两者到“可遍历的树”为止的
+耗时与峰值内存（tracemalloc），并给出完整 to_docx 的耗时作参考。
+
+    python benchmarks/bench_docx.py [--scale 8] [--repeat 3]
+"""
+
+import argparse
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from common import fmt_ms, load_corpus, timeit
+from converter import MarkdownConverter
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=8, help='语料拼接倍数')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    converter = MarkdownConverter()
+    document = '\n\n'.join(text for _, text in load_corpus() * args.scale)
+    
+    def tree_path():
+        with converter._pool.borrow() as md:
+            converter._markdown_tree(md, document)
+    
+    def soup_path():
+        html = converter._convert_markdown(document)
+        BeautifulSoup(html, 'html.parser')
+    
+    size_kb = len(document.encode('utf-8')) / 1024
+    print(f'文档大小: {size_kb:.0f} KB')
+    for label, func in (('元素树（新）', tree_path), ('HTML + soup（旧）', soup_path)):
+        best, _ = timeit(func, args.repeat)
+        peak = peak_memory(func) / 1024 / 1024
+        print(f'  {label:<16} {fmt_ms(best)}  峰值内存 {peak:7.1f} MB')
+    
+    best, _ = timeit(lambda: converter.to_docx(document), args.repeat)
+    print(f'  完整 to_docx       {fmt_ms(best)}')
+
+
+if __name__ == '__main__':
+    main()
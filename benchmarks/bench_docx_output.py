@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+DOCX 输出方式基准：返回 BytesIO vs 直接写入文件 / 响应
+
+命令行：旧实现 to_docx() 得到 BytesIO，再 read() 出一份 bytes 写入文件；
+新实现 to_docx(md, out=路径) 直接写文件。
+Web 服务：OUTPUT_SPOOL_THRESHOLD 设得很大时输出整份留在内存（相当于旧实现：
+render() 的 bytes + send_file 的 BytesIO）；默认 1 MB 时大输出落盘，用 send_file 发送。
+
+只统计 Python 堆的峰值（tracemalloc，不含 lxml 的 C 内存），即各种方式多出来的
+输出拷贝；用 --compression 0 只存储不压缩时输出更大，差别更明显。
+
+    python benchmarks/bench_docx_output.py [--copies 4] [--compression 0] [--repeat 3]
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import tracemalloc
+
+from common import fmt_ms, load_corpus, timeit
+
+
+def peak(func):
+    """运行 func，返回 Python 堆峰值（MB）"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--copies', type=int, default=4, help='语料重复次数')
+    parser.add_argument('--compression', type=int, default=0, help='DOCX 压缩级别')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='md2e-bench-output-')
+    os.environ['MD2E_CACHE_DIR'] = cache_dir
+    from server import app, converter, render_cache
+
+    md_content = '\n\n'.join([text for _, text in load_corpus()] * args.copies)
+    converter.docx_compression = args.compression
+    output_size = len(converter.to_docx(md_content).getvalue())
+    print(f'输入 {len(md_content.encode("utf-8")) / 1024:.0f} KB，'
+          f'DOCX {output_size / 1024 / 1024:.2f} MB（压缩级别 {args.compression}）\n')
+
+    path = os.path.join(cache_dir, 'out.docx')
+
+    def legacy_cli():
+        docx_bytes = converter.to_docx(md_content)
+        with open(path, 'wb') as f:
+            f.write(docx_bytes.read())
+
+    def direct_cli():
+        converter.to_docx(md_content, out=path)
+
+    print(f'{"命令行":<20}{"耗时":>12}{"Python 堆峰值":>16}')
+    for label, func in (('BytesIO + read()', legacy_cli), ('out=路径', direct_cli)):
+        best, _ = timeit(func, args.repeat)
+        print(f'  {label:<18}{fmt_ms(best)}{peak(func):>12.1f} MB')
+
+    client = app.test_client()
+    counter = iter(range(1 << 30))
+
+    def request():
+        # 每次内容不同，保证都是未命中缓存的真实转换
+        body = f'{md_content}\n\n{next(counter)}'.encode('utf-8')
+        response = client.post('/convert', data={'file': (io.BytesIO(body), 'big.md'),
+                                                  'format': 'docx'})
+        for _ in response.response:   # 逐块读取，不在测试端拼出完整响应
+            pass
+        response.close()
+
+    print(f'\n{"Web 服务 /convert":<20}{"耗时":>12}{"Python 堆峰值":>16}')
+    for label, threshold in (('输出留在内存', 1 << 40), ('落盘 + send_file', 1024 * 1024)):
+        app.config['OUTPUT_SPOOL_THRESHOLD'] = threshold
+        best, _ = timeit(request, args.repeat)
+        print(f'  {label:<18}{fmt_ms(best)}{peak(request):>12.1f} MB')
+    render_cache.clear()
+
+
+if __name__ == '__main__':
+    main()
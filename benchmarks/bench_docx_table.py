@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+DOCX 大表格基准：一次生成全部行的 XML vs 逐个单元格调用 python-docx
+
+旧实现先 add_table(rows, cols) 再通过 row.cells 逐个设置单元格文本，
+python-docx 每次访问 row.cells 都重新遍历整个表格，耗时随行数平方增长；
+新实现（DocxTreeWriter._add_table）一次拼出全部 <w:tr> 再解析挂到表格下。
+这里分别对 10、1000、10000 行的表格计时（含新建文档），给出每行耗时以观察是否线性。
+
+    python benchmarks/bench_docx_table.py [--rows 10 1000 10000] [--cols 5] [--legacy-max-rows 1000]
+"""
+
+import argparse
+import xml.etree.ElementTree as etree
+
+from common import fmt_ms, timeit
+from docx_writer import DocxTreeWriter, TABLE_STYLE, new_document
+
+
+class _EmptyStash:
+    rawHtmlBlocks = []
+
+
+def table_element(rows, cols):
+    """与 tables 扩展输出结构相同的 <table> 元素"""
+    table = etree.Element('table')
+    for r in range(rows + 1):
+        tr = etree.SubElement(etree.SubElement(table, 'thead' if r == 0 else 'tbody'), 'tr')
+        for c in range(cols):
+            cell = etree.SubElement(tr, 'th' if r == 0 else 'td')
+            cell.text = f'列{c}' if r == 0 else f'第{r}行 {c} 值'
+    return table
+
+
+def bulk(element):
+    doc = new_document()
+    DocxTreeWriter(doc, _EmptyStash())._add_table(element)
+
+
+def legacy(element):
+    doc = new_document()
+    rows = DocxTreeWriter(doc, _EmptyStash())._table_rows(element)
+    cols = len(rows[0])
+    table = doc.add_table(rows=len(rows), cols=cols, style=TABLE_STYLE)
+    for row, cells in zip(table.rows, rows):
+        for table_cell, text in zip(row.cells, cells[:cols]):
+            table_cell.text = text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--cols', type=int, default=5)
+    parser.add_argument('--legacy-max-rows', type=int, default=1000,
+                        help='旧实现只测不超过此行数的表格（10000 行需要数分钟）')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    new_document()   # 预先生成样式模板
+    print(f'{"行数":>8}{"批量生成":>14}{"每行":>12}{"逐个单元格":>16}{"每行":>12}')
+    for rows in args.rows:
+        element = table_element(rows, args.cols)
+        best, _ = timeit(lambda: bulk(element), args.repeat)
+        line = f'{rows:>10}{fmt_ms(best):>16}{best / rows * 1e6:>10.1f} us'
+        if rows <= args.legacy_max_rows:
+            old, _ = timeit(lambda: legacy(element), args.repeat)
+            line += f'{fmt_ms(old):>16}{old / rows * 1e6:>10.1f} us'
+        else:
+            line += f'{"（跳过）":>14}'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+DOCX 模板与保存基准
+
+新建文档：旧实现每次从模板 .docx 字节重新打开（解压、解析全部部件，含 350 KB 的
+styles.xml）；新实现深拷贝内存中只保留用到的样式的模板。
+保存：旧实现 doc.save（完整模板，deflate 默认级别）；新实现 save_document，
+分别测默认级别、0（只存储）、1 和 9 的耗时与体积。
+
+    python benchmarks/bench_docx_template.py [--repeat 20]
+"""
+
+import argparse
+from io import BytesIO
+
+from docx import Document
+
+from common import fmt_ms, load_corpus, timeit
+from docx_writer import DocxTreeWriter, _define_styles, new_document, save_document
+from converter import MarkdownConverter
+
+LEVELS = (None, 0, 1, 9)
+
+
+def legacy_template_bytes():
+    """旧的模板：python-docx 默认模板 + 自定义样式，不删减"""
+    doc = Document()
+    _define_styles(doc)
+    output = BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+
+def filled(converter, new_doc, texts):
+    """把每篇语料写入 new_doc() 新建的文档"""
+    docs = []
+    for text in texts:
+        doc = new_doc()
+        with converter._pool.borrow() as md:
+            root = converter._markdown_tree(md, text)
+            DocxTreeWriter(doc, md.htmlStash).write(root)
+        docs.append(doc)
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    converter = MarkdownConverter()
+    texts = [text for _, text in load_corpus()]
+    template = legacy_template_bytes()
+    new_document()   # 预先生成模板
+
+    def legacy_new():
+        return Document(BytesIO(template))
+
+    print('新建文档')
+    for label, func in (('重新打开模板（旧）', legacy_new), ('复制内存模板（新）', new_document)):
+        best, _ = timeit(func, args.repeat)
+        print(f'  {label:<16}{fmt_ms(best)}')
+
+    print(f'\n保存 {len(texts)} 篇语料（合计）')
+    legacy_docs = filled(converter, legacy_new, texts)
+
+    def legacy_save():
+        sizes = []
+        for doc in legacy_docs:
+            output = BytesIO()
+            doc.save(output)
+            sizes.append(len(output.getvalue()))
+        return sum(sizes)
+
+    best, _ = timeit(legacy_save, args.repeat)
+    print(f'  {"doc.save（旧）":<16}{fmt_ms(best)}{legacy_save() / 1024:>10.1f} KB')
+
+    docs = filled(converter, new_document, texts)
+    for level in LEVELS:
+        def save():
+            size = 0
+            for doc in docs:
+                output = BytesIO()
+                save_document(doc, output, level)
+                size += len(output.getvalue())
+            return size
+
+        best, _ = timeit(save, args.repeat)
+        label = '默认' if level is None else ('0（只存储）' if level == 0 else str(level))
+        print(f'  {"级别 " + label:<16}{fmt_ms(best)}{save() / 1024:>10.1f} KB')
+
+    print('\n完整 to_docx（合计）')
+    for level in LEVELS:
+        converter.docx_compression = level
+        best, _ = timeit(lambda: [converter.to_docx(text) for text in texts], args.repeat)
+        label = '默认' if level is None else str(level)
+        print(f'  {"级别 " + label:<16}{fmt_ms(best)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+代码高亮缓存基准：含代码块的文档在关闭缓存、首次转换（冷缓存）和重复转换
+（热缓存）三种情况下的 HTML 转换耗时，并检查三种情况输出完全一致
+
+    python benchmarks/bench_highlight.py
+"""
+
+import re
+import time
+
+from common import fmt_ms, load_corpus, timeit
+from converter import MarkdownConverter
+from highlight_cache import highlight_cache, warm_up
+
+FENCE_RE = re.compile(r'^(?:```|~~~)', re.MULTILINE)
+
+
+def main():
+    converter = MarkdownConverter()
+    corpus = [(name, text) for name, text in load_corpus()
+              if len(FENCE_RE.findall(text)) >= 4]
+    warm_up()
+    max_entries = highlight_cache.max_entries
+
+    print(f'{"文档":<36}{"代码块":>6}{"关闭缓存":>12}{"冷缓存":>12}{"热缓存":>12}')
+    totals = [0.0, 0.0, 0.0]
+    for name, text in corpus:
+        blocks = len(FENCE_RE.findall(text)) // 2
+
+        highlight_cache.max_entries = 0
+        off, _ = timeit(lambda: converter.to_html(text, title=name))
+        expected = converter.to_html(text, title=name)
+
+        highlight_cache.max_entries = max_entries
+        highlight_cache.clear()
+        start = time.perf_counter()
+        cold_output = converter.to_html(text, title=name)
+        cold = time.perf_counter() - start
+        warm, _ = timeit(lambda: converter.to_html(text, title=name))
+        assert cold_output == expected == converter.to_html(text, title=name), name
+
+        for i, value in enumerate((off, cold, warm)):
+            totals[i] += value
+        print(f'{name[:34]:<36}{blocks:>6}{fmt_ms(off):>12}{fmt_ms(cold):>12}{fmt_ms(warm):>12}')
+
+    print(f'{"合计":<36}{"":>6}' + ''.join(f'{fmt_ms(t):>12}' for t in totals))
+    print(f'\n热缓存相对关闭缓存提速 {totals[0] / totals[2]:.2f}x，输出一致')
+    print(f'缓存统计: {highlight_cache.stats()}')
+
+
+if __name__ == '__main__':
+    main()
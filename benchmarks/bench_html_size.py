@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+HTML 体积基准：内嵌样式 / 外置样式 / 外置样式 + 压缩 的单文档体积（含 gzip 后体积）
+
+    python benchmarks/bench_html_size.py
+"""
+
+import gzip
+
+from common import load_corpus
+from converter import HTML_ASSETS, MarkdownConverter
+
+MODES = (
+    ('内嵌', {}),
+    ('外置', {'stylesheet': 'external'}),
+    ('外置+压缩', {'stylesheet': 'external', 'minify': True}),
+)
+
+
+def main():
+    converter = MarkdownConverter()
+    totals = {label: [0, 0] for label, _ in MODES}
+    
+    print(f'{"文档":<36}' + ''.join(f'{label:>18}' for label, _ in MODES))
+    for name, text in load_corpus():
+        row = f'{name[:34]:<36}'
+        for label, options in MODES:
+            data = converter.to_html(text, title=name, **options).encode('utf-8')
+            packed = len(gzip.compress(data))
+            totals[label][0] += len(data)
+            totals[label][1] += packed
+            row += f'{len(data) / 1024:>9.1f}K/{packed / 1024:>6.1f}K'
+        print(row)
+    
+    print(f'{"合计（原始/gzip）":<36}' + ''.join(
+        f'{raw / 1024:>9.1f}K/{packed / 1024:>6.1f}K' for raw, packed in totals.values()))
+    shared = sum(len(data) for data, _ in HTML_ASSETS.values())
+    print(f'\n外置资源（浏览器缓存后各文档共享）: {shared / 1024:.1f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+HTML 输出基准：to_html().encode() 整体输出 vs iter_html 流式输出
+
+比较首字节时间、总耗时与峰值内存（tracemalloc）。
+
+    python benchmarks/bench_html_stream.py [--scale 8] [--repeat 3]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from common import fmt_ms, load_corpus, timeit
+from converter import MarkdownConverter
+
+
+def measure(func):
+    """返回 (首字节耗时, 总耗时, 峰值内存)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    for _ in func():
+        if first is None:
+            first = time.perf_counter() - start
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=8, help='语料拼接倍数')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    converter = MarkdownConverter()
+    document = '\n\n'.join(text for _, text in load_corpus() * args.scale)
+    print(f'文档大小: {len(document.encode("utf-8")) / 1024:.0f} KB')
+    
+    def whole():
+        yield converter.to_html(document).encode('utf-8')
+    
+    def streamed():
+        return converter.iter_html(document)
+    
+    for label, func in (('整体 to_html', whole), ('流式 iter_html', streamed)):
+        first, total, peak = measure(func)
+        print(f'  {label:<14} 首字节 {fmt_ms(first)}  总计 {fmt_ms(total)}  '
+              f'峰值内存 {peak / 1024 / 1024:6.1f} MB')
+    
+    best, _ = timeit(lambda: converter._get_html_template('', 'Document'), 1000)
+    print(f'\n页面外壳拼接: {best * 1e6:.1f} µs/次')
+
+
+if __name__ == '__main__':
+    main()
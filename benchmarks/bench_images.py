@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地图片嵌入基准
+
+在临时目录中用 Pillow 生成若干张全屏截图大小的 PNG 和一个在每节重复引用的 logo，
+测量：
+- 读取 + 缩放：逐张串行 vs 线程池并行（都不用磁盘缓存）；
+- 磁盘缓存：冷启动（缩放并写入缓存） vs 热缓存（新的 ImageLoader 直接读缓存）；
+- to_docx：不嵌入 vs 嵌入（热缓存）的耗时和输出大小，以及去重后的图片部件数。
+
+    python benchmarks/bench_images.py [--images 12] [--sections 40] [--repeat 3]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+from PIL import Image, ImageDraw
+
+from common import fmt_ms, timeit
+from converter import MarkdownConverter
+from image_embed import ImageLoader
+
+
+def make_images(directory, count):
+    """生成 count 张 2560x1440 的“截图”和一个 128x128 的 logo，返回截图文件名列表"""
+    names = []
+    for i in range(count):
+        img = Image.new('RGB', (2560, 1440), (245, 246, 250))
+        draw = ImageDraw.Draw(img)
+        for y in range(0, 1440, 24):
+            draw.rectangle((40, y + 4, 40 + (y * 7 + i * 131) % 2400, y + 16),
+                           fill=((y + i * 40) % 200, 120, 200))
+        name = f'screenshot-{i}.png'
+        img.save(os.path.join(directory, name))
+        names.append(name)
+    Image.new('RGB', (128, 128), (102, 126, 234)).save(os.path.join(directory, 'logo.png'))
+    return names
+
+
+def make_markdown(names, sections):
+    parts = ['# 图片报告\n']
+    for i in range(sections):
+        parts.append(f'## 第 {i + 1} 节\n\n![logo](logo.png)\n\n说明文字 {i}。\n')
+        parts.append(f'![截图]({names[i % len(names)]})\n')
+    return '\n'.join(parts)
+
+
+def media_parts(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return sum(1 for name in archive.namelist() if name.startswith('word/media/'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', type=int, default=12)
+    parser.add_argument('--sections', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp(prefix='md2e-bench-images-')
+    cache_root = tempfile.mkdtemp(prefix='md2e-bench-image-cache-')
+    try:
+        names = make_images(base_dir, args.images)
+        paths = [os.path.join(base_dir, name) for name in names]
+        md_content = make_markdown(names, args.sections)
+        print(f'{args.images} 张 2560x1440 截图 + 1 个 logo，{args.sections} 节'
+              f'（共引用 {2 * args.sections} 次）\n')
+
+        print('读取 + 缩放（无磁盘缓存）')
+        # 每次新建 ImageLoader（内存缓存为 0），保证每轮都真正解码、缩放
+        def serial():
+            loader = ImageLoader(max_memory_bytes=0)
+            for path in paths:
+                loader.load(path)
+
+        def parallel():
+            ImageLoader(max_memory_bytes=0).load_all(paths)
+
+        for label, func in (('串行', serial), ('线程池', parallel)):
+            best, _ = timeit(func, args.repeat)
+            print(f'  {label:<12}{fmt_ms(best)}')
+
+        print('\n磁盘缓存')
+        counter = iter(range(1 << 30))
+
+        def cold():
+            directory = os.path.join(cache_root, f'cold-{next(counter)}')
+            ImageLoader(cache_dir=directory, max_memory_bytes=0).load_all(paths)
+
+        warm_dir = os.path.join(cache_root, 'warm')
+        ImageLoader(cache_dir=warm_dir).load_all(paths)
+
+        def warm():
+            ImageLoader(cache_dir=warm_dir, max_memory_bytes=0).load_all(paths)
+
+        for label, func in (('冷（缩放+写入）', cold), ('热（读缓存）', warm)):
+            best, _ = timeit(func, args.repeat)
+            print(f'  {label:<12}{fmt_ms(best)}')
+
+        print('\nto_docx')
+        converter = MarkdownConverter(image_loader=ImageLoader(cache_dir=warm_dir))
+        for label, kwargs in (('不嵌入', {}), ('嵌入', {'base_dir': base_dir})):
+            best, _ = timeit(lambda: converter.to_docx(md_content, **kwargs), args.repeat)
+            data = converter.to_docx(md_content, **kwargs).getvalue()
+            print(f'  {label:<12}{fmt_ms(best)}{len(data) / 1024:>10.1f} KB'
+                  f'{media_parts(data):>6} 个图片部件')
+        original = sum(os.path.getsize(path) for path in paths)
+        print(f'\n截图原始大小合计 {original / 1024:.1f} KB')
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
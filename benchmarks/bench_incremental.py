@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+增量渲染基准：整篇重渲染 vs 修改一个段落后的增量渲染
+
+    python benchmarks/bench_incremental.py [--scales 1 4 16] [--repeat 5]
+"""
+
+import argparse
+
+from common import fmt_ms, load_corpus, timeit
+from converter import IncrementalRenderer, MarkdownConverter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16],
+                        help='把语料拼接多少遍作为测试文档')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    corpus = '\n\n'.join(text for _, text in load_corpus())
+    converter = MarkdownConverter()
+    
+    print(f'{"规模":>6} {"大小":>10} {"整篇渲染":>12} {"增量(编辑后)":>14} {"重渲染块":>10}')
+    for scale in args.scales:
+        document = '\n\n'.join([corpus] * scale)
+        renderer = IncrementalRenderer(converter, max_blocks=1 << 20)
+        renderer.to_html(document)
+        
+        edits = iter(range(10 ** 9))
+        
+        def edit_and_render():
+            # 每次在文档中部追加不同的一句话，模拟一次小编辑
+            middle = len(document) // 2
+            cut = document.index('\n\n', middle)
+            edited = f'{document[:cut]} 编辑{next(edits)}{document[cut:]}'
+            renderer.to_html(edited)
+        
+        full, _ = timeit(lambda: converter.to_html(document), args.repeat)
+        incremental, _ = timeit(edit_and_render, args.repeat)
+        stats = renderer.last_stats
+        print(f'{scale:>6} {len(document.encode("utf-8")) / 1024:>8.0f}KB '
+              f'{fmt_ms(full):>12} {fmt_ms(incremental):>14} '
+              f'{stats["rendered"]:>4}/{stats["blocks"]}')
+
+
+if __name__ == '__main__':
+    main()
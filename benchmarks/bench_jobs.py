@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异步任务基准：突发并发下同步 /convert 与 /jobs 的对比
+
+同步接口中每个请求的响应时间包含排队和转换；/jobs 提交只做接收和入队，
+转换完成时间由本地回调桩（一个只记录收到时间的 HTTP 服务）统计。
+
+    python benchmarks/bench_jobs.py [-n 并发请求数] [-f docx]
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import load_corpus
+from werkzeug.serving import make_server
+
+
+class CallbackStub(BaseHTTPRequestHandler):
+    """记录每个任务回调到达的时间"""
+    received = {}
+    done = threading.Condition()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.done:
+            self.received[body['id']] = (time.perf_counter(), body['status'])
+            self.done.notify_all()
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def _post(url, fields, name, data):
+    """发送 multipart 表单，返回 (状态码, 响应体)"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for key, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n'
+                     f'{value}\r\n'.encode('utf-8'))
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                 f'filename="{name}"\r\nContent-Type: text/markdown\r\n\r\n'.encode('utf-8'))
+    parts.append(data + f'\r\n--{boundary}--\r\n'.encode('utf-8'))
+    req = urllib.request.Request(url, data=b''.join(parts), method='POST', headers={
+        'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        return resp.status, resp.read()
+
+
+def _percentiles(values):
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(p * len(values)))]
+    return f'p50 {pick(0.5) * 1000:8.1f} ms   p95 {pick(0.95) * 1000:8.1f} ms   ' \
+           f'max {values[-1] * 1000:8.1f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--requests', type=int, default=32, help='突发请求数')
+    parser.add_argument('-f', '--format', default='docx', choices=['html', 'docx', 'pdf'])
+    args = parser.parse_args()
+
+    from server import app, job_queue, render_cache
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    job_queue.max_pending = max(job_queue.max_pending, args.requests)
+    # 回调桩在本机，默认只允许公网回调地址
+    job_queue.callback_hosts = {'127.0.0.1'}
+    server = _serve(make_server('127.0.0.1', 0, app, threaded=True))
+    stub = _serve(ThreadingHTTPServer(('127.0.0.1', 0), CallbackStub))
+    base = f'http://127.0.0.1:{server.server_port}'
+    callback_url = f'http://127.0.0.1:{stub.server_port}/done'
+
+    corpus = load_corpus()
+    # 文件名带序号，避免命中渲染缓存
+    uploads = [(f'{i}-{name}', text.encode('utf-8'))
+               for i, (name, text) in enumerate(corpus * (args.requests // len(corpus) + 1))
+               ][:args.requests]
+    print(f'{args.requests} 个并发请求，格式 {args.format}\n')
+
+    # 同步 /convert：响应时间 = 等待 + 转换
+    render_cache.clear()
+    def sync(upload):
+        start = time.perf_counter()
+        _post(base + '/convert', {'format': args.format}, *upload)
+        return time.perf_counter() - start
+    with ThreadPoolExecutor(max_workers=args.requests) as pool:
+        latencies = list(pool.map(sync, uploads))
+    print(f'同步 /convert 响应时间   {_percentiles(latencies)}')
+
+    # 异步 /jobs：提交响应时间只包含接收和入队
+    render_cache.clear()
+    submitted = {}
+    def submit(upload):
+        start = time.perf_counter()
+        status, body = _post(base + '/jobs', {'format': args.format,
+                                              'callback_url': callback_url}, *upload)
+        job_id = json.loads(body)['id']
+        submitted[job_id] = start
+        return time.perf_counter() - start
+    burst_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.requests) as pool:
+        latencies = list(pool.map(submit, uploads))
+    print(f'异步 /jobs 提交响应时间  {_percentiles(latencies)}')
+
+    with CallbackStub.done:
+        while not all(job_id in CallbackStub.received for job_id in submitted):
+            CallbackStub.done.wait(60)
+    completions = [CallbackStub.received[job_id][0] - start
+                   for job_id, start in submitted.items()]
+    failed = sum(status != 'done' for _, status in CallbackStub.received.values())
+    print(f'异步 /jobs 完成（回调）  {_percentiles(completions)}')
+    print(f'\n全部完成耗时 {time.perf_counter() - burst_start:.2f} s，失败 {failed} 个，'
+          f'工作线程 {app.config["JOB_WORKERS"]} 个')
+
+    server.shutdown()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
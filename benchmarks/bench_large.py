@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+大文档模式基准：整篇转换 vs 分块转换的耗时与内存峰值（RSS）
+
+用仓库自带的报告拼接出指定大小的文档，每种组合在单独的子进程中运行，
+报告子进程的 ru_maxrss（峰值常驻内存，含解释器和依赖库，基线见“仅导入”一行）。
+整篇转换的耗时随文档大小超线性增长（部分 Markdown 处理器是平方复杂度），
+默认只对不超过 --whole-max-mb 的文档运行。
+
+    python benchmarks/bench_large.py [--sizes 1 4 16] [--formats html docx] [--whole-max-mb 4]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, load_corpus
+
+
+def synthetic_document(path, size_mb):
+    """按顺序拼接整篇语料直到不小于 size_mb，直接写入文件"""
+    corpus = [text for _, text in load_corpus()]
+    target = size_mb * 1024 * 1024
+    size, i = 0, 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while size < target:
+            text = corpus[i % len(corpus)] + '\n\n'
+            f.write(text)
+            size += len(text.encode('utf-8'))
+            i += 1
+
+
+def child(mode, fmt, source, output):
+    """子进程：转换一次，输出 {"seconds", "peak_mb"}"""
+    sys.path.insert(0, str(ROOT))
+    from converter import MarkdownConverter
+    import large_document
+
+    converter = MarkdownConverter()
+    if mode == 'import':
+        import docx_writer  # noqa: F401  与 DOCX 转换相同的依赖
+        seconds = 0.0
+    else:
+        start = time.perf_counter()
+        if mode == 'whole':
+            with open(source, 'rb') as f:
+                md_content = f.read().decode('utf-8')
+            data = converter.render(md_content, fmt)
+            with open(output, 'wb') as f:
+                f.write(data)
+        else:
+            with large_document.open_source(source) as data, open(output, 'wb') as out:
+                if fmt == 'html':
+                    large_document.write_html(converter, data, out)
+                else:
+                    large_document.write_docx(converter, data, out)
+        seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # Linux 下单位为 KB
+    print(json.dumps({'seconds': seconds, 'peak_mb': peak_mb}))
+
+
+def run(mode, fmt, source, output):
+    result = subprocess.run(
+        [sys.executable, __file__, '--child', mode, fmt, source, output],
+        capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--formats', nargs='+', choices=['html', 'docx'], default=['html', 'docx'])
+    parser.add_argument('--whole-max-mb', type=float, default=4)
+    parser.add_argument('--child', nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    with tempfile.TemporaryDirectory(prefix='md2e-bench-large-') as tmp:
+        output = os.path.join(tmp, 'out')
+        base = run('import', 'html', '', output)
+        print(f'仅导入：峰值 RSS {base["peak_mb"]:.1f} MB\n')
+        print(f'{"大小":>8}{"格式":>6}{"整篇耗时":>12}{"整篇峰值":>12}{"分块耗时":>12}{"分块峰值":>12}')
+        for size_mb in args.sizes:
+            source = os.path.join(tmp, f'doc-{size_mb}.md')
+            synthetic_document(source, size_mb)
+            for fmt in args.formats:
+                line = f'{size_mb:>8g}MB{fmt:>6}'
+                if size_mb <= args.whole_max_mb:
+                    whole = run('whole', fmt, source, output)
+                    line += f'{whole["seconds"]:>12.2f}s{whole["peak_mb"]:>10.1f}MB'
+                else:
+                    line += f'{"（跳过）":>12}{"":>12}'
+                chunked = run('chunked', fmt, source, output)
+                line += f'{chunked["seconds"]:>12.2f}s{chunked["peak_mb"]:>10.1f}MB'
+                print(line, flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Mermaid 处理基准：Markdown 管道内一次处理 vs 旧的 BeautifulSoup 二次解析
+
+旧实现在 to_html 生成 HTML 后再用 html.parser 整体解析一遍并 str(soup)，
+这里用同样的往返来模拟旧路径的额外开销。
+
+    python benchmarks/bench_mermaid.py [--repeat 5]
+"""
+
+import argparse
+
+from bs4 import BeautifulSoup
+
+from common import fmt_ms, load_corpus, timeit
+from converter import MarkdownConverter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    converter = MarkdownConverter()
+    print(f'{"文档":<36} {"Mermaid":>7} {"单次解析":>12} {"旧: +soup 往返":>16} {"节省":>6}')
+    total_new = total_old = 0
+    for name, text in load_corpus():
+        mermaid_blocks = text.count('```mermaid')
+        
+        def new_path():
+            converter.to_html(text, title=name)
+        
+        def old_path():
+            body = converter._convert_markdown(text)
+            body = str(BeautifulSoup(body, 'html.parser'))
+            converter._get_html_template(body, name)
+        
+        new, _ = timeit(new_path, args.repeat)
+        old, _ = timeit(old_path, args.repeat)
+        total_new += new
+        total_old += old
+        print(f'{name[:34]:<36} {mermaid_blocks:>7} {fmt_ms(new):>12} {fmt_ms(old):>16} '
+              f'{(old - new) / old:>6.1%}')
+    print(f'{"合计":<36} {"":>7} {fmt_ms(total_new):>12} {fmt_ms(total_old):>16} '
+          f'{(total_old - total_new) / total_old:>6.1%}')
+
+
+if __name__ == '__main__':
+    main()
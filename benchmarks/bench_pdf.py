@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PDF 基准：直接生成 PDF 与 HTML 导出的单文档耗时、吞吐和输出体积对比
+
+    MD2E_PDF_FONT=/path/to/font.ttf python benchmarks/bench_pdf.py
+
+PDF 中只嵌入用到的字形子集，最后一列给出嵌入完整字体文件时的体积作对照。
+"""
+
+import os
+import sys
+
+from common import fmt_ms, load_corpus, timeit
+from converter import MarkdownConverter
+from pdf_writer import find_cjk_font
+
+
+def main():
+    font_path = find_cjk_font()
+    if font_path is None:
+        print('未找到中文字体，请用环境变量 MD2E_PDF_FONT 指定字体文件')
+        return 1
+    font_size = os.path.getsize(font_path)
+
+    converter = MarkdownConverter()
+    corpus = load_corpus()
+    print(f'字体: {font_path}（{font_size / 1024 / 1024:.1f} MB）\n')
+    print(f'{"文档":<36}{"HTML":>12}{"PDF":>12}{"HTML 体积":>12}{"PDF 体积":>12}')
+
+    totals = {'html_time': 0, 'pdf_time': 0, 'html_size': 0, 'pdf_size': 0, 'input': 0}
+    for name, text in corpus:
+        html_time, _ = timeit(lambda: converter.to_html(text, title=name), repeat=3)
+        pdf_time, _ = timeit(lambda: converter.to_pdf(text, title=name), repeat=3)
+        html_size = len(converter.to_html(text, title=name).encode('utf-8'))
+        pdf_size = len(converter.to_pdf(text, title=name).getvalue())
+
+        totals['html_time'] += html_time
+        totals['pdf_time'] += pdf_time
+        totals['html_size'] += html_size
+        totals['pdf_size'] += pdf_size
+        totals['input'] += len(text.encode('utf-8'))
+        print(f'{name[:34]:<36}{fmt_ms(html_time):>12}{fmt_ms(pdf_time):>12}'
+              f'{html_size / 1024:>11.1f}K{pdf_size / 1024:>11.1f}K')
+
+    count = len(corpus)
+    mb = totals['input'] / 1024 / 1024
+    print(f'\n{"合计":<36}{fmt_ms(totals["html_time"]):>12}{fmt_ms(totals["pdf_time"]):>12}'
+          f'{totals["html_size"] / 1024:>11.1f}K{totals["pdf_size"] / 1024:>11.1f}K')
+    for label, key in (('HTML', 'html_time'), ('PDF', 'pdf_time')):
+        print(f'{label} 吞吐: {count / totals[key]:.1f} 文件/s，{mb / totals[key]:.2f} MB/s')
+    print(f'PDF 平均体积 {totals["pdf_size"] / count / 1024:.1f} KB；'
+          f'完整嵌入字体时每个文件至少 {font_size / 1024:.0f} KB')
+
+    # 字体加载是每个 PDF 的固定开销，空文档的耗时即为这部分
+    empty_time, _ = timeit(lambda: converter.to_pdf('.', title='empty'), repeat=3)
+    print(f'单个 PDF 的固定开销（加载字体 + 子集化）: {fmt_ms(empty_time).strip()}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
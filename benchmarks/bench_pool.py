@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+解析器池基准：每请求新建 MarkdownConverter vs 共享（池化）转换器
+
+    python benchmarks/bench_pool.py [--threads 8] [--repeat 5]
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from common import fmt_ms, load_corpus, timeit
+from converter import MarkdownConverter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    corpus = load_corpus()
+    shared = MarkdownConverter()
+    
+    # 正确性：并发结果必须与串行结果一致
+    expected = [MarkdownConverter().to_html(text, title=name) for name, text in corpus]
+    jobs = corpus * 4
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(lambda item: shared.to_html(item[1], title=item[0]), jobs))
+    mismatches = sum(1 for i, html in enumerate(results) if html != expected[i % len(corpus)])
+    print(f'并发一致性检查: {len(jobs)} 次转换, {mismatches} 次不一致')
+    
+    def per_request():
+        for name, text in corpus:
+            MarkdownConverter().to_html(text, title=name)
+    
+    def pooled():
+        for name, text in corpus:
+            shared.to_html(text, title=name)
+    
+    def setup_only():
+        MarkdownConverter()._convert_markdown('')
+    
+    print(f'\n语料: {len(corpus)} 篇报告, 串行 to_html 全部转换一遍')
+    best, mean = timeit(per_request, args.repeat)
+    print(f'  每请求新建转换器: 最短 {fmt_ms(best)}  平均 {fmt_ms(mean)}')
+    best_pooled, mean_pooled = timeit(pooled, args.repeat)
+    print(f'  共享池化转换器:   最短 {fmt_ms(best_pooled)}  平均 {fmt_ms(mean_pooled)}')
+    setup, _ = timeit(setup_only, args.repeat * 4)
+    print(f'\n单次解析器初始化开销: {fmt_ms(setup)} (池化后每请求节省)')
+    print(f'池中实际创建的解析器: {shared._pool.created}')
+
+
+if __name__ == '__main__':
+    main()
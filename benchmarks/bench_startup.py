@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+启动基准：命令行单文件转换的冷启动耗时
+
+    python benchmarks/bench_startup.py [-n 次数]
+
+每次都启动新的解释器进程，对比空解释器、import converter、
+`converter.py in.md out.html` 和 `out.docx` 的总耗时（取中位数），
+并用 -X importtime 列出 HTML 转换时导入最慢的顶层模块。
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, corpus_files
+
+# 只在对应格式中需要的重量级依赖
+HEAVY_MODULES = ('markdown', 'pygments', 'docx', 'lxml', 'bs4', 'fpdf')
+
+_CHECK_MODULES = (
+    'import sys, converter; converter.main(sys.argv[1:]); '
+    f'print("LOADED", *[m for m in {HEAVY_MODULES!r} if m in sys.modules])'
+)
+
+
+def _run(args):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr or result.stdout)
+    return elapsed, result
+
+
+def _median_ms(args, repeat):
+    _run(args)   # 预热：生成 .pyc，避免把编译时间算进去
+    return statistics.median(_run(args)[0] for _ in range(repeat)) * 1000
+
+
+def _top_imports(args, limit=8):
+    """-X importtime 中耗时最多的顶层导入（累计微秒）"""
+    _, result = _run(['-X', 'importtime', *args])
+    top = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):   # 只统计顶层（缩进最少）的导入
+            top.append((int(cumulative), name.strip()))
+    return sorted(top, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    source = str(corpus_files()[0])
+    out_dir = tempfile.mkdtemp(prefix='md2e-startup-')
+    html_out = os.path.join(out_dir, 'out.html')
+    docx_out = os.path.join(out_dir, 'out.docx')
+
+    cases = [
+        ('空解释器', ['-c', 'pass']),
+        ('import converter', ['-c', 'import converter']),
+        ('converter.py in.md out.html', ['converter.py', source, html_out]),
+        ('converter.py in.md out.docx', ['converter.py', source, docx_out]),
+    ]
+    print(f'每项 {args.repeat} 次取中位数\n')
+    for label, case in cases:
+        print(f'{label:<32}{_median_ms(case, args.repeat):>10.1f} ms')
+
+    for out in (html_out, docx_out):
+        _, result = _run(['-c', _CHECK_MODULES, source, out])
+        loaded = result.stdout.split('LOADED', 1)[1].split()
+        print(f'\n{os.path.basename(out)} 导入的重量级依赖: {", ".join(loaded) or "无"}')
+
+    print('\nout.html 耗时最多的顶层导入:')
+    for cumulative, name in _top_imports(['converter.py', source, html_out]):
+        print(f'  {name:<30}{cumulative / 1000:>8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+上传读取基准：一次性 read() + decode() 与分块读取、增量解码的 Python 堆峰值对比
+
+    python benchmarks/bench_upload.py [大小MB ...]
+
+两种方式最终都得到完整的 Markdown 文本；峰值减去文本本身的大小即为读取过程的额外开销。
+"""
+
+import sys
+import tracemalloc
+from io import BytesIO
+
+from common import load_corpus
+
+
+def _make_upload(size_mb):
+    corpus = '\n\n'.join(text for _, text in load_corpus()).encode('utf-8')
+    target = size_mb * 1024 * 1024
+    return (corpus * (target // len(corpus) + 1))[:target].decode('utf-8', 'ignore').encode('utf-8')
+
+
+def _measure(app, body, read):
+    with app.test_request_context('/convert', method='POST',
+                                  data={'file': (BytesIO(body), 'big.md')}):
+        tracemalloc.start()
+        text = read()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, sys.getsizeof(text)
+
+
+def main():
+    from flask import request
+    from server import _read_upload, app
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1, 8, 32]
+    app.config['MAX_CONTENT_LENGTH'] = max(sizes) * 2 * 1024 * 1024
+    print(f'{"上传":>8}{"文本":>10}{"read+decode 峰值":>20}{"分块读取 峰值":>18}')
+    for size_mb in sizes:
+        body = _make_upload(size_mb)
+        old_peak, text_size = _measure(
+            app, body, lambda: request.files['file'].read().decode('utf-8'))
+        new_peak, _ = _measure(app, body, lambda: _read_upload(request.files['file'])[1])
+        print(f'{size_mb:>6}MB{text_size / 1024 / 1024:>8.1f}MB'
+              f'{old_peak / 1024 / 1024:>18.1f}MB{new_peak / 1024 / 1024:>16.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
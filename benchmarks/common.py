@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试公共工具：语料加载与计时
+"""
+
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def corpus_files():
+    """仓库自带的 Markdown 报告（不含 README）"""
+    files = sorted(ROOT.glob('*.md')) + sorted(ROOT.glob('task*/*.md'))
+    return [f for f in files if f.name.lower() != 'readme.md']
+
+
+def load_corpus():
+    """返回 [(文件名, 内容)]"""
+    return [(f.name, f.read_text(encoding='utf-8')) for f in corpus_files()]
+
+
+def timeit(func, repeat=5):
+    """运行 repeat 次，返回 (最短耗时, 平均耗时)，单位秒"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times) / len(times)
+
+
+def fmt_ms(seconds):
+    return f'{seconds * 1000:8.2f} ms'
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准测试套件：仓库自带的报告语料 + 按大小合成的大文档，分阶段统计 to_html / to_docx
+的耗时，结果输出为 JSON，可与保存的基线比较
+
+    python benchmarks/run_suite.py -o baseline.json                 # 记录基线
+    python benchmarks/run_suite.py --baseline baseline.json         # 与基线比较
+    python benchmarks/run_suite.py --sizes 1 10 100 --formats html  # 更大的合成文档
+
+阶段（毫秒）：
+  HTML  mermaid（Mermaid 预处理）、parse（其余预处理 + 块解析 + 树处理器）、
+        serialize（序列化 + 后处理器）、templating（套用页面外壳）
+  DOCX  mermaid、parse（同上，到元素树为止）、document（新建文档、默认样式）、
+        walk（遍历元素树写入文档）、save（doc.save）
+阶段耗时来自 MarkdownConverter.timed()，JSON 中另有 <格式>_stages 给出每个
+Markdown 处理器的耗时。每个阶段取多次运行中的最短耗时；每次运行前清空代码高亮缓存。
+
+合成文档按文件名顺序拼接整篇语料直到达到指定大小，内容固定，可在不同机器、
+不同版本之间比较。python-markdown 的 fenced_code 预处理每替换一个代码块都从头
+重新搜索全文，耗时随文档大小平方增长：1 MB 的 HTML 约 3 秒，10 MB 约 5 分钟，
+100 MB 实际上跑不完，所以默认只测 1 MB，更大的文档用 --sizes 指定。
+"""
+
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+
+from common import ROOT, load_corpus
+
+import converter as converter_module
+from converter import MarkdownConverter
+from highlight_cache import highlight_cache
+
+HTML_STAGES = ('mermaid', 'parse', 'serialize', 'templating')
+DOCX_STAGES = ('mermaid', 'parse', 'document', 'walk', 'save')
+
+
+# 转换器的阶段名 -> 汇总表中的阶段
+STAGE_GROUPS = {
+    'markdown.preprocessor.mermaid': 'mermaid',
+    'markdown.serialize': 'serialize',
+    'html.template': 'templating',
+    'docx.document': 'document',
+    'docx.walk': 'walk',
+    'docx.save': 'save',
+}
+
+
+def _group(stage):
+    if stage in STAGE_GROUPS:
+        return STAGE_GROUPS[stage]
+    if stage.startswith('markdown.postprocessor.'):
+        return 'serialize'
+    return 'parse'
+
+
+def run_once(converter, fmt, text, title):
+    """转换一次，返回 {转换器阶段: 秒}，另加 total"""
+    highlight_cache.clear()
+    gc.collect()
+    with converter.timed() as stages:
+        start = time.perf_counter()
+        if fmt == 'html':
+            converter.to_html(text, title=title)
+        else:
+            converter.to_docx(text)
+        stages['total'] = time.perf_counter() - start
+    return stages
+
+
+def measure(converter, name, text, formats, repeat):
+    """返回 {'bytes': 输入字节数, 格式: {汇总阶段: 毫秒}, 格式_stages: {转换器阶段: 毫秒}}"""
+    result = {'bytes': len(text.encode('utf-8'))}
+    for fmt in formats:
+        runs = [run_once(converter, fmt, text, name) for _ in range(repeat)]
+        detail = {stage: min(run.get(stage, 0.0) for run in runs) for stage in runs[0]}
+
+        groups = dict.fromkeys(HTML_STAGES if fmt == 'html' else DOCX_STAGES, 0.0)
+        for stage, seconds in detail.items():
+            if stage != 'total':
+                groups[_group(stage)] += seconds
+        groups['total'] = detail.pop('total')
+
+        result[fmt] = {stage: round(seconds * 1000, 3) for stage, seconds in groups.items()}
+        result[f'{fmt}_stages'] = {stage: round(seconds * 1000, 3)
+                                   for stage, seconds in detail.items()}
+    return result
+
+
+def synthetic_document(corpus, size_mb):
+    """按顺序拼接整篇语料直到不小于 size_mb（不截断文档，避免切开代码块）"""
+    target = size_mb * 1024 * 1024
+    parts, size, i = [], 0, 0
+    while size < target:
+        text = corpus[i % len(corpus)][1]
+        parts.append(text)
+        size += len(text.encode('utf-8')) + 2
+        i += 1
+    return '\n\n'.join(parts)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(args):
+    versions = {}
+    for package in ('Markdown', 'python-docx', 'Pygments', 'lxml'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git': _git_revision(),
+        'output_version': converter_module.OUTPUT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'packages': versions,
+        'repeat': args.repeat,
+        'synthetic_repeat': args.synthetic_repeat,
+    }
+
+
+def compare(current, baseline, threshold, min_delta_ms):
+    """返回超过阈值的回退 [(文档, 格式, 阶段, 基线毫秒, 当前毫秒)]"""
+    regressions = []
+    for name, result in current['documents'].items():
+        base = baseline.get('documents', {}).get(name)
+        if base is None:
+            continue
+        if base['bytes'] != result['bytes']:
+            print(f'跳过 {name}：输入大小与基线不同', file=sys.stderr)
+            continue
+        for fmt, stages in result.items():
+            if fmt == 'bytes' or fmt not in base:
+                continue
+            for stage, value in stages.items():
+                old = base[fmt].get(stage)
+                if old is None:
+                    continue
+                if value > old * (1 + threshold) and value - old > min_delta_ms:
+                    regressions.append((name, fmt, stage, old, value))
+    return regressions
+
+
+def print_summary(results, formats):
+    for fmt in formats:
+        stages = (HTML_STAGES if fmt == 'html' else DOCX_STAGES) + ('total',)
+        print(f'\n[{fmt}]' + ''.join(f'{stage:>12}' for stage in stages), file=sys.stderr)
+        for name, result in results.items():
+            row = ''.join(f'{result[fmt][stage]:>12.1f}' for stage in stages)
+            print(f'{name[:30]:<32}{row}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分阶段的转换基准测试套件')
+    parser.add_argument('-o', '--output', help='把 JSON 结果写入文件（默认输出到标准输出）')
+    parser.add_argument('--baseline', help='与该 JSON 基线比较，有回退时退出码为 1')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='超过基线的比例视为回退（默认 0.15，即 15%%）')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='绝对差值小于此值的阶段不算回退（默认 1 ms）')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1],
+                        help='合成文档大小（MB），默认 1；不写数字则不测合成文档')
+    parser.add_argument('--formats', nargs='+', choices=['html', 'docx'],
+                        default=['html', 'docx'])
+    parser.add_argument('--repeat', type=int, default=5, help='语料文档的运行次数')
+    parser.add_argument('--synthetic-repeat', type=int, default=1, help='合成文档的运行次数')
+    args = parser.parse_args()
+
+    converter = MarkdownConverter()
+    corpus = load_corpus()
+    results = {}
+    for name, text in corpus:
+        results[name] = measure(converter, name, text, args.formats, args.repeat)
+    for size_mb in args.sizes:
+        name = f'synthetic-{size_mb}MB'
+        print(f'{name} ...', file=sys.stderr)
+        results[name] = measure(converter, name, synthetic_document(corpus, size_mb),
+                                args.formats, args.synthetic_repeat)
+
+    report = {'environment': environment(args), 'documents': results}
+    print_summary(results, args.formats)
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        print(f'\n与基线 {args.baseline} 比较（阈值 {args.threshold:.0%}）：', file=sys.stderr)
+        for name, fmt, stage, old, new in regressions:
+            print(f'  回退 {name} {fmt}.{stage}: {old:.1f} ms -> {new:.1f} ms '
+                  f'(+{(new / old - 1) if old else float("inf"):.0%})', file=sys.stderr)
+        if regressions:
+            return 1
+        print('  没有超过阈值的回退', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
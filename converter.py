@@ -2,64 +2,124 @@
 # -*- coding: utf-8 -*-
 """
 Markdown 转换工具 - 简化版
-支持 HTML 和 DOCX 导出，PDF 通过浏览器打印实现
+支持 HTML、DOCX 和 PDF 导出（PDF 由 fpdf2 直接生成，不需要浏览器）
 """
 
+import hashlib
 import re
-import markdown
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from html import escape as html_escape
 from io import BytesIO
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
-from docx.oxml.ns import qn
-from bs4 import BeautifulSoup
 
 
-class MarkdownConverter:
-    """Markdown 转换器"""
-    
-    def __init__(self):
-        self.md = markdown.Markdown(
-            extensions=[
-                'extra',
-                'codehilite',
-                'tables',
-                'toc',
-                'fenced_code',
-                'attr_list',
-            ],
-            extension_configs={
-                'codehilite': {
-                    'linenums': False,
-                    'guess_lang': False,
-                },
-            }
-        )
+# 输出版本：HTML/DOCX 的输出内容有变化时递增，使已缓存的旧结果失效
+OUTPUT_VERSION = 7
+
+MARKDOWN_EXTENSIONS = [
+    'extra',
+    'codehilite',
+    'tables',
+    'toc',
+    'fenced_code',
+    'attr_list',
+]
+
+MARKDOWN_EXTENSION_CONFIGS = {
+    'codehilite': {
+        'linenums': False,
+        'guess_lang': False,
+    },
+}
+
+
+def _new_markdown():
+    """创建一个加载好全部扩展的 markdown.Markdown 实例
+
+    markdown 及其扩展在第一次转换时才导入，不做转换的命令（如批量转换时
+    全部文件未修改）不需要付出导入开销。
+    """
+    import markdown
+    import highlight_cache
+    from mermaid_ext import MermaidExtension
     
-    def _get_html_template(self, content, title="Document"):
-        """生成完整的 HTML 文档"""
-        return f"""<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
-    <style>
-        @page {{
+    # 代码块高亮结果跨文档复用（输出不变）
+    highlight_cache.install()
+    return markdown.Markdown(
+        extensions=MARKDOWN_EXTENSIONS + [MermaidExtension()],
+        extension_configs=MARKDOWN_EXTENSION_CONFIGS,
+    )
+
+
+def _reset_markdown(md):
+    """清除一次转换留下的全部状态
+
+    md.reset() 不会移除 abbr 扩展为每条缩写定义注册的行内模式（abbr-<缩写>），
+    不移除的话定义会带到之后的文档中，注册表也会无限增长。
+    """
+    md.reset()
+    for item in list(md.inlinePatterns._priority):
+        if item.name.startswith('abbr-'):
+            md.inlinePatterns.deregister(item.name)
+
+
+class MarkdownPool:
+    """markdown.Markdown 实例池（线程安全）
+
+    markdown.Markdown 实例带有解析状态，不能被多个线程同时使用；
+    但每次新建都要重新加载扩展。池中实例借出时独占，归还前自动重置
+    （包括 reset() 不会清除的缩写定义）。
+    """
+    
+    def __init__(self, factory=_new_markdown, max_idle=8):
+        self._factory = factory
+        self._max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self.created = 0
+    
+    @contextmanager
+    def borrow(self):
+        """借出一个实例，with 块结束时重置并归还"""
+        with self._lock:
+            md = self._idle.pop() if self._idle else None
+            if md is None:
+                self.created += 1
+        if md is None:
+            md = self._factory()
+        try:
+            yield md
+        finally:
+            _reset_markdown(md)
+            with self._lock:
+                if len(self._idle) < self._max_idle:
+                    self._idle.append(md)
+
+
+# ---------------------------------------------------------------------------
+# HTML 页面外壳：样式、工具栏和脚本与文档内容无关，模块加载时拼好并编码一次
+# ---------------------------------------------------------------------------
+
+HTML_STYLE = """
+        @page {
             size: A4;
             margin: 2cm;
-        }}
+        }
         
-        @media print {{
-            body {{
+        @media print {
+            body {
                 padding: 0;
                 background: white;
-            }}
-            .no-print {{
+            }
+            .no-print {
                 display: none;
-            }}
-        }}
+            }
+        }
         
-        body {{
+        body {
             font-family: "Microsoft YaHei", "SimSun", Arial, sans-serif;
             line-height: 1.8;
             color: #333;
@@ -68,16 +128,16 @@ class MarkdownConverter:
             margin: 0 auto;
             padding: 40px 20px;
             background: #f8f9fa;
-        }}
+        }
         
-        .container {{
+        .container {
             background: white;
             padding: 40px;
             box-shadow: 0 2px 8px rgba(0,0,0,0.1);
             border-radius: 8px;
-        }}
+        }
         
-        .toolbar {{
+        .toolbar {
             position: fixed;
             top: 20px;
             right: 20px;
@@ -86,9 +146,9 @@ class MarkdownConverter:
             border-radius: 8px;
             box-shadow: 0 4px 12px rgba(0,0,0,0.15);
             z-index: 1000;
-        }}
+        }
         
-        .btn {{
+        .btn {
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             color: white;
             border: none;
@@ -98,13 +158,13 @@ class MarkdownConverter:
             font-size: 14px;
             font-weight: 600;
             transition: transform 0.2s;
-        }}
+        }
         
-        .btn:hover {{
+        .btn:hover {
             transform: translateY(-2px);
-        }}
+        }
         
-        h1 {{
+        h1 {
             font-size: 2.2em;
             color: #667eea;
             border-bottom: 3px solid #667eea;
@@ -112,9 +172,9 @@ class MarkdownConverter:
             margin-top: 1.5em;
             margin-bottom: 0.8em;
             page-break-after: avoid;
-        }}
+        }
         
-        h2 {{
+        h2 {
             font-size: 1.8em;
             color: #495057;
             border-bottom: 2px solid #e9ecef;
@@ -122,72 +182,72 @@ class MarkdownConverter:
             margin-top: 1.3em;
             margin-bottom: 0.6em;
             page-break-after: avoid;
-        }}
+        }
         
-        h3 {{
+        h3 {
             font-size: 1.4em;
             color: #6c757d;
             margin-top: 1.2em;
             margin-bottom: 0.5em;
             page-break-after: avoid;
-        }}
+        }
         
-        h4 {{
+        h4 {
             font-size: 1.1em;
             color: #868e96;
             margin-top: 1em;
             margin-bottom: 0.4em;
-        }}
+        }
         
-        p {{
+        p {
             margin-bottom: 0.8em;
             text-align: justify;
-        }}
+        }
         
-        ul, ol {{
+        ul, ol {
             margin-bottom: 1em;
             padding-left: 2em;
-        }}
+        }
         
-        li {{
+        li {
             margin-bottom: 0.4em;
-        }}
+        }
         
-        table {{
+        table {
             width: 100%;
             border-collapse: collapse;
             margin: 1.5em 0;
             page-break-inside: avoid;
-        }}
+        }
         
-        table th {{
+        table th {
             background: #667eea;
             color: white;
             padding: 10px;
             text-align: left;
             font-weight: 600;
             border: 1px solid #5568d3;
-        }}
+        }
         
-        table td {{
+        table td {
             padding: 8px 10px;
             border: 1px solid #e9ecef;
-        }}
+        }
         
-        table tr:nth-child(even) {{
+        table tr:nth-child(even) {
             background: #f8f9fa;
-        }}
+        }
         
-        code {{
+        code {
             background: #f4f4f4;
             padding: 2px 6px;
             border-radius: 3px;
             font-family: 'Consolas', 'Monaco', monospace;
             font-size: 0.9em;
             color: #e83e8c;
-        }}
+        }
         
-        pre {{
+        pre {
             background: #f8f9fa;
             border: 1px solid #e9ecef;
             border-left: 4px solid #667eea;
@@ -196,39 +256,39 @@ class MarkdownConverter:
             overflow-x: auto;
             margin: 1.5em 0;
             page-break-inside: avoid;
-        }}
+        }
         
-        pre code {{
+        pre code {
             background: transparent;
             padding: 0;
             color: #333;
             font-size: 0.85em;
             line-height: 1.5;
-        }}
+        }
         
-        blockquote {{
+        blockquote {
             border-left: 4px solid #667eea;
             padding-left: 20px;
             margin: 1.5em 0;
             color: #6c757d;
             font-style: italic;
-        }}
+        }
         
-        img {{
+        img {
             max-width: 100%;
             height: auto;
             display: block;
             margin: 1.5em auto;
             page-break-inside: avoid;
-        }}
+        }
         
-        hr {{
+        hr {
             border: none;
             border-top: 2px solid #e9ecef;
             margin: 2em 0;
-        }}
+        }
         
-        .mermaid-note {{
+        .mermaid-note {
             text-align: center;
             padding: 20px;
             margin: 1.5em 0;
@@ -237,8 +297,36 @@ class MarkdownConverter:
             border-radius: 8px;
             color: #856404;
             font-weight: 600;
-        }}
-    </style>
+        }
+        
+        .mermaid-diagram {
+            text-align: center;
+            margin: 1.5em 0;
+        }
+        
+        .mermaid-diagram img {
+            max-width: 100%;
+        }
+"""
+
+HTML_SCRIPT = """
+        // 键盘快捷键：Ctrl+P 打印
+        document.addEventListener('keydown', function(e) {
+            if ((e.ctrlKey || e.metaKey) && e.key === 'p') {
+                e.preventDefault();
+                window.print();
+            }
+        });
+"""
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>"""
+
+_HTML_BODY_START = """
 </head>
 <body>
     <div class="toolbar no-print">
@@ -246,186 +334,1082 @@ class MarkdownConverter:
     </div>
     
     <div class="container">
-        {content}
+        """
+
+_HTML_BODY_END = """
     </div>
     
-    <script>
-        // 键盘快捷键：Ctrl+P 打印
-        document.addEventListener('keydown', function(e) {{
-            if ((e.ctrlKey || e.metaKey) && e.key === 'p') {{
-                e.preventDefault();
-                window.print();
-            }}
-        }});
-    </script>
+"""
+
+_HTML_END = """
 </body>
 </html>
 """
+
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE_RE = re.compile(r'\s*([{}:;,])\s*')
+_WHITESPACE_RE = re.compile(r'\s+')
+_SHELL_GAP_RE = re.compile(r'>\s+<')
+_PRE_RE = re.compile(r'(<pre[\s>].*?</pre>)', re.S)
+_BLOCK_GAP_RE = re.compile(
+    r'>\s+<(?=/?(?:p|div|h[1-6]|ul|ol|li|table|thead|tbody|tr|th|td|'
+    r'blockquote|pre|hr|dl|dt|dd)[\s/>])')
+
+
+def minify_css(css):
+    """去掉注释和多余空白"""
+    css = _CSS_COMMENT_RE.sub('', css)
+    css = _WHITESPACE_RE.sub(' ', css)
+    css = _CSS_SPACE_RE.sub(r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """去掉整行注释和缩进（仅用于本模块内置的简单脚本）"""
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def minify_html(body):
+    """去掉块级标签之间的空白；<pre> 内容和行内元素之间的空白保持不变"""
+    parts = _PRE_RE.split(body)
+    for i in range(0, len(parts), 2):
+        parts[i] = _BLOCK_GAP_RE.sub('><', parts[i])
+    return ''.join(parts).strip()
+
+
+# 外置资源：内容哈希命名，内容不变则文件名不变，可被浏览器永久缓存
+def _asset_name(stem, ext, data):
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}.{ext}'
+
+
+_STYLESHEET_BYTES = minify_css(HTML_STYLE).encode('utf-8')
+_SCRIPT_BYTES = minify_js(HTML_SCRIPT).encode('utf-8')
+STYLESHEET_ASSET = _asset_name('md2everything', 'css', _STYLESHEET_BYTES)
+SCRIPT_ASSET = _asset_name('md2everything', 'js', _SCRIPT_BYTES)
+
+# 资源名 -> (内容, MIME 类型)
+HTML_ASSETS = {
+    STYLESHEET_ASSET: (_STYLESHEET_BYTES, 'text/css; charset=utf-8'),
+    SCRIPT_ASSET: (_SCRIPT_BYTES, 'application/javascript; charset=utf-8'),
+}
+
+DEFAULT_ASSET_URL = '/assets/'
+
+HtmlShell = namedtuple('HtmlShell', 'head head_end tail head_bytes head_end_bytes tail_bytes')
+
+
+@lru_cache(maxsize=32)
+def html_shell(stylesheet='inline', minify=False, asset_url=DEFAULT_ASSET_URL):
+    """页面外壳（标题前、标题后到正文前、正文后三段，同时给出 UTF-8 编码）
+
+    stylesheet='inline' 时样式和脚本内嵌在页面中；'external' 时改为引用
+    asset_url 下的哈希命名资源（见 HTML_ASSETS）。minify=True 时去掉外壳中的空白。
+    """
+    if stylesheet == 'external':
+        style = f'    <link rel="stylesheet" href="{asset_url}{STYLESHEET_ASSET}">'
+        script = f'    <script src="{asset_url}{SCRIPT_ASSET}"></script>'
+    elif minify:
+        style = f'<style>{minify_css(HTML_STYLE)}</style>'
+        script = f'<script>{minify_js(HTML_SCRIPT)}</script>'
+    else:
+        style = '    <style>' + HTML_STYLE + '    </style>'
+        script = '    <script>' + HTML_SCRIPT + '    </script>'
     
-    def _process_mermaid(self, html_content):
-        """处理 Mermaid 代码块"""
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        for code in soup.find_all('code', class_=re.compile(r'language-mermaid')):
-            note = soup.new_tag('div', **{'class': 'mermaid-note'})
-            note.string = '📊 Mermaid 图表（在前端版本 index.html 中可查看完整图表）'
-            
-            if code.parent and code.parent.name == 'pre':
-                code.parent.replace_with(note)
+    head = _HTML_HEAD
+    head_end = '</title>\n' + style + _HTML_BODY_START
+    tail = _HTML_BODY_END + script + _HTML_END
+    if minify:
+        head, head_end, tail = (_SHELL_GAP_RE.sub('><', part).strip()
+                                for part in (head, head_end, tail))
+    return HtmlShell(head, head_end, tail,
+                     head.encode('utf-8'), head_end.encode('utf-8'), tail.encode('utf-8'))
+
+
+# iter_html 每次产出的正文字符数
+HTML_CHUNK_SIZE = 64 * 1024
+
+
+def _registry_items(registry):
+    """按执行顺序返回 Markdown 处理器注册表中的 [(注册名, 处理器)]"""
+    processors = list(registry)  # 迭代时按优先级排好序
+    return list(zip((name for name, _ in registry._priority), processors))
+
+
+# 当前线程中 MarkdownConverter.timed() 收集阶段耗时用的字典
+_thread_timings = threading.local()
+
+
+def _iter_encoded(head, html_body, tail):
+    yield head
+    for i in range(0, len(html_body), HTML_CHUNK_SIZE):
+        yield html_body[i:i + HTML_CHUNK_SIZE].encode('utf-8')
+    yield tail
+
+
+class MarkdownConverter:
+    """Markdown 转换器（线程安全，可在多个请求间共享）
+
+    转换的每个阶段（每个 Markdown 预处理器/树处理器/后处理器、块解析、
+    HTML 模板、DOCX/PDF 的生成和保存）都可计时：add_hook() 注册全局回调，
+    timed() 收集当前线程中的阶段耗时。两者都未使用时不计时。
+    """
+    
+    def __init__(self, pool_size=8, docx_compression=None, diagrams=None, image_loader=None):
+        self._pool = MarkdownPool(max_idle=pool_size)
+        self._hooks = []
+        # DOCX 的 zip 压缩级别：None 为默认 deflate，0 只存储不压缩（最快），1~9 为 deflate 级别
+        self.docx_compression = docx_compression
+        # 前端渲染好的 Mermaid 图表：get(图表源码哈希) 返回 {'svg'/'png': 字节}，None 表示不嵌入图片
+        self.diagrams = diagrams
+        # 本地图片的读取/缩放（image_embed.ImageLoader），None 时使用进程内共享的默认实例
+        self.image_loader = image_loader
+    
+    def add_hook(self, hook):
+        """注册计时回调 hook(stage, seconds)，每次转换的每个阶段结束时调用
+
+        阶段名形如 markdown.preprocessor.fenced_code_block、markdown.blockparser、
+        markdown.treeprocessor.inline、html.template、docx.walk、docx.save，
+        Markdown 处理器以扩展注册时的名字区分。回调可能在多个线程中同时调用。
+        """
+        self._hooks.append(hook)
+    
+    @contextmanager
+    def timed(self):
+        """收集当前线程在 with 块内所有转换的阶段耗时，产出 {阶段: 秒}"""
+        previous = getattr(_thread_timings, 'stages', None)
+        stages = _thread_timings.stages = {}
+        try:
+            yield stages
+        finally:
+            _thread_timings.stages = previous
+    
+    @contextmanager
+    def _stage(self, name):
+        stages = getattr(_thread_timings, 'stages', None)
+        if stages is None and not self._hooks:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if stages is not None:
+                stages[name] = stages.get(name, 0.0) + elapsed
+            for hook in self._hooks:
+                hook(name, elapsed)
+    
+    def cache_options(self):
+        """影响输出结果的转换器选项（作为渲染缓存键的一部分）"""
+        return {
+            'version': OUTPUT_VERSION,
+            'extensions': MARKDOWN_EXTENSIONS + ['mermaid'],
+            'extension_configs': MARKDOWN_EXTENSION_CONFIGS,
+        }
+    
+    def _convert_markdown(self, md_content, base_dir=None, embed_images=False):
+        """Markdown -> HTML 片段（从实例池借用解析器）"""
+        with self._pool.borrow() as md:
+            root = self._markdown_tree(md, md_content)
+            if root is None:
+                return ''
+            if embed_images and base_dir is not None:
+                images = self._load_images(root, base_dir)
+                for img in root.iter('img'):
+                    image = images.get(img.get('src'))
+                    if image is not None:
+                        img.set('src', image.data_uri)
+            return self._serialize(md, root)
+    
+    def _load_images(self, root, base_dir, html_stash=None):
+        """树中引用的本地图片 {src: EmbeddedImage}：相对路径相对 base_dir，并行读取、按内容去重
+
+        给出 html_stash 时也包括原始 HTML 中的 <img>（DOCX 需要；HTML 输出中原始 HTML 原样保留）。
+        base_dir 只应在转换本地文件时给出：src 可以是任意本地路径。
+        """
+        from image_embed import default_loader, local_path, raw_image_sources
         
-        return str(soup)
+        sources = [img.get('src') for img in root.iter('img')]
+        if html_stash is not None:
+            for item in html_stash.rawHtmlBlocks:
+                if isinstance(item, str):
+                    sources.extend(raw_image_sources(item))
+        paths = {}
+        for src in sources:
+            if src not in paths:
+                paths[src] = local_path(src, base_dir)
+        wanted = [path for path in paths.values() if path]
+        if not wanted:
+            return {}
+        with self._stage('images.load'):
+            loaded = (self.image_loader or default_loader()).load_all(wanted)
+        return {src: loaded[path] for src, path in paths.items() if path in loaded}
     
-    def to_html(self, md_content, title="Document"):
-        """转换为 HTML"""
-        html_body = self.md.convert(md_content)
-        html_body = self._process_mermaid(html_body)
-        html_full = self._get_html_template(html_body, title)
+    def _serialize(self, md, root):
+        """元素树 -> HTML 片段，步骤与 markdown.Markdown.convert() 后半段一致"""
+        with self._stage('markdown.serialize'):
+            output = md.serializer(root).strip()
+            if output.endswith('<%s />' % md.doc_tag):
+                output = ''
+            else:
+                start = output.index('<%s>' % md.doc_tag) + len(md.doc_tag) + 2
+                end = output.rindex('</%s>' % md.doc_tag)
+                output = output[start:end].strip()
+        for name, postprocessor in _registry_items(md.postprocessors):
+            with self._stage('markdown.postprocessor.' + name):
+                output = postprocessor.run(output)
+        return output.strip()
+    
+    def _get_html_template(self, content, title="Document", stylesheet='inline',
+                           minify=False, asset_url=DEFAULT_ASSET_URL):
+        """生成完整的 HTML 文档"""
+        shell = html_shell(stylesheet, minify, asset_url)
+        if minify:
+            content = minify_html(content)
+        return ''.join((shell.head, html_escape(title, quote=False),
+                        shell.head_end, content, shell.tail))
+    
+    def to_html(self, md_content, title="Document", stylesheet='inline',
+                minify=False, asset_url=DEFAULT_ASSET_URL, base_dir=None, embed_images=False):
+        """转换为 HTML
+
+        stylesheet='external' 时样式和脚本以 asset_url 下的哈希命名资源引用，
+        minify=True 时输出压缩后的 HTML。给出 base_dir（Markdown 文件所在目录）且
+        embed_images=True 时，本地图片以 data URI 嵌入，HTML 文件可以单独分发。
+        """
+        html_body = self._convert_markdown(md_content, base_dir, embed_images)
+        with self._stage('html.template'):
+            html_full = self._get_html_template(html_body, title, stylesheet, minify, asset_url)
         return html_full
     
-    def to_docx(self, md_content):
-        """转换为 DOCX（返回字节流）"""
-        doc = Document()
-        
-        # 设置默认字体
-        style = doc.styles['Normal']
-        style.font.name = 'Microsoft YaHei'
-        style._element.rPr.rFonts.set(qn('w:eastAsia'), 'Microsoft YaHei')
-        style.font.size = Pt(11)
-        
-        # 解析 Markdown
-        html = self.md.convert(md_content)
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # 处理元素
-        self._process_docx_element(doc, soup)
-        
-        # 保存到字节流
-        docx_bytes = BytesIO()
-        doc.save(docx_bytes)
-        docx_bytes.seek(0)
-        return docx_bytes
-    
-    def _process_docx_element(self, doc, element):
-        """递归处理 HTML 元素转 DOCX"""
-        for child in element.children:
-            if not hasattr(child, 'name') or not child.name:
+    def iter_html(self, md_content, title="Document", stylesheet='inline',
+                  minify=False, asset_url=DEFAULT_ASSET_URL, base_dir=None, embed_images=False):
+        """转换为 HTML，返回逐块产出 UTF-8 编码字节的迭代器（用于流式响应），参数同 to_html
+
+        转换在返回前完成，出错时直接抛出异常，不会发出半个页面；之后正文按
+        HTML_CHUNK_SIZE 分段编码，不会在内存中再拼出完整的 HTML 字符串或字节串。
+        """
+        shell = html_shell(stylesheet, minify, asset_url)
+        html_body = self._convert_markdown(md_content, base_dir, embed_images)
+        if minify:
+            html_body = minify_html(html_body)
+        head = shell.head_bytes + html_escape(title, quote=False).encode('utf-8') + shell.head_end_bytes
+        return _iter_encoded(head, html_body, shell.tail_bytes)
+    
+    def _markdown_tree(self, md, md_content):
+        """运行 Markdown 管道到树处理器为止，返回根 Element（不做 HTML 序列化）
+
+        步骤与 markdown.Markdown.convert() 前半段一致。返回的树中代码块等
+        仍是 htmlStash 占位符，必须在 md 被 reset() 之前使用。
+        """
+        if not md_content.strip():
+            return None
+        
+        md.mermaid_diagrams = self.diagrams
+        md.lines = md_content.split('\n')
+        for name, prep in _registry_items(md.preprocessors):
+            with self._stage('markdown.preprocessor.' + name):
+                md.lines = prep.run(md.lines)
+        
+        with self._stage('markdown.blockparser'):
+            root = md.parser.parseDocument(md.lines).getroot()
+        for name, treeprocessor in _registry_items(md.treeprocessors):
+            with self._stage('markdown.treeprocessor.' + name):
+                new_root = treeprocessor.run(root)
+            if new_root is not None:
+                root = new_root
+        return root
+    
+    def _new_docx_document(self):
+        """复制预先定义好样式的模板文档"""
+        # python-docx（连同 lxml）只在第一次导出 DOCX 时导入
+        from docx_writer import new_document
+        return new_document()
+    
+    def to_docx(self, md_content, base_dir=None, out=None):
+        """转换为 DOCX；给出 base_dir（Markdown 文件所在目录）时嵌入本地图片
+
+        out 为可写的二进制流或文件路径时直接写入并返回 out（流不需要支持 seek，
+        可以是响应流或管道）；不给出时返回包含完整文档的 BytesIO。
+        """
+        from docx_writer import DocxTreeWriter, save_document
+        
+        with self._stage('docx.document'):
+            doc = self._new_docx_document()
+        
+        # 直接遍历 Markdown 元素树生成文档
+        with self._pool.borrow() as md:
+            root = self._markdown_tree(md, md_content)
+            if root is not None:
+                images = (self._load_images(root, base_dir, md.htmlStash)
+                          if base_dir is not None else None)
+                with self._stage('docx.walk'):
+                    DocxTreeWriter(doc, md.htmlStash, self.diagrams, images).write(root)
+        
+        with self._stage('docx.save'):
+            if out is None:
+                docx_bytes = BytesIO()
+                save_document(doc, docx_bytes, self.docx_compression)
+                docx_bytes.seek(0)
+                return docx_bytes
+            if hasattr(out, 'write'):
+                save_document(doc, out, self.docx_compression)
+            else:
+                with open(out, 'wb') as f:
+                    save_document(doc, f, self.docx_compression)
+        return out
+    
+    def to_pdf(self, md_content, title="Document"):
+        """转换为 PDF（返回字节流）
+
+        需要 fpdf2 和一款中文字体（自动查找系统字体，或用环境变量
+        MD2E_PDF_FONT 指定），字体按文档实际用到的字形子集嵌入。
+        """
+        from pdf_writer import PdfTreeWriter, new_pdf
+        
+        with self._stage('pdf.document'):
+            pdf = new_pdf(title)
+        with self._pool.borrow() as md:
+            root = self._markdown_tree(md, md_content)
+            if root is not None:
+                with self._stage('pdf.walk'):
+                    PdfTreeWriter(pdf, md.htmlStash).write(root)
+        with self._stage('pdf.save'):
+            data = pdf.output()
+        return BytesIO(data)
+    
+    def render(self, md_content, fmt, title="Document", base_dir=None, **html_options):
+        """转换为指定格式（html / docx / pdf）的字节串，html_options 只对 HTML 有效
+
+        base_dir 为 Markdown 文件所在目录，用于嵌入本地图片（DOCX 总是嵌入，
+        HTML 需要 embed_images=True，PDF 暂不嵌入）。
+        """
+        if fmt == 'html':
+            return self.to_html(md_content, title=title, base_dir=base_dir,
+                                **html_options).encode('utf-8')
+        if fmt == 'pdf':
+            return self.to_pdf(md_content, title=title).getvalue()
+        if fmt == 'docx':
+            return self.to_docx(md_content, base_dir=base_dir).getvalue()
+        raise ValueError(f'不支持的格式: {fmt}')
+
+
+# ---------------------------------------------------------------------------
+# 增量渲染：按顶层块缓存 HTML，只重新渲染改动过的块
+# ---------------------------------------------------------------------------
+
+_FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+_DEFINITION_RE = re.compile(r'^ {0,3}\[(\^?)([^\]]+)\]:')
+_LIST_ITEM_RE = re.compile(r'^ {0,3}(?:[*+-]|\d+[.)])\s')
+_HTML_BLOCK_RE = re.compile(r'^<([a-zA-Z][a-zA-Z0-9-]*)[\s>]')
+_VOID_TAGS = {'br', 'hr', 'img', 'input', 'meta', 'link', 'source', 'col', 'wbr'}
+_FOOTNOTE_REF_RE = re.compile(r'\[\^([^\]\s]+)\](?!:)')
+_FOOTNOTE_SUP_RE = re.compile(
+    r'<sup id="fnref\d*:([^"]+)"><a class="footnote-ref" href="#fn:\1">\d+</a></sup>')
+_FOOTNOTE_ITEM_RE = re.compile(r'(?=<li id="fn:)')
+_FOOTNOTE_BACKREFS_RE = re.compile(
+    r'&#160;(?:<a class="footnote-backref"[^>]*>&#8617;</a>)+')
+_HEADING_RE = re.compile(
+    r'<h([1-6])([^>]*?) id="([^"]+)"([^>]*)>(.*?)</h\1>', re.S)
+_ID_COUNT_RE = re.compile(r'^(.*)_([0-9]+)$')
+_TAG_RE = re.compile(r'<[^>]+>')
+_TABLE_SEPARATOR_RE = re.compile(r'^ {0,3}\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)+\|?\s*$')
+_ATX_HEADING_RE = re.compile(r'^ {0,3}#{1,6}(?:\s|$)')
+# def_list 扩展的定义行（": 定义"）和 abbr 扩展的缩写定义（"*[缩写]: 全称"）
+_DEFINITION_ITEM_RE = re.compile(r'^ {0,3}:[ \t]', re.M)
+_ABBR_RE = re.compile(r'^\*\[[^\]]*\] ?:[ \t]*\S')
+# attr_list 扩展在行尾写明的 id（"# 标题 {#id}"），toc 扩展不会改写
+_ATTR_ID_RE = re.compile(r'\{:?[^}\n]*?#([^\s}#]+)[^}\n]*\}[ \t]*$', re.M)
+_TOC_MARKER = '[TOC]'
+_TOC_PLACEHOLDER = '\x02md2e-toc\x03'
+
+
+def _starts_new_block(line, block, in_list):
+    """空行后的 line 能否作为新顶层块的开头（不能则并入当前块）"""
+    if line[0] in ' \t':
+        return False  # 缩进：代码块或列表/脚注的续行
+    if in_list and _LIST_ITEM_RE.match(line):
+        return False  # 松散列表的下一项
+    if line.startswith('>') and block[0].startswith('>'):
+        return False
+    if block[0].startswith('<!--'):
+        # HTML 注释直到 --> 才结束，中间可以有空行
+        return '\n'.join(block).find('-->', 4) != -1
+    m = _HTML_BLOCK_RE.match(block[0])
+    if m and m.group(1).lower() not in _VOID_TAGS:
+        text = '\n'.join(block)
+        tag = m.group(1)
+        if text.count('</' + tag) < text.count('<' + tag):
+            return False  # 未闭合的 HTML 块可以跨越空行
+    return True
+
+
+def _collect_definitions(block, links, footnotes):
+    """收集块中的引用式链接定义和脚注定义，返回块是否只由定义组成
+
+    Markdown 在整个块中查找定义，定义也可以紧跟在段落行之后；这样的块按原样渲染，
+    其中的定义另外收集一份，供引用它们的其他块使用。
+    """
+    only = True
+    label = None      # 正在收集续行的脚注
+    in_link = False   # 链接定义的续行（缩进的标题）
+    fence = None
+    for line in block.split('\n'):
+        if fence:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                fence = None
+            continue
+        m = _DEFINITION_RE.match(line)
+        if m:
+            label = m.group(2) if m.group(1) else None
+            in_link = label is None
+            if in_link:
+                links.append(line)
+            else:
+                footnotes[label] = line
+        elif label is not None:
+            footnotes[label] += '\n' + line
+        elif in_link and (not line.strip() or line[0] in ' \t'):
+            links.append(line)
+        else:
+            only = in_link = False
+            f = _FENCE_RE.match(line)
+            if f:
+                fence = f.group(1)
+    return only
+
+
+def _merge_definition_lists(blocks):
+    """定义列表的术语、定义和后续条目之间可以隔着空行，把它们并回同一块
+
+    多并的块只是少了增量复用的机会，渲染结果不受影响。
+    """
+    merged = []
+    for i, block in enumerate(blocks):
+        if merged and (
+                _DEFINITION_ITEM_RE.match(block)
+                or (_DEFINITION_ITEM_RE.search(merged[-1]) and i + 1 < len(blocks)
+                    and _DEFINITION_ITEM_RE.match(blocks[i + 1]))):
+            merged[-1] += '\n\n' + block
+        else:
+            merged.append(block)
+    return merged
+
+
+def split_blocks(md_content):
+    """把 Markdown 源切分为顶层块
+
+    只在围栏代码块之外的空行处切分；缩进续行、松散列表、引用和未闭合的
+    HTML 块和 HTML 注释会并入上一块，定义列表的各部分并为一块。只由链接/脚注
+    定义组成的块被单独拆出，其他块中的定义另外收集一份，渲染时按需附加到引用
+    它们的块后面；缩写定义对全文生效，也收集到链接定义中（所在的块保持不变）。
+
+    返回 (blocks, link_definitions, footnotes)：footnotes 为按定义顺序
+    排列的 {标签: 定义源码}。
+    """
+    blocks = []
+    links = []
+    abbreviations = []
+    footnotes = OrderedDict()
+    current = []
+    fence = None
+    blank = False
+    in_list = False
+    
+    def flush():
+        text = '\n'.join(current).strip('\n')
+        if ']:' in text and _collect_definitions(text, links, footnotes):
+            return
+        if text:
+            blocks.append(text)
+    
+    for line in md_content.split('\n'):
+        if fence:
+            current.append(line)
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                fence = None
+            continue
+        if not line.strip():
+            if current:
+                blank = True
+                current.append('')
+            continue
+        if blank and _starts_new_block(line, current, in_list):
+            flush()
+            current = []
+            in_list = False
+        blank = False
+        current.append(line)
+        if _LIST_ITEM_RE.match(line):
+            in_list = True
+        elif _ABBR_RE.match(line):
+            abbreviations.append(line)
+        m = _FENCE_RE.match(line)
+        if m:
+            fence = m.group(1)
+    if current:
+        flush()
+    
+    return _merge_definition_lists(blocks), '\n'.join(links + abbreviations), footnotes
+
+
+def document_stats(md_content):
+    """文档统计：字符数、行数、顶层块、标题、表格、代码块和 Mermaid 图表的数量
+
+    只按行扫描源文本（围栏代码块内的内容不计），不经过 Markdown 解析。
+    """
+    stats = {
+        'chars': len(md_content),
+        'lines': md_content.count('\n') + 1,
+        'blocks': len(split_blocks(md_content)[0]),
+        'headings': 0,
+        'tables': 0,
+        'code_blocks': 0,
+        'mermaid_blocks': 0,
+    }
+    fence = None
+    for line in md_content.split('\n'):
+        if fence:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                fence = None
+            continue
+        m = _FENCE_RE.match(line)
+        if m:
+            fence = m.group(1)
+            info = line[m.end():].strip().lstrip('{.').lower()
+            stats['mermaid_blocks' if info.startswith('mermaid') else 'code_blocks'] += 1
+        elif _ATX_HEADING_RE.match(line):
+            stats['headings'] += 1
+        elif _TABLE_SEPARATOR_RE.match(line):
+            stats['tables'] += 1
+    return stats
+
+
+def _toc_html(headings):
+    """由 [(级别, id, 标题 HTML)] 生成与 toc 扩展相同结构的目录"""
+    root = []
+    stack = [(0, root)]
+    for level, heading_id, name in headings:
+        while len(stack) > 1 and level <= stack[-1][0]:
+            stack.pop()
+        node = (heading_id, _TAG_RE.sub('', name).strip(), [])
+        stack[-1][1].append(node)
+        stack.append((level, node[2]))
+    
+    def render(nodes):
+        if not nodes:
+            return ''
+        items = ''.join(
+            f'<li><a href="#{heading_id}">{name}</a>{render(children)}</li>\n'
+            for heading_id, name, children in nodes
+        )
+        return f'<ul>\n{items}</ul>\n'
+    
+    return f'<div class="toc">\n{render(root)}</div>'
+
+
+def _unique_id(heading_id, used, counters):
+    """与 toc 扩展的 unique() 结果相同，但记住每个前缀已用到的序号，避免重复 id 很多时退化为平方复杂度"""
+    if heading_id and heading_id not in used:
+        used.add(heading_id)
+        return heading_id
+    m = _ID_COUNT_RE.match(heading_id)
+    base, n = (m.group(1), int(m.group(2))) if m else (heading_id, 0)
+    n = max(n, counters.get(base, 0))
+    while True:
+        n += 1
+        candidate = f'{base}_{n}'
+        if candidate not in used:
+            break
+    counters[base] = n
+    used.add(candidate)
+    return candidate
+
+
+def explicit_ids(source):
+    """源码中用 attr_list 写明的 id"""
+    return set(_ATTR_ID_RE.findall(source)) if '#' in source else set()
+
+
+def _fix_heading_ids(parts, used=None, counters=None, explicit=None):
+    """跨块去重标题 id（与 toc 扩展的规则一致），返回目录所需的标题列表
+
+    分批调用时传入同一组 used / counters，已出现过的 id 在后续批次中继续去重。
+    explicit 为与 parts 一一对应的、各块源码中写明的 id（explicit_ids）：
+    与 toc 扩展相同，写明的 id 保持不变，生成的 id 避开它们。
+    """
+    used = set() if used is None else used
+    counters = {} if counters is None else counters
+    explicit = explicit or [set()] * len(parts)
+    used.update(*explicit)
+    headings = []
+    
+    def repl(m):
+        heading_id = m.group(3)
+        if heading_id not in declared:
+            heading_id = _unique_id(heading_id, used, counters)
+        headings.append((int(m.group(1)), heading_id, m.group(5)))
+        return (f'<h{m.group(1)}{m.group(2)} id="{heading_id}"{m.group(4)}>'
+                f'{m.group(5)}</h{m.group(1)}>')
+    
+    for i, part in enumerate(parts):
+        declared = explicit[i]
+        parts[i] = _HEADING_RE.sub(repl, part)
+    return headings
+
+
+class FootnoteMerger:
+    """合并分别渲染的各部分各自生成的脚注区：按定义顺序统一编号，引用 id 不重复，
+    全部脚注最后只输出一次，回链指向所有引用
+
+    各部分依次交给 strip()，最后用 render() 得到合并后的脚注区；
+    只保留脚注条目，不持有各部分的 HTML，可用于流式输出。
+    """
+    
+    def __init__(self, labels):
+        self.labels = list(labels)
+        self.numbers = {label: i + 1 for i, label in enumerate(self.labels)}
+        self.occurrences = {}
+        self.items = {}
+    
+    def strip(self, part):
+        """去掉 part 中的脚注区（条目留给 render），统一脚注引用的编号和 id"""
+        start = part.rfind('<div class="footnote">')
+        if start != -1:
+            for item in _FOOTNOTE_ITEM_RE.split(part[start:])[1:]:
+                label = item[len('<li id="fn:'):item.index('"', len('<li id="fn:'))]
+                self.items.setdefault(label, item[:item.rindex('</li>') + len('</li>')])
+            part = part[:start].rstrip()
+        return _FOOTNOTE_SUP_RE.sub(self._renumber, part)
+    
+    def missing(self):
+        """还没有得到条目的脚注标签（只有定义、没有被引用）"""
+        return [label for label in self.labels if label not in self.items]
+    
+    def render(self):
+        """合并后的脚注区 HTML，没有脚注时为空串"""
+        rendered = []
+        for label in self.labels:
+            item = self.items.get(label)
+            if item is None:
+                continue
+            number = self.numbers[label]
+            backrefs = ''.join(
+                f'<a class="footnote-backref" href="#{"fnref" if n == 1 else f"fnref{n}"}:{label}" '
+                f'title="Jump back to footnote {number} in the text">&#8617;</a>'
+                # 与 footnotes 扩展相同，没有被引用的脚注也带一个回链
+                for n in range(1, max(self.occurrences.get(label, 0), 1) + 1)
+            )
+            item = _FOOTNOTE_BACKREFS_RE.sub('', item)
+            if backrefs:
+                anchor = item.rfind('</p>')
+                if anchor == -1:
+                    anchor = item.rindex('</li>')
+                item = f'{item[:anchor]}&#160;{backrefs}{item[anchor:]}'
+            rendered.append(item)
+        if not rendered:
+            return ''
+        return ('<div class="footnote">\n<hr />\n<ol>\n'
+                + '\n'.join(rendered) + '\n</ol>\n</div>')
+    
+    def _renumber(self, m):
+        label = m.group(1)
+        count = self.occurrences[label] = self.occurrences.get(label, 0) + 1
+        ref_id = f'fnref:{label}' if count == 1 else f'fnref{count}:{label}'
+        return (f'<sup id="{ref_id}"><a class="footnote-ref" href="#fn:{label}">'
+                f'{self.numbers.get(label, 0)}</a></sup>')
+
+
+def _merge_footnotes(parts, labels):
+    """合并各块各自生成的脚注区，按定义顺序统一编号并重建回链"""
+    merger = FootnoteMerger(labels)
+    for i, part in enumerate(parts):
+        parts[i] = merger.strip(part)
+    footer = merger.render()
+    if footer:
+        parts.append(footer)
+
+
+class IncrementalRenderer:
+    """增量渲染器（实时预览 / 监听模式）
+
+    把文档切成顶层块，按内容哈希缓存每块的 HTML；再次渲染时只转换变动的块，
+    最后统一修正标题 id、[TOC] 和脚注编号。一个实例对应一个正在编辑的文档，
+    last_stats 记录最近一次渲染的块数、重新渲染数和复用数。
+    """
+    
+    def __init__(self, converter=None, max_blocks=4096):
+        self.converter = converter or MarkdownConverter()
+        self.max_blocks = max_blocks
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.last_stats = {'blocks': 0, 'rendered': 0, 'reused': 0}
+    
+    def _render_block(self, source, base_dir=None, embed_images=False):
+        if embed_images and base_dir is not None:
+            # 嵌入图片时输出与图片所在目录有关
+            source_key = f'{base_dir}\0{source}'
+        else:
+            source_key, base_dir = source, None
+        key = hashlib.sha1(source_key.encode('utf-8')).hexdigest()
+        with self._lock:
+            html = self._blocks.get(key)
+            if html is not None:
+                self._blocks.move_to_end(key)
+                return html, False
+        html = self.converter._convert_markdown(source, base_dir, embed_images)
+        with self._lock:
+            self._blocks[key] = html
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        return html, True
+    
+    def render_body(self, md_content, base_dir=None, embed_images=False):
+        """渲染 HTML 正文（不含页面模板），base_dir / embed_images 同 MarkdownConverter.to_html
+
+        块的缓存只按源码区分，嵌入图片时只修改了图片文件的块不会重新渲染。
+        """
+        blocks, links, footnotes = split_blocks(md_content)
+        parts = []
+        explicit = []
+        rendered = 0
+        has_toc = False
+        
+        for block in blocks:
+            if block.strip() == _TOC_MARKER:
+                parts.append(_TOC_PLACEHOLDER)
+                explicit.append(set())
+                has_toc = True
                 continue
             
-            if child.name in ['h1', 'h2', 'h3', 'h4']:
-                level = int(child.name[1])
-                heading = doc.add_heading(child.get_text().strip(), level=level)
-                
-                if level == 1:
-                    heading.runs[0].font.size = Pt(24)
-                    heading.runs[0].font.color.rgb = RGBColor(102, 126, 234)
-                elif level == 2:
-                    heading.runs[0].font.size = Pt(20)
-                    heading.runs[0].font.color.rgb = RGBColor(73, 80, 87)
-                elif level == 3:
-                    heading.runs[0].font.size = Pt(16)
-                    heading.runs[0].font.color.rgb = RGBColor(108, 117, 125)
-            
-            elif child.name == 'p':
-                text = child.get_text().strip()
-                if text:
-                    doc.add_paragraph(text)
-            
-            elif child.name in ['ul', 'ol']:
-                for li in child.find_all('li', recursive=False):
-                    para = doc.add_paragraph(li.get_text().strip())
-                    para.style = 'List Bullet' if child.name == 'ul' else 'List Number'
-            
-            elif child.name == 'table':
-                self._add_docx_table(doc, child)
-            
-            elif child.name == 'pre':
-                code = child.find('code')
-                if code:
-                    code_text = code.get_text()
-                    classes = code.get('class', [])
-                    
-                    # 检查是否为 Mermaid
-                    if any('mermaid' in str(c) for c in classes):
-                        para = doc.add_paragraph('📊 [Mermaid 图表 - 请在 HTML/前端版本查看]')
-                        para.runs[0].font.color.rgb = RGBColor(102, 126, 234)
-                        para.runs[0].font.bold = True
-                    else:
-                        para = doc.add_paragraph(code_text)
-                        para.paragraph_format.left_indent = Inches(0.5)
-                        para.runs[0].font.name = 'Consolas'
-                        para.runs[0].font.size = Pt(9)
-            
-            elif child.name == 'blockquote':
-                para = doc.add_paragraph(child.get_text().strip())
-                para.paragraph_format.left_indent = Inches(0.5)
-                para.runs[0].font.italic = True
-                para.runs[0].font.color.rgb = RGBColor(108, 117, 125)
+            # 块内引用的脚注定义和全部链接定义附加在块后一起渲染
+            extra = [footnotes[label] for label in
+                     OrderedDict.fromkeys(_FOOTNOTE_REF_RE.findall(block))
+                     if label in footnotes]
+            if links:
+                extra.append(links)
+            source = '\n\n'.join([block] + extra)
             
-            elif child.name == 'hr':
-                doc.add_paragraph('─' * 50)
-    
-    def _add_docx_table(self, doc, table_element):
-        """添加表格到 DOCX"""
-        rows = table_element.find_all('tr')
-        if not rows:
-            return
+            html, fresh = self._render_block(source, base_dir, embed_images)
+            rendered += fresh
+            if html:
+                parts.append(html)
+                explicit.append(explicit_ids(block))
+        
+        if footnotes:
+            _merge_footnotes(parts, list(footnotes))
+        explicit += [set()] * (len(parts) - len(explicit))
+        headings = _fix_heading_ids(parts, explicit=explicit)
+        body = '\n'.join(parts)
+        if has_toc:
+            body = body.replace(_TOC_PLACEHOLDER, _toc_html(headings))
         
-        first_row = rows[0]
-        cols = len(first_row.find_all(['th', 'td']))
-        
-        table = doc.add_table(rows=len(rows), cols=cols)
-        table.style = 'Light Grid Accent 1'
-        
-        for row_idx, row in enumerate(rows):
-            cells = row.find_all(['th', 'td'])
-            for col_idx, cell in enumerate(cells):
-                table_cell = table.rows[row_idx].cells[col_idx]
-                table_cell.text = cell.get_text().strip()
-                
-                if row_idx == 0:
-                    for paragraph in table_cell.paragraphs:
-                        for run in paragraph.runs:
-                            run.font.bold = True
-                            run.font.color.rgb = RGBColor(255, 255, 255)
-                    
-                    shading_elm = table_cell._element.get_or_add_tcPr()
-                    shading = shading_elm.get_or_add_shd()
-                    shading.set(qn('w:fill'), '667EEA')
+        self.last_stats = {
+            'blocks': len(blocks),
+            'rendered': rendered,
+            'reused': len(blocks) - rendered,
+        }
+        return body
+    
+    def to_html(self, md_content, title="Document", base_dir=None, embed_images=False,
+                **html_options):
+        """增量转换为完整 HTML，参数同 MarkdownConverter.to_html"""
+        return self.converter._get_html_template(
+            self.render_body(md_content, base_dir, embed_images), title, **html_options)
 
 
-if __name__ == '__main__':
+# ---------------------------------------------------------------------------
+# 命令行
+# ---------------------------------------------------------------------------
+
+OUTPUT_FORMATS = {'html': 'html', 'htm': 'html', 'docx': 'docx', 'doc': 'docx', 'pdf': 'pdf'}
+MANIFEST_NAME = '.md2everything-manifest.json'
+MARKDOWN_SUFFIXES = ('.md', '.markdown')
+# 命令行、批量转换对不小于此大小的文件自动使用大文档模式
+LARGE_DOCUMENT_BYTES = 8 * 1024 * 1024
+
+
+def convert_file(converter, input_file, output_file, title=None, embed_images=False):
+    """按输出文件扩展名转换单个文件，返回 (源文件 SHA-256, 字节数)
+
+    文件中引用的本地图片相对文件所在目录解析：DOCX 总是嵌入，HTML 在 embed_images 时以 data URI 嵌入。
+    不小于 LARGE_DOCUMENT_BYTES 的文件按大文档模式（large_document）分块转换，不整份读入内存。
+    """
+    import os
+    
+    fmt = OUTPUT_FORMATS.get(output_file.lower().rsplit('.', 1)[-1])
+    if fmt is None:
+        raise ValueError(f'不支持的格式: {output_file}')
+    if os.path.getsize(input_file) >= LARGE_DOCUMENT_BYTES:
+        from large_document import convert_large
+        return convert_large(converter, input_file, output_file, fmt, title, embed_images)
+    
+    with open(input_file, 'rb') as f:
+        raw = f.read()
+    md_content = raw.decode('utf-8')
+    base_dir = os.path.dirname(os.path.abspath(input_file))
+    
+    if fmt == 'html':
+        html = converter.to_html(md_content, title=title or input_file,
+                                 base_dir=base_dir, embed_images=embed_images)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(html)
+    elif fmt == 'pdf':
+        pdf_bytes = converter.to_pdf(md_content, title=title or input_file)
+        with open(output_file, 'wb') as f:
+            f.write(pdf_bytes.read())
+    else:
+        converter.to_docx(md_content, base_dir=base_dir, out=output_file)
+    return hashlib.sha256(raw).hexdigest(), len(raw)
+
+
+def collect_inputs(patterns):
+    """展开目录（递归查找 .md/.markdown）和通配符，返回 [(源文件, 相对输出路径)]"""
+    import glob
+    import os
+    
+    found = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for dirpath, _, filenames in os.walk(pattern):
+                for name in sorted(filenames):
+                    if name.lower().endswith(MARKDOWN_SUFFIXES):
+                        path = os.path.join(dirpath, name)
+                        found.setdefault(os.path.abspath(path), os.path.relpath(path, pattern))
+        else:
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path):
+                    found.setdefault(os.path.abspath(path), os.path.basename(path))
+    return sorted(found.items())
+
+
+# 批量转换的工作进程各自持有一个转换器
+_worker_converter = None
+
+
+def _batch_worker(job):
+    """工作进程：转换一个文件，返回 (源文件, 哈希, 耗时, 字节数, 错误信息)"""
+    global _worker_converter
+    
+    source, output, title, embed_images = job
+    start = time.perf_counter()
+    try:
+        if _worker_converter is None:
+            import highlight_cache
+            highlight_cache.warm_up()
+            _worker_converter = MarkdownConverter()
+        digest, size = convert_file(_worker_converter, source, output, title, embed_images)
+        return source, digest, time.perf_counter() - start, size, None
+    except Exception as e:
+        return source, None, time.perf_counter() - start, 0, f'{type(e).__name__}: {e}'
+
+
+def render_worker(job):
+    """工作进程：转换一份 Markdown 内容，返回 (名称, 输出字节, 耗时, 错误信息)
+
+    job 为 (名称, Markdown 原始字节, 格式, 标题, HTML 选项, Mermaid 图表图片)，
+    供 Web 服务的批量接口使用；图表图片为 {源码哈希: {类型: 字节}}。
+    """
+    global _worker_converter
+    
+    name, raw, fmt, title, html_options, diagrams = job
+    start = time.perf_counter()
+    try:
+        if _worker_converter is None:
+            import highlight_cache
+            highlight_cache.warm_up()
+            _worker_converter = MarkdownConverter()
+        # 工作进程一次只转换一个文件
+        _worker_converter.diagrams = diagrams or None
+        data = _worker_converter.render(raw.decode('utf-8'), fmt, title, **html_options)
+        return name, data, time.perf_counter() - start, None
+    except Exception as e:
+        return name, None, time.perf_counter() - start, f'{type(e).__name__}: {e}'
+
+
+def _load_manifest(path):
+    import json
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == OUTPUT_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': OUTPUT_VERSION, 'files': {}}
+
+
+def _save_manifest(path, manifest):
+    import json
+    import os
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _is_unchanged(entry, source, output, fmt, embed_images=False):
+    """与清单记录比较：mtime 和大小一致直接视为未变；否则比较内容哈希"""
+    import os
+    if (not entry or entry.get('format') != fmt
+            or entry.get('embed_images', False) != embed_images or not os.path.exists(output)):
+        return False
+    st = os.stat(source)
+    if entry.get('mtime') == st.st_mtime and entry.get('size') == st.st_size:
+        return True
+    with open(source, 'rb') as f:
+        if hashlib.sha256(f.read()).hexdigest() != entry.get('sha256'):
+            return False
+    entry['mtime'], entry['size'] = st.st_mtime, st.st_size
+    return True
+
+
+def batch_main(argv):
+    """批量转换：python converter.py batch <目录或通配符...> -o <输出目录>"""
+    import argparse
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    
+    parser = argparse.ArgumentParser(
+        prog='python converter.py batch',
+        description='批量转换 Markdown 文件（多进程，未修改的文件自动跳过）')
+    parser.add_argument('inputs', nargs='+', help='输入目录、文件或通配符')
+    parser.add_argument('-o', '--output-dir', required=True, help='输出目录')
+    parser.add_argument('-f', '--format', choices=['html', 'docx', 'pdf'], default='html')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='工作进程数（默认 CPU 核数，1 表示在当前进程转换）')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略清单，全部重新转换（只修改了引用的图片时使用）')
+    parser.add_argument('--embed-images', action='store_true',
+                        help='HTML 中以 data URI 嵌入本地图片（DOCX 总是嵌入）')
+    args = parser.parse_args(argv)
+    
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print('没有找到 Markdown 文件')
+        return 1
+    
+    outputs = {source: os.path.join(args.output_dir, os.path.splitext(rel)[0] + '.' + args.format)
+               for source, rel in inputs}
+    # 不同输入目录下的同名文件（或同目录的 x.md 与 x.markdown）会写到同一个输出文件
+    claimed = {}
+    for source, output in outputs.items():
+        claimed.setdefault(os.path.normcase(os.path.abspath(output)), []).append(source)
+    conflicts = [sources for sources in claimed.values() if len(sources) > 1]
+    if conflicts:
+        print('以下文件的输出路径相同，会互相覆盖；请分别转换到不同的输出目录：')
+        for sources in conflicts:
+            print(f'  {os.path.relpath(outputs[sources[0]])} ← '
+                  + '、'.join(os.path.relpath(source) for source in sources))
+        return 1
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path)
+    entries = manifest['files']
+    
+    jobs = []
+    skipped = 0
+    for source, _ in inputs:
+        output = outputs[source]
+        if not args.force and _is_unchanged(entries.get(source), source, output, args.format,
+                                            args.embed_images):
+            skipped += 1
+            continue
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        jobs.append((source, output, os.path.splitext(os.path.basename(source))[0],
+                     args.embed_images))
+    
+    print(f'共 {len(inputs)} 个文件：{len(jobs)} 个需要转换，{skipped} 个未修改已跳过'
+          f'（{args.workers} 个工作进程）')
+    
+    start = time.perf_counter()
+    if args.workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(jobs))) as pool:
+            results = list(pool.map(_batch_worker, jobs))
+    else:
+        results = [_batch_worker(job) for job in jobs]
+    elapsed = time.perf_counter() - start
+    
+    failed = 0
+    total_bytes = 0
+    for source, digest, seconds, size, error in sorted(results, key=lambda r: -r[2]):
+        name = os.path.relpath(source)
+        if error:
+            failed += 1
+            print(f'  ✗ {name}  {error}')
+            continue
+        total_bytes += size
+        st = os.stat(source)
+        entries[source] = {
+            'sha256': digest,
+            'mtime': st.st_mtime,
+            'size': st.st_size,
+            'format': args.format,
+            'embed_images': args.embed_images,
+            'output': outputs[source],
+        }
+        print(f'  ✓ {name}  {seconds * 1000:8.1f} ms  → {os.path.relpath(outputs[source])}')
+    _save_manifest(manifest_path, manifest)
+    
+    converted = len(results) - failed
+    print(f'\n完成：转换 {converted} 个，跳过 {skipped} 个，失败 {failed} 个，耗时 {elapsed:.2f} s')
+    if elapsed > 0 and converted:
+        print(f'吞吐：{converted / elapsed:.1f} 文件/s，{total_bytes / 1024 / 1024 / elapsed:.2f} MB/s')
+    return 1 if failed else 0
+
+
+def main(argv=None):
     import sys
     
-    if len(sys.argv) < 3:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'batch':
+        return batch_main(argv[1:])
+    if argv and argv[0] == 'watch':
+        from watcher import watch_main
+        return watch_main(argv[1:])
+    
+    embed_images = '--embed-images' in argv
+    argv = [arg for arg in argv if arg != '--embed-images']
+    if len(argv) < 2:
         print("使用方法:")
-        print("  python converter.py <input.md> <output.html>")
+        print("  python converter.py <input.md> <output.html> [--embed-images]")
         print("  python converter.py <input.md> <output.docx>")
-        sys.exit(1)
-    
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
-    
-    with open(input_file, 'r', encoding='utf-8') as f:
-        md_content = f.read()
+        print("  python converter.py <input.md> <output.pdf>")
+        print("  python converter.py batch <目录或通配符...> -o <输出目录> [-f html|docx|pdf] [-j 进程数] [--embed-images]")
+        print("  python converter.py watch <目录> -o <输出目录> [-f html docx pdf] [--embed-images]")
+        return 1
     
-    converter = MarkdownConverter()
-    ext = output_file.lower().split('.')[-1]
+    input_file, output_file = argv[0], argv[1]
+    try:
+        convert_file(MarkdownConverter(), input_file, output_file, embed_images=embed_images)
+    except UnicodeDecodeError as e:
+        # UnicodeDecodeError 是 ValueError 的子类，需先于格式错误处理
+        print(f"✗ {input_file} 不是 UTF-8 编码: {e}")
+        return 1
+    except ValueError:
+        print(f"不支持的格式: {output_file.lower().split('.')[-1]}")
+        print("支持的格式: html, docx, pdf")
+        return 1
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        return 1
     
-    if ext in ['html', 'htm']:
-        html = converter.to_html(md_content, title=input_file)
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+    fmt = OUTPUT_FORMATS[output_file.lower().rsplit('.', 1)[-1]]
+    if fmt == 'html':
         print(f"✓ HTML 已生成: {output_file}")
         print(f"💡 提示: 打开 HTML 文件，按 Ctrl+P 或点击按钮即可保存为 PDF")
-    
-    elif ext in ['docx', 'doc']:
-        docx_bytes = converter.to_docx(md_content)
-        with open(output_file, 'wb') as f:
-            f.write(docx_bytes.read())
-        print(f"✓ Word 已生成: {output_file}")
-    
+    elif fmt == 'pdf':
+        print(f"✓ PDF 已生成: {output_file}")
     else:
-        print(f"不支持的格式: {ext}")
-        print("支持的格式: html, docx")
-        sys.exit(1)
+        print(f"✓ Word 已生成: {output_file}")
+    return 0
 
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Mermaid 图表图片缓存
+前端 index.html 在浏览器中渲染 Mermaid 后，把 SVG / PNG 连同图表源码上传；
+这里按源码哈希保存（复用 RenderCache 的内存 LRU + 磁盘两级缓存），
+转换时按哈希查到图片就嵌入，服务端不需要无头浏览器。
+同一哈希、同一类型只保存第一次上传的图片，之后的上传不能替换已嵌入别人文档的图表
+"""
+
+import re
+import threading
+import xml.etree.ElementTree as etree
+
+from mermaid_ext import DIAGRAM_TYPES, diagram_digest, mermaid_sources
+from render_cache import RenderCache
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class DiagramCache:
+    """图表源码哈希 -> {'svg': 字节, 'png': 字节}（两种类型分别上传，可只有其一）"""
+
+    def __init__(self, directory=None, max_image_bytes=5 * 1024 * 1024,
+                 max_memory_bytes=32 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024):
+        self.max_image_bytes = max_image_bytes
+        self._lock = threading.Lock()
+        # 按图表计数：文档中的图表有无图片（底层缓存只统计实际读取的条目）
+        self._counters = {'diagram_hits': 0, 'diagram_misses': 0}
+        self._cache = RenderCache(directory=directory, max_memory_bytes=max_memory_bytes,
+                                  max_memory_items=1024, max_disk_bytes=max_disk_bytes)
+
+    def put(self, source, kind, data):
+        """保存一张图片，返回 (源码哈希, 是否保存)；已有同类型图片时保留原图，不保存
+
+        类型、大小或内容不合法时抛出 ValueError。
+        """
+        if kind not in DIAGRAM_TYPES:
+            raise ValueError(f'不支持的图片类型: {kind}')
+        if not data:
+            raise ValueError('图片为空')
+        if len(data) > self.max_image_bytes:
+            raise ValueError(f'图片超过 {self.max_image_bytes // (1024 * 1024)} MB')
+        if kind == 'png' and not data.startswith(_PNG_SIGNATURE):
+            raise ValueError('不是 PNG 图片')
+        if kind == 'svg':
+            _check_svg(data)
+        digest = diagram_digest(source)
+        key = f'{digest}.{kind}'
+        with self._lock:
+            if key in self._cache:
+                return digest, False
+            self._cache.put(key, data)
+        return digest, True
+
+    def get_image(self, digest, kind):
+        """单张图片，不存在返回 None"""
+        if not _DIGEST_RE.match(digest) or kind not in DIAGRAM_TYPES:
+            return None
+        key = f'{digest}.{kind}'
+        # 先确认存在：只上传了一种类型时，不为另一种类型记一次未命中
+        if key not in self._cache:
+            return None
+        return self._cache.get(key)
+
+    def get(self, digest):
+        """全部已上传的类型 {类型: 字节}，一张都没有时返回 None（MarkdownConverter.diagrams 接口）"""
+        images = {}
+        for kind in DIAGRAM_TYPES:
+            data = self.get_image(digest, kind)
+            if data is not None:
+                images[kind] = data
+        with self._lock:
+            self._counters['diagram_hits' if images else 'diagram_misses'] += 1
+        return images or None
+
+    def lookup(self, md_content):
+        """文档中已有图片的图表 {源码哈希: {类型: 字节}}"""
+        found = {}
+        for source in mermaid_sources(md_content):
+            digest = diagram_digest(source)
+            if digest not in found:
+                images = self.get(digest)
+                if images:
+                    found[digest] = images
+        return found
+
+    def stats(self):
+        stats = self._cache.stats()
+        with self._lock:
+            stats.update(self._counters)
+        return stats
+
+
+def _check_svg(data):
+    """确认是以 <svg> 为根的 XML（嵌入时只以 <img> 引用，其中的脚本不会执行）"""
+    try:
+        root = etree.fromstring(data)
+    except etree.ParseError as e:
+        raise ValueError(f'不是有效的 SVG: {e}') from None
+    if root.tag.rsplit('}', 1)[-1] != 'svg':
+        raise ValueError('不是有效的 SVG：根元素不是 <svg>')
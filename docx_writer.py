@@ -0,0 +1,491 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+DOCX 生成
+直接遍历 python-markdown 树处理器输出的 ElementTree，不经过 HTML 字符串和 BeautifulSoup
+"""
+
+import copy
+import re
+import shutil
+import tempfile
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.opc.packuri import PackURI
+from docx.opc.pkgwriter import PackageWriter
+from docx.shared import Pt, RGBColor, Inches, Twips
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.text.paragraph import Paragraph
+from lxml import etree
+from markdown.util import HTML_PLACEHOLDER_RE
+
+from image_embed import raw_image_sources
+from tree_writer import TreeWriter
+
+MERMAID_DOCX_NOTE = '📊 [Mermaid 图表 - 请在 HTML/前端版本查看]'
+
+# 模板中的样式：元素只引用样式名，字体、字号、颜色和缩进都在样式中定义一次
+CODE_STYLE = 'Code'
+QUOTE_STYLE = 'Quote'
+NOTE_STYLE = 'Diagram Note'
+TABLE_STYLE = 'Markdown Table'
+
+BODY_FONT = 'Microsoft YaHei'
+CODE_FONT = 'Consolas'
+ACCENT_COLOR = RGBColor(102, 126, 234)
+MUTED_COLOR = RGBColor(108, 117, 125)
+
+# 标题级别 -> (字号, 颜色)；未列出的级别（4~6）沿用模板默认样式
+HEADING_STYLES = {
+    1: (24, ACCENT_COLOR),
+    2: (20, RGBColor(73, 80, 87)),
+    3: (16, MUTED_COLOR),
+}
+
+# 表格首行：主题色底、白色粗体
+TABLE_HEADER_FILL = '667EEA'
+
+# 写入时按名称引用的样式，模板中只保留这些（及其依赖）
+USED_STYLES = (
+    'Normal', *(f'Heading {level}' for level in range(1, 7)),
+    'List Bullet', 'List Number', CODE_STYLE, QUOTE_STYLE, NOTE_STYLE, TABLE_STYLE,
+)
+
+
+def _define_styles(doc):
+    """在文档中定义正文、标题、代码、引用、图表提示和表格样式"""
+    styles = doc.styles
+
+    normal = styles['Normal']
+    normal.font.name = BODY_FONT
+    normal.element.rPr.rFonts.set(qn('w:eastAsia'), BODY_FONT)
+    normal.font.size = Pt(11)
+
+    for level, (size, color) in HEADING_STYLES.items():
+        font = styles[f'Heading {level}'].font
+        font.size = Pt(size)
+        font.color.rgb = color
+
+    code = styles.add_style(CODE_STYLE, WD_STYLE_TYPE.PARAGRAPH)
+    code.base_style = normal
+    code.quick_style = True
+    code.font.name = CODE_FONT
+    code.font.size = Pt(9)
+    code.paragraph_format.left_indent = Inches(0.5)
+
+    quote = styles[QUOTE_STYLE]
+    quote.font.italic = True
+    quote.font.color.rgb = MUTED_COLOR
+    quote.paragraph_format.left_indent = Inches(0.5)
+
+    note = styles.add_style(NOTE_STYLE, WD_STYLE_TYPE.PARAGRAPH)
+    note.base_style = normal
+    note.font.bold = True
+    note.font.color.rgb = ACCENT_COLOR
+
+    _define_table_style(doc)
+
+
+def _define_table_style(doc):
+    """复制 Light Grid Accent 1（网格线、隔行底色），把首行的条件格式改为主题色底、白色粗体
+
+    复制而不是 basedOn 继承，不依赖各个程序对表格条件格式继承的支持。
+    """
+    base = doc.styles['Light Grid Accent 1'].element
+    style = copy.deepcopy(base)
+    style.set(qn('w:styleId'), TABLE_STYLE.replace(' ', ''))
+    style.find(qn('w:name')).set(qn('w:val'), TABLE_STYLE)
+    base.addnext(style)
+
+    first_row = next(pr for pr in style.iterfind(qn('w:tblStylePr'))
+                     if pr.get(qn('w:type')) == 'firstRow')
+    color = OxmlElement('w:color')
+    color.set(qn('w:val'), 'FFFFFF')
+    first_row.find(qn('w:rPr')).append(color)
+
+    shading = OxmlElement('w:shd')
+    shading.set(qn('w:val'), 'clear')
+    shading.set(qn('w:color'), 'auto')
+    shading.set(qn('w:fill'), TABLE_HEADER_FILL)
+    first_row.find(qn('w:tcPr')).append(shading)
+
+
+_STYLES_WITH_EFFECTS = 'http://schemas.microsoft.com/office/2007/relationships/stylesWithEffects'
+
+
+def _prune_template(doc):
+    """删除写入时用不到的样式和 stylesWithEffects.xml（只供 Word 2010 使用）
+
+    python-docx 自带模板有 160 多个样式，styles.xml 约 350 KB，每次复制、序列化、
+    压缩都要处理一遍；只保留 USED_STYLES、默认样式、编号定义引用的样式
+    以及它们通过 basedOn / next / link 关联的样式。
+    """
+    styles = doc.styles
+    by_id = {style.get(qn('w:styleId')): style for style in styles.element.iterfind(qn('w:style'))}
+
+    keep = {styles[name].style_id for name in USED_STYLES}
+    keep.update(style_id for style_id, style in by_id.items() if style.get(qn('w:default')) == '1')
+    keep.update(ref.get(qn('w:val')) for ref in doc.part.numbering_part.element.iter(qn('w:pStyle')))
+
+    pending = list(keep)
+    while pending:
+        style = by_id.get(pending.pop())
+        if style is None:
+            continue
+        for tag in ('w:basedOn', 'w:next', 'w:link'):
+            ref = style.find(qn(tag))
+            if ref is not None and ref.get(qn('w:val')) not in keep:
+                keep.add(ref.get(qn('w:val')))
+                pending.append(ref.get(qn('w:val')))
+
+    for style_id, style in by_id.items():
+        if style_id not in keep:
+            styles.element.remove(style)
+
+    for r_id, rel in list(doc.part.rels.items()):
+        if rel.reltype == _STYLES_WITH_EFFECTS:
+            doc.part.drop_rel(r_id)
+
+
+@lru_cache(maxsize=1)
+def _template():
+    """定义好样式的空白文档，只生成一次，之后只读"""
+    doc = Document()
+    _define_styles(doc)
+    _prune_template(doc)
+    return doc
+
+
+def new_document():
+    """复制一份模板文档
+
+    深拷贝内存中已解析的模板，不再读取和解析 .docx 文件；模板本身不会被修改，
+    可在多个线程中同时复制。
+    """
+    return copy.deepcopy(_template())
+
+
+# save_document 直接调用的 PackageWriter 内部方法（requirements.txt 固定了 python-docx 版本）；
+# 升级后这些方法不存在时退回公开的 doc.save 再重新打包，结果相同，只是多一次解压和压缩
+_PACKAGE_WRITER_METHODS = ('_write_content_types_stream', '_write_pkg_rels', '_write_parts')
+_HAS_PACKAGE_WRITER = all(hasattr(PackageWriter, name) for name in _PACKAGE_WRITER_METHODS)
+
+
+def save_document(doc, stream, compress_level=None, body=None):
+    """把文档写入 stream
+
+    compress_level 为 None 时与 doc.save 相同（deflate 默认级别），
+    0 表示只存储不压缩（最快，体积最大），1~9 为 deflate 级别。
+    body 为大文档模式的 BodySpool，其中的正文写回 document.xml。
+    """
+    if compress_level is None:
+        compression = zipfile.ZIP_DEFLATED
+    elif compress_level == 0:
+        compression = zipfile.ZIP_STORED
+    elif 1 <= compress_level <= 9:
+        compression = zipfile.ZIP_DEFLATED
+    else:
+        raise ValueError(f'DOCX 压缩级别应为 0~9，实际为 {compress_level}')
+
+    with zipfile.ZipFile(stream, 'w', compression=compression,
+                         compresslevel=compress_level or None) as archive:
+        writer = _ZipPartWriter(archive, body)
+        if not _HAS_PACKAGE_WRITER:
+            _repack(doc, writer)
+            return
+        package = doc.part.package
+        parts = list(package.parts)
+        for part in parts:
+            part.before_marshal()
+        # 与 PackageWriter.write 的顺序相同，只是换成可指定压缩方式的 ZipFile
+        PackageWriter._write_content_types_stream(writer, parts)
+        PackageWriter._write_pkg_rels(writer, package.rels)
+        PackageWriter._write_parts(writer, parts)
+
+
+def _repack(doc, writer):
+    """用公开的 doc.save 写到内存，再逐个成员交给 writer（按指定压缩方式写入）"""
+    saved = BytesIO()
+    doc.save(saved)
+    with zipfile.ZipFile(saved) as package:
+        for name in package.namelist():
+            writer.write(PackURI('/' + name), package.read(name))
+
+
+# 已压缩的图片格式，写入 zip 时不再 deflate
+_COMPRESSED_MEDIA = ('png', 'jpeg', 'jpg', 'gif')
+
+
+class _ZipPartWriter:
+    """PackageWriter 所需的 write(pack_uri, blob) 接口"""
+
+    def __init__(self, archive, body=None):
+        self.archive = archive
+        self.body = body
+
+    def write(self, pack_uri, blob):
+        if self.body is not None and pack_uri == self.body.partname:
+            # 文档树中只剩 sectPr，把临时文件中的正文流式写到 <w:body> 之后
+            start = _BODY_START_RE.search(blob).end()
+            with self.archive.open(pack_uri.membername, 'w') as member:
+                member.write(blob[:start])
+                self.body.copy_to(member)
+                member.write(blob[start:])
+        elif pack_uri.membername.startswith('word/media/') and pack_uri.ext in _COMPRESSED_MEDIA:
+            # PNG/JPEG/GIF 本身已压缩，再 deflate 只费时间
+            self.archive.writestr(pack_uri.membername, blob, compress_type=zipfile.ZIP_STORED)
+        else:
+            self.archive.writestr(pack_uri.membername, blob)
+
+
+_BODY_START_RE = re.compile(rb'<w:body[^>]*>')
+_SECT_PR = qn('w:sectPr')
+_DOC_PR = qn('wp:docPr')
+
+
+class BodySpool:
+    """大文档模式：把已写好的正文序列化到临时文件，文档树中只保留当前分块
+
+    每写完一块调用 flush()，内存中的元素树不随文档增长；python-docx 在 sectPr 前
+    插入段落时要线性查找，正文保持很短也避免了这部分随文档长度增长的开销。
+    保存时传给 save_document(body=...)。
+    """
+
+    def __init__(self, doc, max_memory_bytes=4 * 1024 * 1024):
+        self.doc = doc
+        self.partname = doc.part.partname
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+        self._shape_ids = 0   # 已写出的图片 id 最大值
+
+    def flush(self):
+        """把 sectPr 之前的正文追加到临时文件，并从文档树中移除"""
+        body = self.doc.element.body
+        children = [child for child in body if child.tag != _SECT_PR]
+        if not children:
+            return
+        # python-docx 按当前正文中的最大 id 给图片编号，清空正文后会从 1 重新开始；
+        # 接着已写出的编号顺延，与整篇写入时的编号相同
+        last = self._shape_ids
+        for doc_pr in body.iter(_DOC_PR):
+            shape_id = int(doc_pr.get('id')) + self._shape_ids
+            doc_pr.set('id', str(shape_id))
+            doc_pr.set('name', f'Picture {shape_id}')
+            last = max(last, shape_id)
+        self._shape_ids = last
+        # 序列化整个 document 元素再截取正文，命名空间只在根元素上声明一次
+        xml = etree.tostring(self.doc.element, encoding='UTF-8')
+        start = _BODY_START_RE.search(xml).end()
+        end = xml.rfind(b'<w:sectPr')
+        if end == -1:
+            end = xml.rindex(b'</w:body>')
+        self._file.write(memoryview(xml)[start:end])
+        for child in children:
+            body.remove(child)
+
+    def copy_to(self, stream):
+        self._file.seek(0)
+        shutil.copyfileobj(self._file, stream, 1024 * 1024)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_RUN_BREAK_RE = re.compile(r'([\t\n\r])')
+_RUN_BREAKS = {'\t': '<w:tab/>', '\n': '<w:br/>', '\r': '<w:br/>'}
+
+
+def _run_xml(text):
+    """单元格文本 -> <w:r>，与 python-docx 的 run.text 相同：制表符、换行转为 w:tab / w:br"""
+    parts = []
+    for piece in _RUN_BREAK_RE.split(text):
+        if piece in _RUN_BREAKS:
+            parts.append(_RUN_BREAKS[piece])
+        elif piece:
+            space = ' xml:space="preserve"' if piece != piece.strip() else ''
+            parts.append(f'<w:t{space}>{escape(piece)}</w:t>')
+    return '<w:r>' + ''.join(parts) + '</w:r>'
+
+
+def table_rows_xml(rows, cols, col_twips):
+    """一次生成全部 <w:tr>，返回包裹在 <w:tbl> 中的 XML 字符串
+
+    单元格结构与 python-docx 的 add_table + cell.text 相同；不足 cols 的行补空单元格。
+    """
+    tc_open = f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{col_twips}"/></w:tcPr>'
+    parts = [f'<w:tbl {nsdecls("w")}>']
+    for cells in rows:
+        parts.append('<w:tr>')
+        for i in range(cols):
+            text = cells[i] if i < len(cells) else ''
+            parts.append(tc_open)
+            parts.append(f'<w:p>{_run_xml(text)}</w:p></w:tc>' if text else '<w:p/></w:tc>')
+        parts.append('</w:tr>')
+    parts.append('</w:tbl>')
+    return ''.join(parts)
+
+
+def _fit_picture(para, data, max_width):
+    """在段落中插入图片，宽于 max_width 时等比缩小"""
+    picture = para.add_run().add_picture(BytesIO(data))
+    if picture.width > max_width:
+        picture.height = int(picture.height * max_width / picture.width)
+        picture.width = max_width
+
+
+class DocxTreeWriter(TreeWriter):
+    """把 Markdown 元素树写入 python-docx 文档"""
+
+    def __init__(self, doc, html_stash, diagrams=None, images=None):
+        super().__init__(html_stash)
+        self.doc = doc
+        self.diagrams = diagrams
+        # {img src: EmbeddedImage}，只包含已读入的本地图片
+        self.images = images
+
+    def _process_element(self, element):
+        """处理元素的直接子节点"""
+        doc = self.doc
+        for child in element:
+            tag = child.tag
+
+            if tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+                doc.add_heading(self._text(child).strip(), level=int(tag[1]))
+
+            elif tag == 'p':
+                index = self._block_placeholder(child)
+                if index is not None:
+                    self._add_stashed_block(index)
+                else:
+                    text = self._text(child).strip()
+                    if text:
+                        doc.add_paragraph(text)
+                self._add_images(child)
+
+            elif tag in ('ul', 'ol'):
+                style = 'List Bullet' if tag == 'ul' else 'List Number'
+                for li in child.iterfind('li'):
+                    doc.add_paragraph(self._text(li).strip(), style=style)
+                    self._add_images(li)
+
+            elif tag == 'table':
+                self._add_table(child)
+
+            elif tag == 'div' and child.get('class') == 'mermaid-diagram':
+                self._add_diagram(child.get('data-digest'))
+
+            elif tag == 'div' and child.get('class') == 'mermaid-note':
+                doc.add_paragraph(MERMAID_DOCX_NOTE, style=NOTE_STYLE)
+
+            elif tag == 'pre':
+                self._add_code(self._text(child))
+
+            elif tag == 'blockquote':
+                text = self._text(child).strip()
+                if text:
+                    doc.add_paragraph(text, style=QUOTE_STYLE)
+                self._add_images(child)
+
+            elif tag == 'hr':
+                doc.add_paragraph('─' * 50)
+
+    def _add_stashed_block(self, index):
+        """处理块级占位符：代码块或原始 HTML"""
+        if self._is_stashed_code(index):
+            # fenced_code / codehilite 生成的代码块
+            self._add_code(self._stash_item_text(index))
+            return
+
+        text = self._stash_item_text(index).strip()
+        if text:
+            self.doc.add_paragraph(text)
+
+    def _add_diagram(self, digest):
+        """嵌入前端上传的 Mermaid 图表 PNG（Word 不能直接显示 SVG），没有 PNG 时写入提示"""
+        images = self.diagrams.get(digest) if self.diagrams is not None else None
+        png = images.get('png') if images else None
+        if not png:
+            self.doc.add_paragraph(MERMAID_DOCX_NOTE, style=NOTE_STYLE)
+            return
+
+        self._add_picture(png)
+
+    def _image_sources(self, element):
+        """元素子树中引用的图片地址，包括原始 HTML（htmlStash 占位符）中的 <img>"""
+        for el in element.iter():
+            if el.tag == 'img':
+                yield el.get('src')
+            for text in (el.text, el.tail if el is not element else None):
+                if text and '\x02' in text:
+                    for m in HTML_PLACEHOLDER_RE.finditer(text):
+                        item = self.stash[int(m.group(1))]
+                        if isinstance(item, str):
+                            yield from raw_image_sources(item)
+
+    def _add_images(self, element):
+        """在元素的文字之后嵌入其中引用的本地图片（段落、列表项、引用和原始 HTML 中的都算）"""
+        if not self.images:
+            return
+        for src in self._image_sources(element):
+            image = self.images.get(src)
+            if image is not None:
+                self._add_picture(image.data)
+
+    def _add_picture(self, data):
+        """居中插入图片，超出版心时等比缩小到版心宽度
+
+        相同内容的图片由 python-docx 按 SHA-1 复用同一个图片部件，只存一份。
+        """
+        para = self.doc.add_paragraph()
+        para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        # 截图（包括前端按 2 倍分辨率截的图表）按原始尺寸插入往往超出版心
+        section = self.doc.sections[-1]
+        _fit_picture(para, data, section.page_width - section.left_margin - section.right_margin)
+
+    def _add_cell_images(self, table, table_element, cols, col_twips):
+        """单元格中的图片插入到单元格文字之后，宽度不超过列宽"""
+        for r, tr in enumerate(table_element.iter('tr')):
+            cells = [cell for cell in tr if cell.tag in ('th', 'td')]
+            for c, cell in enumerate(cells[:cols]):
+                for src in self._image_sources(cell):
+                    image = self.images.get(src)
+                    if image is None:
+                        continue
+                    # 不经过 table.cell()：它每次都重新遍历整个表格
+                    tc = table._tbl.tr_lst[r].tc_lst[c]
+                    _fit_picture(Paragraph(tc.add_p(), table), image.data, Twips(col_twips))
+
+    def _add_code(self, code_text):
+        code_text = code_text.rstrip('\n')
+        if not code_text:
+            return
+        self.doc.add_paragraph(code_text, style=CODE_STYLE)
+
+    def _add_table(self, table_element):
+        """添加表格"""
+        rows = self._table_rows(table_element)
+        if not rows or not rows[0]:
+            return
+
+        cols = len(rows[0])
+        # 首行底色和字体由表格样式的首行条件格式提供
+        table = self.doc.add_table(rows=0, cols=cols, style=TABLE_STYLE)
+        # python-docx 每次访问 row.cells 都重新遍历整个表格，行数多时耗时按平方增长；
+        # 这里一次生成全部行的 XML，解析后整体挂到表格下
+        tbl = table._tbl
+        col_twips = tbl.tblGrid.gridCol_lst[0].w.twips
+        tbl.extend(list(parse_xml(table_rows_xml(rows, cols, col_twips))))
+        if self.images:
+            self._add_cell_images(table, table_element, cols, col_twips)
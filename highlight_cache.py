@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+代码高亮缓存
+同一段代码在不同文档中反复出现时，直接复用 codehilite 的高亮结果，
+跳过 Pygments 的词法分析器查找、格式化器初始化和格式化
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from markdown.extensions import codehilite
+
+# 预先加载的常用语言（实验报告中最常见的代码块语言）
+WARM_UP_LANGUAGES = (
+    'text', 'python', 'sql', 'java', 'c', 'cpp', 'csharp', 'javascript',
+    'html', 'xml', 'css', 'json', 'yaml', 'bash', 'console',
+)
+
+
+class HighlightCache:
+    """高亮结果的 LRU 缓存（按条目数和总字符数淘汰），线程安全
+
+    键由语言、代码内容哈希和全部词法分析器/格式化器选项组成。
+    max_entries=0 时不缓存。
+    """
+
+    def __init__(self, max_entries=4096, max_chars=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> html
+        self._chars = 0
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(hiliter, shebang):
+        """由 CodeHilite 实例的全部配置和代码内容生成缓存键"""
+        formatter = hiliter.pygments_formatter
+        if not isinstance(formatter, str):
+            formatter = f'{formatter.__module__}.{formatter.__qualname__}'
+        options = repr(sorted(hiliter.options.items()))
+        return (
+            hashlib.sha1(hiliter.src.encode('utf-8')).hexdigest(),
+            hiliter.lang, shebang, hiliter.guess_lang, hiliter.use_pygments,
+            hiliter.lang_prefix, formatter, options,
+        )
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return html
+
+    def put(self, key, html):
+        if not self.max_entries or len(html) > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._chars -= len(old)
+            self._entries[key] = html
+            self._chars += len(html)
+            while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted)
+                self._counters['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+            stats['chars'] = self._chars
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+
+highlight_cache = HighlightCache()
+
+_original_hilite = codehilite.CodeHilite.hilite
+
+
+def _cached_hilite(self, shebang=True):
+    """替换 CodeHilite.hilite：命中缓存时不调用 Pygments"""
+    if not highlight_cache.max_entries:
+        return _original_hilite(self, shebang)
+    key = highlight_cache.make_key(self, shebang)
+    html = highlight_cache.get(key)
+    if html is None:
+        html = _original_hilite(self, shebang)
+        highlight_cache.put(key, html)
+    return html
+
+
+def install():
+    """让 codehilite（包括 fenced_code 中的代码块）经过高亮缓存；重复调用无副作用
+
+    python-markdown 没有替换高亮实现的扩展点，fenced_code 直接实例化 CodeHilite，
+    所以在类上替换 hilite 方法。
+    """
+    codehilite.CodeHilite.hilite = _cached_hilite
+
+
+def warm_up(languages=WARM_UP_LANGUAGES):
+    """预先加载常用语言的词法分析器和 HTML 格式化器模块，避免第一次转换时才导入"""
+    if codehilite.pygments is False:
+        return
+    from pygments.formatters import get_formatter_by_name
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+
+    get_formatter_by_name('html')
+    for lang in languages:
+        try:
+            get_lexer_by_name(lang)
+        except ClassNotFound:
+            pass
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地图片嵌入
+Markdown 中引用的本地/相对路径图片在转换时读入，DOCX 中嵌入为图片部件，HTML 中可选嵌入为 data URI。
+读取和缩放在线程池中并行进行；按内容哈希去重，同一张图（如重复出现的 logo）只编码、只嵌入一次；
+缩放结果按内容哈希缓存在磁盘上（复用 RenderCache），再次转换时不必重新解码。
+安装了 Pillow 时把超过 max_width 像素宽的图片等比缩小，并把 BMP/TIFF 和 Word 不支持的格式（如 WebP）转为 PNG；
+没有 Pillow 时原样嵌入 Word 支持的格式。
+"""
+
+import base64
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from html import unescape
+from io import BytesIO
+from urllib.parse import unquote, urlsplit
+
+from render_cache import RenderCache
+
+# 文件头 -> MIME 类型；python-docx 能直接嵌入的格式
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+)
+
+# 不需要缩小时原样保留的格式；BMP、TIFF 等未压缩格式在有 Pillow 时转为 PNG
+_COMPACT_TYPES = ('image/png', 'image/jpeg', 'image/gif')
+
+# 缓存键中的处理版本，改变缩放/编码方式时递增
+_PROCESS_VERSION = 1
+
+# 原始 HTML 中 <img> 的 src（带引号或不带引号）
+_RAW_IMG_RE = re.compile(
+    r'<img\b[^>]*?\ssrc\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.I)
+
+
+def sniff_mime(data):
+    """按文件头识别 Word 支持的图片格式，不支持返回 None"""
+    for signature, mime in _SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    return None
+
+
+def raw_image_sources(html_text):
+    """原始 HTML 片段中 <img> 引用的地址"""
+    if '<img' not in html_text and '<IMG' not in html_text:
+        return []
+    return [unescape(next(group for group in m.groups() if group is not None))
+            for m in _RAW_IMG_RE.finditer(html_text)]
+
+
+def local_path(src, base_dir):
+    """<img src> -> 本地文件的绝对路径；网络地址、data URI 或文件不存在时返回 None"""
+    if not src or src.startswith('//'):
+        return None
+    parts = urlsplit(src)
+    if parts.scheme == 'file':
+        path = unquote(parts.path)
+    elif parts.scheme and len(parts.scheme) > 1:   # 单个字母是 Windows 盘符
+        return None
+    else:
+        path = unquote(src.split('#', 1)[0].split('?', 1)[0])
+    path = os.path.join(base_dir, path)
+    return os.path.abspath(path) if os.path.isfile(path) else None
+
+
+class EmbeddedImage:
+    """处理后的图片：内容哈希（原始文件）、字节和 MIME 类型"""
+
+    __slots__ = ('digest', 'data', 'mime', '_data_uri')
+
+    def __init__(self, digest, data, mime):
+        self.digest = digest
+        self.data = data
+        self.mime = mime
+        self._data_uri = None
+
+    @property
+    def data_uri(self):
+        """data: URI（第一次使用时编码，同一个对象只编码一次）"""
+        if self._data_uri is None:
+            self._data_uri = f'data:{self.mime};base64,' + base64.b64encode(self.data).decode('ascii')
+        return self._data_uri
+
+
+class ImageLoader:
+    """读取、去重和缩放本地图片（线程安全，可在多个转换间共享）"""
+
+    def __init__(self, max_width=1600, cache_dir=None, max_workers=4,
+                 max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024):
+        self.max_width = max_width
+        self.max_workers = max_workers
+        self._cache = RenderCache(directory=cache_dir, max_memory_bytes=max_memory_bytes,
+                                  max_disk_bytes=max_disk_bytes)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def load_all(self, paths):
+        """并行读取一组本地文件，返回 {路径: EmbeddedImage}；读不了或不是图片的路径不在结果中
+
+        内容相同的文件（不同路径下的同一个 logo）共享同一个 EmbeddedImage。
+        """
+        unique = list(dict.fromkeys(paths))
+        if len(unique) > 1:
+            results = self._executor().map(self.load, unique)
+        else:
+            results = map(self.load, unique)
+        found = {}
+        by_digest = {}
+        for path, image in zip(unique, results):
+            if image is not None:
+                found[path] = by_digest.setdefault(image.digest, image)
+        return found
+
+    def load(self, path):
+        """读取并处理单个文件"""
+        try:
+            with open(path, 'rb') as f:
+                original = f.read()
+        except OSError:
+            return None
+        digest = hashlib.sha256(original).hexdigest()
+        key = f'{digest}-w{self.max_width}-v{_PROCESS_VERSION}'
+        data = self._cache.get(key)
+        if data is None:
+            data = _shrink(original, self.max_width)
+            if data is None:
+                return None
+            self._cache.put(key, data)
+        mime = sniff_mime(data)
+        return EmbeddedImage(digest, data, mime) if mime else None
+
+    def stats(self):
+        return self._cache.stats()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='md2e-image')
+            return self._pool
+
+
+def _shrink(data, max_width):
+    """等比缩小超宽图片，把 Word 不支持的格式转为 PNG；无需处理时返回原字节，无法处理返回 None"""
+    mime = sniff_mime(data)
+    try:
+        from PIL import Image
+    except ImportError:
+        return data if mime else None
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            if mime in _COMPACT_TYPES and img.width <= max_width:
+                return data
+            fmt = 'JPEG' if mime == 'image/jpeg' else 'PNG'
+            if img.width > max_width:
+                height = max(1, round(img.height * max_width / img.width))
+                # Pillow 在解码和缩放时释放 GIL，多张图片可在线程池中并行
+                img = img.resize((max_width, height), Image.LANCZOS)
+            if fmt == 'JPEG' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            elif fmt == 'PNG' and img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                img = img.convert('RGBA')
+            output = BytesIO()
+            if fmt == 'JPEG':
+                img.save(output, 'JPEG', quality=85, optimize=True)
+            else:
+                img.save(output, 'PNG', optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return data if mime else None
+    result = output.getvalue()
+    # 缩小后反而更大（如已高度压缩的小图），用原图
+    return data if mime and len(result) >= len(data) else result
+
+
+_default_loader = None
+_default_lock = threading.Lock()
+
+
+def default_loader():
+    """进程内共享的 ImageLoader，缩放缓存目录可用环境变量 MD2E_IMAGE_CACHE_DIR 指定"""
+    global _default_loader
+    with _default_lock:
+        if _default_loader is None:
+            _default_loader = ImageLoader(cache_dir=os.environ.get(
+                'MD2E_IMAGE_CACHE_DIR',
+                os.path.join(tempfile.gettempdir(), 'md2everything-images')))
+        return _default_loader
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异步转换任务
+提交后立即返回任务 id，转换在有界线程池中执行，结果在内存中保留 ttl 秒
+（总大小超过上限时先淘汰最早结束的任务）；可选在任务结束时向回调地址 POST 任务状态
+"""
+
+import http.client
+import ipaddress
+import json
+import socket
+import ssl
+import threading
+import time
+import traceback
+import urllib.parse
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """未完成的任务数已达上限"""
+
+
+def resolve_callback(url, allowed_hosts=None):
+    """检查回调地址并解析主机，返回 (URL 各部分, 端口, 连接用的 IP)；不允许时抛出 ValueError
+
+    没有配置 allowed_hosts 时，主机解析出的全部地址都必须是公网地址（不能是本机、
+    内网、链路本地等），避免任何人借回调让服务端请求内部服务；配置后只允许其中的主机。
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('回调地址必须是 http/https URL')
+    host = parts.hostname.lower()
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError:
+        raise ValueError(f'回调地址端口无效: {url}') from None
+    if allowed_hosts is not None and host not in allowed_hosts:
+        raise ValueError(f'回调地址的主机不在允许列表中: {host}')
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f'无法解析回调地址 {host}: {e}') from None
+    addresses = [info[4][0] for info in infos]
+    if allowed_hosts is None:
+        for address in addresses:
+            ip = ipaddress.ip_address(address.split('%', 1)[0])
+            if ip.version == 6 and ip.ipv4_mapped:
+                ip = ip.ipv4_mapped
+            if not ip.is_global:
+                raise ValueError(f'回调地址不能指向本机或内网地址: {host}')
+    return parts, port, addresses[0]
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """连接到已检查过的 IP（不再重新解析主机名），Host 头仍为原主机名"""
+
+    def __init__(self, host, port, address, timeout):
+        super().__init__(host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """同 _PinnedHTTPConnection，证书按原主机名校验"""
+
+    def __init__(self, host, port, address, timeout):
+        super().__init__(host, port, timeout=timeout, context=ssl.create_default_context())
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+class Job:
+    """一个转换任务；result 为输出字节，info 为提交时附带的元数据
+
+    给出 base_url 时，状态中带上 status_url（base_url + id）和 result_url。
+    """
+
+    def __init__(self, info, callback_url=None, base_url=None):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.info = info
+        self.callback_url = callback_url
+        self.base_url = base_url
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        data = dict(self.info)
+        data.update({
+            'id': self.id,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        })
+        if self.base_url:
+            data['status_url'] = self.base_url + self.id
+            data['result_url'] = self.base_url + self.id + '/result'
+        if self.status == DONE:
+            data['size'] = len(self.result)
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    """有界线程池 + 带 TTL 和总大小上限的结果存储，线程安全
+
+    callback_hosts 为允许的回调主机（None 表示只允许公网地址，见 resolve_callback）。
+    """
+
+    def __init__(self, max_workers=2, max_pending=64, ttl=600, callback_timeout=5,
+                 max_result_bytes=256 * 1024 * 1024, callback_hosts=None):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.callback_timeout = callback_timeout
+        self.max_result_bytes = max_result_bytes
+        self.callback_hosts = callback_hosts
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='md2e-job')
+        self._cond = threading.Condition()
+        self._jobs = OrderedDict()   # id -> Job，按提交顺序
+        self._pending = 0
+        self._result_bytes = 0
+        self._counters = {
+            'submitted': 0,
+            'rejected': 0,
+            'done': 0,
+            'failed': 0,
+            'expired': 0,
+            'evicted': 0,
+            'callbacks_sent': 0,
+            'callbacks_failed': 0,
+        }
+
+    def check_callback(self, url):
+        """提交前检查回调地址，不允许时抛出 ValueError"""
+        resolve_callback(url, self.callback_hosts)
+
+    def submit(self, func, info=None, callback_url=None, base_url=None):
+        """提交任务，func() 在工作线程中执行并返回输出字节；队列已满时抛出 QueueFull"""
+        job = Job(info or {}, callback_url, base_url)
+        with self._cond:
+            self._purge()
+            if self._pending >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise QueueFull(f'未完成的任务已达上限 {self.max_pending}')
+            self._pending += 1
+            self._counters['submitted'] += 1
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def get(self, job_id):
+        """返回任务，不存在或已过期返回 None"""
+        with self._cond:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout):
+        """长轮询：等待任务结束或超时，返回任务（不存在返回 None）"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._purge()
+            job = self._jobs.get(job_id)
+            while job is not None and job.status in (QUEUED, RUNNING):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return job
+
+    def stats(self):
+        """提交/拒绝/完成/失败/过期计数及当前队列状态"""
+        with self._cond:
+            self._purge()
+            stats = dict(self._counters)
+            stats['pending'] = self._pending
+            stats['stored'] = len(self._jobs)
+            stats['stored_bytes'] = self._result_bytes
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _purge(self):
+        """删除结束超过 ttl 秒的任务（调用方持有锁）"""
+        expire_before = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and job.finished < expire_before]
+        for job_id in expired:
+            self._drop(job_id)
+        self._counters['expired'] += len(expired)
+
+    def _evict(self):
+        """结果总大小超过上限时，按结束顺序淘汰最早结束的任务（调用方持有锁）"""
+        if self._result_bytes <= self.max_result_bytes:
+            return
+        finished = sorted((job for job in self._jobs.values() if job.finished is not None),
+                          key=lambda job: job.finished)
+        for job in finished:
+            if self._result_bytes <= self.max_result_bytes:
+                break
+            self._drop(job.id)
+            self._counters['evicted'] += 1
+
+    def _drop(self, job_id):
+        job = self._jobs.pop(job_id)
+        if job.result is not None:
+            self._result_bytes -= len(job.result)
+
+    def _run(self, job, func):
+        with self._cond:
+            job.status = RUNNING
+            job.started = time.time()
+        try:
+            result = func()
+        except Exception as e:
+            traceback.print_exc()
+            result, status, error = None, FAILED, f'{type(e).__name__}: {e}'
+        else:
+            status, error = DONE, None
+
+        with self._cond:
+            job.result = result
+            job.error = error
+            job.status = status
+            job.finished = time.time()
+            self._pending -= 1
+            self._counters[status] += 1
+            if result is not None:
+                self._result_bytes += len(result)
+                self._evict()
+            self._cond.notify_all()
+
+        if job.callback_url:
+            self._send_callback(job)
+
+    def _send_callback(self, job):
+        """向回调地址 POST 任务状态（JSON），失败只计数不影响任务结果
+
+        发送前重新解析并检查主机，直接连接检查过的 IP；不跟随重定向（3xx 视为失败）。
+        """
+        body = json.dumps(job.to_dict(), ensure_ascii=False).encode('utf-8')
+        try:
+            parts, port, address = resolve_callback(job.callback_url, self.callback_hosts)
+            connection_class = (_PinnedHTTPSConnection if parts.scheme == 'https'
+                                else _PinnedHTTPConnection)
+            conn = connection_class(parts.hostname, port, address, self.callback_timeout)
+            try:
+                path = parts.path or '/'
+                if parts.query:
+                    path += '?' + parts.query
+                conn.request('POST', path, body=body,
+                             headers={'Content-Type': 'application/json; charset=utf-8'})
+                resp = conn.getresponse()
+                resp.read()
+            finally:
+                conn.close()
+            if resp.status >= 300:
+                raise RuntimeError(f'HTTP {resp.status}')
+            sent = True
+        except Exception as e:
+            print(f'任务 {job.id} 回调失败: {type(e).__name__}: {e}')
+            sent = False
+        with self._cond:
+            self._counters['callbacks_sent' if sent else 'callbacks_failed'] += 1
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+大文档模式
+几十 MB 的生成文档不整份读入：以只读内存映射打开源文件，在围栏代码块和 HTML 块之外、
+前面是空行的 ATX 标题处切成约 CHUNK_BYTES 的分块，逐块转换并写出，写完一块
+再解析下一块。源文本、Markdown 元素树、HTML 和 DOCX 正文都只保留当前分块，
+内存峰值基本不随文档大小增长（PDF 除外：fpdf2 在内存中保存全部页面）。
+
+与整篇转换的差别：
+- 链接定义、缩写定义和脚注定义预先收集，附加到每个分块后面；HTML 输出中脚注按定义顺序
+  统一编号，全部脚注在文档末尾只列出一次（与整篇转换相同）；
+- 标题 id 跨分块去重，规则与整篇转换相同；[TOC] 只列出所在分块的标题；
+- 未闭合的 HTML 块一直延续到文档末尾，其后不再切分。
+"""
+
+import hashlib
+import mmap
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from converter import (
+    DEFAULT_ASSET_URL, _FOOTNOTE_REF_RE, _VOID_TAGS, FootnoteMerger, _fix_heading_ids,
+    explicit_ids, html_escape, html_shell, minify_html, split_blocks,
+)
+
+# 分块目标大小：Markdown 的部分处理器耗时随输入长度超线性增长，分块不宜过大
+CHUNK_BYTES = 256 * 1024
+
+# 可能是围栏、标题或 HTML 块开头的行；其余行不影响切分，不逐行检查
+_CANDIDATE_RE = re.compile(rb'^(?:[ \t]*(?:`{3,}|~{3,}|#)|<)', re.M)
+_FENCE_RE = re.compile(rb' {0,3}(`{3,}|~{3,})')
+_HEADING_RE = re.compile(rb' {0,3}#{1,6}(?:[ \t\r]|$)')
+_HTML_START_RE = re.compile(rb'<(?:([a-zA-Z][a-zA-Z0-9-]*)[\s>]|!--)')
+# 链接/脚注定义和缩写定义，都需要预先收集后附加到每个分块
+_DEFINITION_RE = re.compile(rb'^(?: {0,3}\[[^\]\n]+\]|\*\[[^\]\n]*\] ?):', re.M)
+
+
+@contextmanager
+def open_source(path):
+    """以只读内存映射打开源文件，产出可切片的字节缓冲（空文件为 b''）"""
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:   # 空文件不能映射
+            data = None
+        if data is None:
+            yield b''
+            return
+        with data:
+            yield data
+
+
+def _after_blank_line(data, pos):
+    if pos == 0:
+        return True
+    prev_start = data.rfind(b'\n', 0, pos - 1) + 1
+    return not data[prev_start:pos].strip()
+
+
+def _html_block_end(data, start, line):
+    """从 start 开始的 HTML 块结束的偏移，不是 HTML 块时返回 start
+
+    与 split_blocks 的判断一致：注释到 --> 为止；其他标签到闭合标签与开始标签数量相等为止，
+    一直未闭合时到文档末尾。
+    """
+    m = _HTML_START_RE.match(line)
+    if m is None:
+        return start
+    if m.group(1) is None:
+        end = data.find(b'-->', start + 4)
+        return len(data) if end == -1 else end + 3
+    tag = m.group(1)
+    if tag.decode('ascii').lower() in _VOID_TAGS:
+        return start
+    depth = 0
+    for t in re.compile(rb'<(/?)' + re.escape(tag)).finditer(data, start):
+        depth += -1 if t.group(1) else 1
+        if depth <= 0:
+            return t.end()
+    return len(data)
+
+
+def _boundaries(data, chunk_bytes):
+    """可以切分的行首偏移：围栏代码块和 HTML 块之外、前面是空行的 ATX 标题，相邻两处至少相隔 chunk_bytes"""
+    fence = None
+    last = 0
+    html_end = 0
+    for m in _CANDIDATE_RE.finditer(data):
+        start = m.start()
+        if start < html_end:
+            continue
+        end = data.find(b'\n', start)
+        line = data[start:end if end != -1 else len(data)]
+        if fence:
+            # 与 split_blocks 的围栏判断一致
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[:1]):
+                fence = None
+            continue
+        f = _FENCE_RE.match(line)
+        if f:
+            fence = f.group(1)
+        elif line.startswith(b'<'):
+            if _after_blank_line(data, start):
+                html_end = _html_block_end(data, start, line)
+        elif (start - last >= chunk_bytes and _HEADING_RE.match(line)
+              and _after_blank_line(data, start)):
+            yield start
+            last = start
+
+
+def iter_chunks(data, chunk_bytes=CHUNK_BYTES):
+    """按 _boundaries 切分，逐块产出解码后的文本"""
+    start = 0
+    for end in _boundaries(data, chunk_bytes):
+        yield data[start:end].decode('utf-8')
+        start = end
+    if start < len(data):
+        yield data[start:].decode('utf-8')
+
+
+def _definitions(data, chunk_bytes):
+    """全文的链接定义（含缩写定义）和脚注定义：(定义源码, {标签: 脚注定义源码})"""
+    links = []
+    footnotes = OrderedDict()
+    if _DEFINITION_RE.search(data) is None:
+        return '', footnotes
+    for chunk in iter_chunks(data, chunk_bytes):
+        _, chunk_links, chunk_footnotes = split_blocks(chunk)
+        if chunk_links:
+            links.append(chunk_links)
+        footnotes.update(chunk_footnotes)
+    return '\n'.join(links), footnotes
+
+
+def iter_sources(data, chunk_bytes=CHUNK_BYTES, definitions=None):
+    """逐块产出可单独转换的 Markdown 源码
+
+    文档中有链接/脚注定义时，先扫描一遍收集全部定义（只保留定义本身），
+    再把各块中的定义移除，附加上全部链接定义和该块引用的脚注定义。
+    definitions 为已经收集好的 (链接定义, 脚注定义)，不给出时在这里扫描。
+    """
+    links, footnotes = definitions if definitions is not None else _definitions(data, chunk_bytes)
+    for chunk in iter_chunks(data, chunk_bytes):
+        if links or footnotes:
+            blocks, _, _ = split_blocks(chunk)
+            chunk = '\n\n'.join(blocks)
+            extra = [footnotes[label] for label in
+                     OrderedDict.fromkeys(_FOOTNOTE_REF_RE.findall(chunk))
+                     if label in footnotes]
+            if links:
+                extra.append(links)
+            chunk = '\n\n'.join([chunk] + extra)
+        yield chunk
+
+
+def write_html(converter, data, out, title="Document", stylesheet='inline', minify=False,
+               asset_url=DEFAULT_ASSET_URL, base_dir=None, embed_images=False,
+               chunk_bytes=CHUNK_BYTES):
+    """逐块转换为 HTML 并写入二进制流 out，选项同 MarkdownConverter.to_html
+
+    各块的脚注区去掉，脚注统一编号后在末尾只输出一次。
+    """
+    shell = html_shell(stylesheet, minify, asset_url)
+    out.write(shell.head_bytes + html_escape(title, quote=False).encode('utf-8')
+              + shell.head_end_bytes)
+    links, footnotes = definitions = _definitions(data, chunk_bytes)
+    merger = FootnoteMerger(footnotes) if footnotes else None
+    used, counters = set(), {}
+    separator = b''
+    
+    def write(html):
+        nonlocal separator
+        body = minify_html(html) if minify else html
+        if body:
+            out.write(separator + body.encode('utf-8'))
+            separator = b'\n'
+    
+    for source in iter_sources(data, chunk_bytes, definitions):
+        parts = [converter._convert_markdown(source, base_dir, embed_images)]
+        if merger is not None:
+            parts[0] = merger.strip(parts[0])
+        _fix_heading_ids(parts, used, counters, [explicit_ids(source)])
+        write(parts[0])
+    if merger is not None:
+        missing = merger.missing()
+        if missing:
+            # 没有被引用的脚注也和整篇转换一样列出
+            merger.strip(converter._convert_markdown(
+                '\n\n'.join([footnotes[label] for label in missing] + [links])))
+        write(merger.render())
+    out.write(shell.tail_bytes)
+
+
+def write_docx(converter, data, out, base_dir=None, chunk_bytes=CHUNK_BYTES):
+    """逐块转换为 DOCX 并写入二进制流 out；写完的正文暂存在临时文件中"""
+    from docx_writer import BodySpool, DocxTreeWriter, save_document
+
+    with converter._stage('docx.document'):
+        doc = converter._new_docx_document()
+    with BodySpool(doc) as body:
+        for source in iter_sources(data, chunk_bytes):
+            with converter._pool.borrow() as md:
+                root = converter._markdown_tree(md, source)
+                if root is None:
+                    continue
+                images = (converter._load_images(root, base_dir, md.htmlStash)
+                          if base_dir is not None else None)
+                with converter._stage('docx.walk'):
+                    DocxTreeWriter(doc, md.htmlStash, converter.diagrams, images).write(root)
+            body.flush()
+        with converter._stage('docx.save'):
+            save_document(doc, out, converter.docx_compression, body=body)
+
+
+def write_pdf(converter, data, out, title="Document", chunk_bytes=CHUNK_BYTES):
+    """逐块解析并写入同一个 PDF（页面仍全部保存在内存中，直到最后输出）"""
+    from pdf_writer import PdfTreeWriter, new_pdf
+
+    with converter._stage('pdf.document'):
+        pdf = new_pdf(title)
+    for source in iter_sources(data, chunk_bytes):
+        with converter._pool.borrow() as md:
+            root = converter._markdown_tree(md, source)
+            if root is not None:
+                with converter._stage('pdf.walk'):
+                    PdfTreeWriter(pdf, md.htmlStash).write(root)
+    with converter._stage('pdf.save'):
+        out.write(pdf.output())
+
+
+def convert_large(converter, input_file, output_file, fmt, title=None, embed_images=False,
+                  chunk_bytes=CHUNK_BYTES):
+    """以大文档模式转换单个文件，返回 (源文件 SHA-256, 字节数)"""
+    import os
+
+    base_dir = os.path.dirname(os.path.abspath(input_file))
+    with open_source(input_file) as data, open(output_file, 'wb') as out:
+        digest = hashlib.sha256(data).hexdigest()
+        if fmt == 'html':
+            write_html(converter, data, out, title=title or input_file, base_dir=base_dir,
+                       embed_images=embed_images, chunk_bytes=chunk_bytes)
+        elif fmt == 'pdf':
+            write_pdf(converter, data, out, title=title or input_file, chunk_bytes=chunk_bytes)
+        else:
+            write_docx(converter, data, out, base_dir=base_dir, chunk_bytes=chunk_bytes)
+        return digest, len(data)
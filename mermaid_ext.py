@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Mermaid 代码块的 Markdown 扩展
+服务端不渲染图表：前端 index.html 渲染后上传的图片（按图表源码哈希查找）存在时嵌入图片，
+否则把 ```mermaid 代码块替换为提示
+"""
+
+import base64
+import hashlib
+import re
+import xml.etree.ElementTree as etree
+
+from markdown.extensions import Extension
+from markdown.preprocessors import Preprocessor
+
+MERMAID_NOTE = '📊 Mermaid 图表（在前端版本 index.html 中可查看完整图表）'
+MERMAID_ALT = 'Mermaid 图表'
+
+# 图片类型 -> MIME 类型；HTML 优先嵌入 SVG，DOCX 只能嵌入 PNG
+DIAGRAM_TYPES = {'svg': 'image/svg+xml', 'png': 'image/png'}
+
+
+def diagram_digest(source):
+    """图表源码的哈希：忽略行首尾空白、行内连续空白和空行，换行符统一为 \n
+
+    前端（marked）和服务端（python-markdown）取到的代码块在缩进、制表符和
+    行尾空白上可能不同，归一化后两边得到同一个哈希。
+    """
+    lines = (' '.join(line.split()) for line in source.splitlines())
+    normalized = '\n'.join(line for line in lines if line)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+# 围栏开始行；与 fenced_code 一致，从行首开始，结束行与开始的围栏完全相同
+_FENCE_OPEN_RE = re.compile(r'^(~{3,}|`{3,})(.*)$')
+_MERMAID_INFO_RE = re.compile(r'^[ ]*\{?\.?mermaid\}?[ ]*$')
+
+
+def iter_mermaid_blocks(lines):
+    """逐行扫描，产出 (开始行号, 结束行号, 源码)
+
+    记录当前所在的围栏：其他围栏代码块（如 ````markdown 示例）中的 ```mermaid
+    只是代码文本，不算图表。没有结束围栏的代码块不产出。
+    """
+    fence = None
+    start = 0
+    for i, line in enumerate(lines):
+        if fence is not None:
+            if line.rstrip(' ') == fence:
+                if mermaid:
+                    yield start, i, '\n'.join(lines[start + 1:i]) + '\n'
+                fence = None
+            continue
+        m = _FENCE_OPEN_RE.match(line)
+        if m:
+            fence, start = m.group(1), i
+            mermaid = _MERMAID_INFO_RE.match(m.group(2)) is not None
+
+
+def mermaid_sources(md_content):
+    """文档中全部 Mermaid 代码块的源码"""
+    if 'mermaid' not in md_content:
+        return []
+    lines = md_content.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return [code for _, _, code in iter_mermaid_blocks(lines)]
+
+
+class MermaidPreprocessor(Preprocessor):
+    """在 fenced_code 之前把 ```mermaid 代码块替换为图片或占位提示
+
+    md.mermaid_diagrams 为图表图片的查询对象（get(哈希) 返回 {类型: 字节}，
+    由 MarkdownConverter 在每次转换前设置）。查到图片时生成
+    <div class="mermaid-diagram" data-digest="..."><img src="data:..."></div>，
+    SVG 也以 <img> 引用，其中的脚本不会执行；否则生成 mermaid-note 提示。
+    div 以 Element 形式存入 htmlStash，由 Markdown 自身的序列化一次输出，
+    不需要对生成的 HTML 再做一遍解析。
+    """
+    
+    def run(self, lines):
+        if not any('mermaid' in line for line in lines):
+            return lines
+        
+        diagrams = getattr(self.md, 'mermaid_diagrams', None)
+        new_lines = []
+        done = 0
+        for start, end, code in iter_mermaid_blocks(lines):
+            images = None
+            if diagrams is not None:
+                digest = diagram_digest(code)
+                images = diagrams.get(digest)
+            if images:
+                element = self._diagram(digest, images)
+            else:
+                element = etree.Element('div', {'class': 'mermaid-note'})
+                element.text = MERMAID_NOTE
+            new_lines.extend(lines[done:start])
+            new_lines.extend(['', self.md.htmlStash.store(element), ''])
+            done = end + 1
+        if not done:
+            return lines
+        new_lines.extend(lines[done:])
+        return new_lines
+    
+    @staticmethod
+    def _diagram(digest, images):
+        kind = 'svg' if 'svg' in images else 'png'
+        data = base64.b64encode(images[kind]).decode('ascii')
+        div = etree.Element('div', {'class': 'mermaid-diagram', 'data-digest': digest})
+        etree.SubElement(div, 'img', {'src': f'data:{DIAGRAM_TYPES[kind]};base64,{data}',
+                                      'alt': MERMAID_ALT})
+        return div
+
+
+class MermaidExtension(Extension):
+    """Mermaid 代码块处理"""
+    
+    def extendMarkdown(self, md):
+        # normalize_whitespace(30) 之后、fenced_code_block(25) 之前
+        md.preprocessors.register(MermaidPreprocessor(md), 'mermaid', 28)
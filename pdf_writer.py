@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PDF 生成
+用 fpdf2 直接排版 Markdown 元素树（与 DOCX 共用同一棵树），不经过浏览器；
+中文字体只嵌入文档实际用到的字形子集
+"""
+
+import os
+
+from tree_writer import TreeWriter
+
+# 字体查找顺序：环境变量 MD2E_PDF_FONT 指定的文件，然后是各平台常见的中文字体
+PDF_FONT_ENV = 'MD2E_PDF_FONT'
+CJK_FONT_CANDIDATES = [
+    # Windows
+    'C:/Windows/Fonts/msyh.ttc',
+    'C:/Windows/Fonts/simhei.ttf',
+    'C:/Windows/Fonts/simsun.ttc',
+    # macOS
+    '/System/Library/Fonts/PingFang.ttc',
+    '/System/Library/Fonts/STHeiti Medium.ttc',
+    '/Library/Fonts/Arial Unicode.ttf',
+    # Linux
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/usr/share/fonts/wqy-microhei/wqy-microhei.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+    '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf',
+]
+
+FONT_FAMILY = 'cjk'
+MERMAID_PDF_NOTE = '[Mermaid 图表 - 请在 HTML/前端版本查看]'
+
+# 标签 -> (字号 pt, 颜色)，与 HTML 样式的标题颜色一致
+HEADING_STYLES = {
+    'h1': (22, (102, 126, 234)),
+    'h2': (18, (73, 80, 87)),
+    'h3': (15, (108, 117, 125)),
+    'h4': (13, (134, 142, 150)),
+    'h5': (12, (134, 142, 150)),
+    'h6': (11, (134, 142, 150)),
+}
+
+BODY_SIZE = 11
+CODE_SIZE = 9
+TEXT_COLOR = (51, 51, 51)
+MUTED_COLOR = (108, 117, 125)
+ACCENT_COLOR = (102, 126, 234)
+RULE_COLOR = (233, 236, 239)
+CODE_FILL = (248, 249, 250)
+NOTE_FILL = (255, 243, 205)
+NOTE_COLOR = (133, 100, 4)
+
+
+def find_cjk_font():
+    """返回可用的中文字体文件路径，找不到返回 None"""
+    path = os.environ.get(PDF_FONT_ENV)
+    if path:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f'{PDF_FONT_ENV} 指定的字体不存在: {path}')
+        return path
+    for candidate in CJK_FONT_CANDIDATES:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def new_pdf(title="Document"):
+    """创建已加载中文字体、添加了第一页的 FPDF 文档"""
+    try:
+        from fpdf import FPDF
+    except ImportError:
+        raise RuntimeError('PDF 导出需要安装 fpdf2：pip install fpdf2') from None
+
+    font_path = find_cjk_font()
+    if font_path is None:
+        raise RuntimeError(f'未找到中文字体，请用环境变量 {PDF_FONT_ENV} 指定 .ttf/.otf/.ttc 字体文件')
+
+    pdf = FPDF(format='A4')
+    pdf.set_margins(20, 20, 20)
+    pdf.set_auto_page_break(True, margin=20)
+    pdf.set_title(title)
+    pdf.set_creator('md2everything')
+    # fpdf2 输出时用 fontTools 对字体做子集化，只嵌入用到的字形
+    pdf.add_font(FONT_FAMILY, '', font_path)
+    pdf.add_page()
+    pdf.set_font(FONT_FAMILY, size=BODY_SIZE)
+    pdf.set_text_color(*TEXT_COLOR)
+    return pdf
+
+
+def _is_cjk(text):
+    return any(ch >= '\u2e80' for ch in text)
+
+
+class PdfTreeWriter(TreeWriter):
+    """把 Markdown 元素树排版到 fpdf2 文档"""
+
+    def __init__(self, pdf, html_stash):
+        super().__init__(html_stash)
+        self.pdf = pdf
+        self._cmap = pdf.fonts[FONT_FAMILY].cmap
+        self._dropped = {}
+        from fpdf.enums import WrapMode, XPos, YPos
+        self._char_wrap = WrapMode.CHAR
+        self._word_wrap = WrapMode.WORD
+        self._next_line = {'new_x': XPos.LMARGIN, 'new_y': YPos.NEXT}
+
+    def _process_element(self, element):
+        """处理元素的直接子节点"""
+        pdf = self.pdf
+        for child in element:
+            tag = child.tag
+
+            if tag in HEADING_STYLES:
+                size, color = HEADING_STYLES[tag]
+                pdf.ln(size * 0.25)
+                self._paragraph(self._text(child).strip(), size=size, color=color)
+                if tag in ('h1', 'h2'):
+                    self._rule(ACCENT_COLOR if tag == 'h1' else RULE_COLOR,
+                               0.8 if tag == 'h1' else 0.4)
+                pdf.ln(1)
+
+            elif tag == 'p':
+                index = self._block_placeholder(child)
+                if index is not None and self._is_stashed_code(index):
+                    self._code(self._stash_item_text(index))
+                else:
+                    self._paragraph(self._text(child).strip())
+
+            elif tag in ('ul', 'ol'):
+                for number, li in enumerate(child.iterfind('li'), 1):
+                    marker = None if tag == 'ul' else f'{number}.'
+                    self._paragraph(self._text(li).strip(), indent=6, marker=marker)
+                pdf.ln(1)
+
+            elif tag == 'table':
+                self._table(child)
+
+            elif tag == 'div' and child.get('class') in ('mermaid-note', 'mermaid-diagram'):
+                self._note(MERMAID_PDF_NOTE)
+
+            elif tag == 'pre':
+                self._code(self._text(child))
+
+            elif tag == 'blockquote':
+                self._paragraph(self._text(child).strip(), indent=8, color=MUTED_COLOR)
+
+            elif tag == 'hr':
+                pdf.ln(2)
+                self._rule(RULE_COLOR, 0.5)
+                pdf.ln(2)
+
+    # ---- 排版 ----
+
+    def _printable(self, text):
+        """去掉字体中没有字形的字符（emoji 等），避免输出空白方框"""
+        dropped = self._dropped
+        for ch in set(text):
+            if ch not in dropped:
+                dropped[ch] = ord(ch) not in self._cmap and not ch.isspace()
+        if any(dropped[ch] for ch in text):
+            text = ''.join(ch for ch in text if not dropped[ch])
+        return text
+
+    def _multi_cell(self, width, line_height, text, **kwargs):
+        text = self._printable(text)
+        wrapmode = self._char_wrap if _is_cjk(text) else self._word_wrap
+        self.pdf.multi_cell(width, line_height, text, wrapmode=wrapmode,
+                            **self._next_line, **kwargs)
+
+    def _paragraph(self, text, size=BODY_SIZE, color=TEXT_COLOR, indent=0, marker=''):
+        """一段文字；marker 为列表序号，None 表示无序列表的圆点"""
+        text = self._printable(text).strip()
+        if not text:
+            return
+        pdf = self.pdf
+        pdf.set_font(size=size)
+        pdf.set_text_color(*color)
+        line_height = size * 0.55
+        pdf.set_x(pdf.l_margin + indent)
+        if marker is None:
+            radius = size * 0.06
+            pdf.set_fill_color(*color)
+            pdf.circle(pdf.get_x() + 1.5, pdf.get_y() + line_height / 2, radius, style='F')
+            pdf.set_x(pdf.get_x() + 5)
+            indent += 5
+        elif marker:
+            pdf.cell(7, line_height, marker)
+            indent += 7
+        self._multi_cell(pdf.epw - indent, line_height, text, align='L')
+        pdf.ln(1.5)
+        pdf.set_font(size=BODY_SIZE)
+        pdf.set_text_color(*TEXT_COLOR)
+
+    def _code(self, code_text):
+        code_text = code_text.rstrip('\n').expandtabs(4)
+        if not code_text:
+            return
+        pdf = self.pdf
+        pdf.set_font(size=CODE_SIZE)
+        pdf.set_fill_color(*CODE_FILL)
+        self._multi_cell(0, CODE_SIZE * 0.5, code_text, align='L', fill=True, padding=3)
+        pdf.ln(3)
+        pdf.set_font(size=BODY_SIZE)
+
+    def _note(self, text):
+        pdf = self.pdf
+        pdf.set_text_color(*NOTE_COLOR)
+        pdf.set_fill_color(*NOTE_FILL)
+        pdf.set_draw_color(255, 193, 7)
+        self._multi_cell(0, BODY_SIZE * 0.55, text, align='C', fill=True, border=1, padding=4)
+        pdf.ln(3)
+        pdf.set_text_color(*TEXT_COLOR)
+
+    def _rule(self, color, width):
+        pdf = self.pdf
+        pdf.set_draw_color(*color)
+        pdf.set_line_width(width)
+        pdf.line(pdf.l_margin, pdf.get_y(), pdf.l_margin + pdf.epw, pdf.get_y())
+        pdf.set_line_width(0.2)
+        pdf.ln(1)
+
+    def _table(self, table_element):
+        from fpdf.fonts import FontFace
+
+        rows = self._table_rows(table_element)
+        if not rows or not rows[0]:
+            return
+        cols = len(rows[0])
+        pdf = self.pdf
+        pdf.set_font(size=BODY_SIZE - 1)
+        pdf.set_draw_color(*RULE_COLOR)
+        with pdf.table(
+            headings_style=FontFace(color=255, fill_color=ACCENT_COLOR),
+            cell_fill_color=CODE_FILL,
+            cell_fill_mode='ROWS',
+            line_height=BODY_SIZE * 0.55,
+            text_align='LEFT',
+            wrapmode=self._char_wrap,
+            padding=1.5,
+        ) as table:
+            for cells in rows:
+                cells = (cells + [''] * cols)[:cols]
+                row = table.row()
+                for text in cells:
+                    row.cell(self._printable(text))
+        pdf.ln(3)
+        pdf.set_font(size=BODY_SIZE)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+慢转换剖析
+按采样率抽中的转换用 cProfile 完整记录；其余转换由一个公共线程定时采集调用栈，
+超过耗时阈值时把采样结果（folded 格式，可直接用 flamegraph.pl / speedscope 查看）
+连同输入哈希和文档统计保存到磁盘
+"""
+
+import cProfile
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+CPROFILE = 'cprofile'
+STACKS = 'stacks'
+
+# 剖析文件的扩展名
+SUFFIXES = {CPROFILE: '.prof', STACKS: '.folded'}
+
+_ID_RE = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+
+class StackSampler:
+    """每隔 interval 秒采集一次已登记线程的调用栈
+
+    采样线程在第一次登记时启动，没有登记的线程时阻塞等待，不占用 CPU。
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._targets = {}   # 线程 id -> Counter(调用栈 -> 次数)
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """开始采集当前线程"""
+        with self._lock:
+            self._targets[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='md2e-profiler',
+                                                daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        """停止采集当前线程，返回 Counter(调用栈 -> 次数)，调用栈为从外到内的代码对象元组"""
+        with self._lock:
+            return self._targets.pop(threading.get_ident(), Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._targets
+            if idle:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, counter in self._targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        counter[_stack(frame)] += 1
+            del frames
+
+
+def _stack(frame):
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return tuple(codes)
+
+
+def folded_stacks(samples):
+    """Counter(调用栈 -> 次数) -> folded 文本（每行“帧;帧;... 次数”，按次数降序）"""
+    lines = []
+    for stack, count in samples.most_common():
+        frames = ';'.join(f'{code.co_name} ({os.path.basename(code.co_filename)}:'
+                          f'{code.co_firstlineno})' for code in stack)
+        lines.append(f'{frames} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class ProfileStore:
+    """剖析结果目录：每个剖析一个数据文件和一个同名 .json 元数据，超过 max_profiles 时删除最旧的"""
+
+    def __init__(self, directory, max_profiles=50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, meta, kind, write):
+        """write(path) 写入剖析数据；返回剖析 id"""
+        profile_id = time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:8]
+        data_path = os.path.join(self.directory, profile_id + SUFFIXES[kind])
+        write(data_path)
+        meta = dict(meta, id=profile_id, kind=kind, size=os.path.getsize(data_path))
+        with open(os.path.join(self.directory, profile_id + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        self._prune()
+        return profile_id
+
+    def list(self):
+        """全部剖析的元数据，最新的在前"""
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith('.json') or not _ID_RE.match(name[:-5]):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue   # 正在写入或已被删除
+        return profiles
+
+    def get(self, profile_id):
+        """返回 (数据文件路径, 元数据)，不存在返回 None"""
+        if not _ID_RE.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + '.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = os.path.join(self.directory, profile_id + SUFFIXES.get(meta.get('kind'), ''))
+        return (path, meta) if os.path.isfile(path) else None
+
+    def _prune(self):
+        with self._lock:
+            ids = sorted(name[:-5] for name in os.listdir(self.directory)
+                         if name.endswith('.json') and _ID_RE.match(name[:-5]))
+            for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+                for suffix in ('.json',) + tuple(SUFFIXES.values()):
+                    try:
+                        os.remove(os.path.join(self.directory, profile_id + suffix))
+                    except FileNotFoundError:
+                        pass
+
+
+class ConversionProfiler:
+    """为单次转换选择剖析方式，结束后按条件保存
+
+    slow_seconds 为 0 时不采集调用栈，sample_rate 为 0 时不做 cProfile 抽样。
+    同一时刻只运行一个 cProfile（Python 3.12 起 cProfile 是全进程的），
+    已有 cProfile 在运行时抽中的转换改为采集调用栈。
+    """
+
+    def __init__(self, store, slow_seconds=5.0, sample_rate=0.0, interval=0.01):
+        self.store = store
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.sampler = StackSampler(interval)
+        self._cprofile_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._counters = {'sampled': 0, 'slow': 0, 'saved': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.slow_seconds or self.sample_rate)
+
+    @contextmanager
+    def profile(self, info, document_stats):
+        """剖析 with 块中的转换；info 为写入元数据的输入信息，document_stats() 在保存时调用"""
+        sampled = (self.sample_rate and random.random() < self.sample_rate
+                   and self._cprofile_lock.acquire(blocking=False))
+        if sampled:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif self.slow_seconds:
+            self.sampler.start()
+        else:
+            yield
+            return
+
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if sampled:
+                profiler.disable()
+                self._cprofile_lock.release()
+            else:
+                samples = self.sampler.stop()
+            slow = bool(self.slow_seconds) and elapsed >= self.slow_seconds
+            if sampled or slow:
+                meta = dict(info, created=time.time(), seconds=round(elapsed, 4),
+                            trigger='sampled' if sampled else 'slow', slow=slow, error=error,
+                            stats=document_stats())
+                if sampled:
+                    self._save(meta, CPROFILE, profiler.dump_stats)
+                else:
+                    meta['interval'] = self.sampler.interval
+                    meta['samples'] = sum(samples.values())
+                    self._save(meta, STACKS, lambda path: _write_text(path, folded_stacks(samples)))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def _save(self, meta, kind, write):
+        try:
+            self.store.save(meta, kind, write)
+            saved = True
+        except OSError as e:
+            print(f'保存剖析结果失败: {e}')
+            saved = False
+        with self._lock:
+            self._counters[meta['trigger']] += 1
+            self._counters['saved'] += saved
+
+
+def _write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+转换结果缓存
+以 Markdown 内容哈希 + 输出格式 + 标题 + 转换器选项为键，
+内存 LRU 为一级缓存，磁盘目录为二级缓存（按总大小淘汰）
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+
+def hash_source(data):
+    """计算 Markdown 源内容的哈希（str 按 UTF-8 编码）"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class RenderCache:
+    """内存 LRU + 磁盘二级缓存，线程安全"""
+
+    def __init__(self, directory=None, max_memory_bytes=64 * 1024 * 1024,
+                 max_memory_items=256, max_disk_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # key -> bytes
+        self._memory_bytes = 0
+        self._disk = OrderedDict()     # key -> size，按最近使用排序
+        self._disk_bytes = 0
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(source_digest, fmt, title, options=None):
+        """由源内容哈希、输出格式、标题和转换器选项生成缓存键"""
+        payload = json.dumps(
+            [source_digest, fmt, title, options or {}],
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def __contains__(self, key):
+        """是否有该条目（不计入命中/未命中，不改变 LRU 顺序）"""
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get(self, key):
+        """命中返回 bytes，未命中返回 None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return data
+            on_disk = key in self._disk
+            if on_disk:
+                self._disk.move_to_end(key)
+
+        if on_disk:
+            data = self._read_disk(key)
+            if data is not None:
+                with self._lock:
+                    self._counters['disk_hits'] += 1
+                    self._remember(key, data)
+                return data
+
+        with self._lock:
+            self._counters['misses'] += 1
+        return None
+
+    def open(self, key):
+        """命中返回可读的二进制文件对象，未命中返回 None
+
+        超过内存层上限的条目直接打开磁盘上的文件（可交给 send_file 发送），不整份读入内存。
+        """
+        with self._lock:
+            size = self._disk.get(key) if key not in self._memory else None
+            large = size is not None and size > self.max_memory_bytes
+            if large:
+                self._disk.move_to_end(key)
+        if not large:
+            data = self.get(key)
+            return None if data is None else BytesIO(data)
+
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+                self._counters['misses'] += 1
+            return None
+        with self._lock:
+            self._counters['disk_hits'] += 1
+        return f
+
+    def put(self, key, data):
+        """写入缓存（内存 + 磁盘）"""
+        with self._lock:
+            self._counters['stores'] += 1
+            self._remember(key, data)
+        if self.directory:
+            self._write_disk(key, data)
+
+    def put_file(self, key, f, size):
+        """从文件对象的当前位置读到末尾写入缓存，size 为读取的字节数
+
+        超过内存层上限的输出只流式复制到磁盘，不读入内存。
+        """
+        if size <= self.max_memory_bytes:
+            self.put(key, f.read())
+            return
+        with self._lock:
+            self._counters['stores'] += 1
+        if self.directory:
+            self._write_disk(key, f, size)
+
+    def stats(self):
+        """命中/未命中/淘汰计数及当前占用"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['hits'] = stats['memory_hits'] + stats['disk_hits']
+            stats['memory_items'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+            stats['disk_items'] = len(self._disk)
+            stats['disk_bytes'] = self._disk_bytes
+        return stats
+
+    def clear(self):
+        """清空内存与磁盘缓存"""
+        with self._lock:
+            keys = list(self._disk)
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._disk.clear()
+            self._disk_bytes = 0
+        for key in keys:
+            self._remove_file(key)
+
+    # ---- 内存层 ----
+
+    def _remember(self, key, data):
+        """放入内存 LRU（调用方持有锁）"""
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while (self._memory_bytes > self.max_memory_bytes
+               or len(self._memory) > self.max_memory_items):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters['memory_evictions'] += 1
+
+    # ---- 磁盘层 ----
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _load_disk_index(self):
+        """启动时扫描磁盘目录，按修改时间恢复 LRU 顺序"""
+        entries = []
+        for sub in os.listdir(self.directory):
+            sub_dir = os.path.join(self.directory, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    st = os.stat(os.path.join(sub_dir, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name, st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # 刷新 mtime，重启后仍保持 LRU 顺序
+            return data
+        except OSError:
+            # 文件被外部删除：同步索引
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+
+    def _write_disk(self, key, data, size=None):
+        """data 为 bytes，或可读的文件对象（此时 size 为其大小）"""
+        if size is None:
+            size = len(data)
+        if size > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                if isinstance(data, (bytes, bytearray)):
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(data, f, 1024 * 1024)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        evicted = []
+        with self._lock:
+            old = self._disk.pop(key, None)
+            if old is not None:
+                self._disk_bytes -= old
+            self._disk[key] = size
+            self._disk_bytes += size
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self._counters['disk_evictions'] += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._remove_file(old_key)
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
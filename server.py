@@ -2,15 +2,189 @@
 # -*- coding: utf-8 -*-
 """
 Markdown 转换 Web 服务 - 简化版
-HTML 导出可通过浏览器打印为 PDF
+支持 HTML、Word (DOCX) 和 PDF 导出
 """
 
-from flask import Flask, request, send_file, render_template_string
+import codecs
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from io import BytesIO
+
+from flask import (Flask, Request, Response, current_app, request, send_file,
+                   render_template_string, jsonify)
+from werkzeug.http import dump_options_header
 from werkzeug.utils import secure_filename
-from converter import MarkdownConverter
+from converter import MarkdownConverter, HTML_ASSETS, document_stats, render_worker
+from diagram_cache import DiagramCache
+from jobs import DONE, JobQueue, QueueFull
+from render_cache import RenderCache, hash_source
+from highlight_cache import highlight_cache, warm_up
+from mermaid_ext import DIAGRAM_TYPES
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from profiler import ConversionProfiler, ProfileStore
+
+
+class SpooledRequest(Request):
+    """上传文件超过 UPLOAD_SPOOL_THRESHOLD 时写入临时文件，不占用 worker 内存"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return tempfile.SpooledTemporaryFile(
+            max_size=current_app.config['UPLOAD_SPOOL_THRESHOLD'], mode='rb+')
+
 
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+app.request_class = SpooledRequest
+
+# 上传大小上限（MB，可用环境变量 MD2E_MAX_UPLOAD_MB 调整）；超过 UPLOAD_SPOOL_THRESHOLD
+# 的上传先落盘，读取时不会同时持有原始字节和解码后的文本。但转换仍是整篇进行，
+# 内存占用随文档大小线性增长（约为输入的 4 倍），提高上限前先评估内存；
+# 更大的文档用命令行转换（不小于 8 MB 时自动使用分块转换的大文档模式）
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MD2E_MAX_UPLOAD_MB', 16)) * 1024 * 1024
+app.config['UPLOAD_SPOOL_THRESHOLD'] = 1024 * 1024
+# DOCX 输出直接写入 SpooledTemporaryFile；超过此大小的落盘后用 send_file 发送，
+# 请求中不再同时持有整份文档的多份拷贝
+app.config['OUTPUT_SPOOL_THRESHOLD'] = 1024 * 1024
+
+# 渲染缓存：内存 LRU + 磁盘目录（按总大小淘汰）
+app.config['RENDER_CACHE_DIR'] = os.environ.get(
+    'MD2E_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'md2everything-cache'))
+app.config['RENDER_CACHE_MEMORY_BYTES'] = 64 * 1024 * 1024
+app.config['RENDER_CACHE_DISK_BYTES'] = 512 * 1024 * 1024
+
+# 前端上传的 Mermaid 图表图片（按图表源码哈希保存，转换时嵌入）
+app.config['MERMAID_CACHE_DIR'] = os.environ.get(
+    'MD2E_MERMAID_DIR', os.path.join(tempfile.gettempdir(), 'md2everything-mermaid'))
+
+# HTML 导出默认选项（可被表单字段 stylesheet / minify 覆盖）
+# stylesheet: inline 内嵌样式；external 引用 /assets/ 下内容哈希命名的样式和脚本
+app.config['HTML_STYLESHEET'] = 'inline'
+app.config['HTML_MINIFY'] = False
+
+# 异步任务（/jobs）：工作线程数、未完成任务上限、结果保留秒数、结果总大小上限、长轮询最长等待秒数
+app.config['JOB_WORKERS'] = int(os.environ.get('MD2E_JOB_WORKERS', 2))
+app.config['JOB_MAX_PENDING'] = 64
+app.config['JOB_RESULT_TTL'] = 600
+app.config['JOB_MAX_RESULT_BYTES'] = 256 * 1024 * 1024
+app.config['JOB_MAX_WAIT'] = 60
+# 允许的回调主机（逗号分隔，环境变量 MD2E_CALLBACK_HOSTS）；为空时只允许解析到公网地址的主机
+app.config['JOB_CALLBACK_HOSTS'] = [
+    host.strip().lower() for host in os.environ.get('MD2E_CALLBACK_HOSTS', '').split(',')
+    if host.strip()]
+
+# 批量转换（/batch）：工作进程数（默认 CPU 核数）和单次最多文件数
+app.config['BATCH_WORKERS'] = int(os.environ.get('MD2E_BATCH_WORKERS', os.cpu_count() or 1))
+app.config['BATCH_MAX_FILES'] = 200
+
+# 慢转换剖析：超过阈值（毫秒，0 表示关闭）的转换保存调用栈采样，
+# 按采样率（0~1）抽中的转换保存完整的 cProfile；/profiles 只允许本机访问
+app.config['PROFILE_SLOW_MS'] = int(os.environ.get('MD2E_PROFILE_SLOW_MS', 5000))
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('MD2E_PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_DIR'] = os.environ.get(
+    'MD2E_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'md2everything-profiles'))
+app.config['PROFILE_MAX_STORED'] = 50
+
+# 代码高亮缓存条目数（0 表示关闭）
+app.config['HIGHLIGHT_CACHE_ENTRIES'] = int(os.environ.get('MD2E_HIGHLIGHT_CACHE_ENTRIES', 4096))
+
+# DOCX 的 zip 压缩级别：不设置为默认 deflate，0 只存储不压缩（最快，体积约大 10 倍），1~9 为 deflate 级别
+app.config['DOCX_COMPRESSION'] = (int(os.environ['MD2E_DOCX_COMPRESSION'])
+                                  if os.environ.get('MD2E_DOCX_COMPRESSION') else None)
+
+MIMETYPES = {
+    'html': 'text/html',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'pdf': 'application/pdf',
+}
+
+diagram_cache = DiagramCache(directory=app.config['MERMAID_CACHE_DIR'])
+
+# 转换器线程安全，所有请求共享同一个实例（内部维护 Markdown 解析器池）
+converter = MarkdownConverter(docx_compression=app.config['DOCX_COMPRESSION'],
+                              diagrams=diagram_cache)
+highlight_cache.max_entries = app.config['HIGHLIGHT_CACHE_ENTRIES']
+
+render_cache = RenderCache(
+    directory=app.config['RENDER_CACHE_DIR'],
+    max_memory_bytes=app.config['RENDER_CACHE_MEMORY_BYTES'],
+    max_disk_bytes=app.config['RENDER_CACHE_DISK_BYTES'],
+)
+
+job_queue = JobQueue(
+    max_workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_MAX_PENDING'],
+    ttl=app.config['JOB_RESULT_TTL'],
+    max_result_bytes=app.config['JOB_MAX_RESULT_BYTES'],
+    callback_hosts=set(app.config['JOB_CALLBACK_HOSTS']) or None,
+)
+
+# 运行指标（GET /metrics，Prometheus 文本格式）
+metrics = MetricsRegistry()
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# 输入大小分档（字节上界, 标签）
+INPUT_SIZE_CLASSES = (
+    (16 * 1024, '<=16KiB'),
+    (128 * 1024, '<=128KiB'),
+    (1024 * 1024, '<=1MiB'),
+    (8 * 1024 * 1024, '<=8MiB'),
+)
+CONVERSION_SECONDS = metrics.histogram(
+    'md2e_conversion_seconds', '实际转换耗时（秒，不含缓存命中），按格式和输入大小分档',
+    ('format', 'input_size'), LATENCY_BUCKETS)
+STAGE_SECONDS = metrics.histogram(
+    'md2e_stage_seconds', '本进程中转换各阶段的耗时（秒），Markdown 处理器按扩展注册名区分',
+    ('stage',), LATENCY_BUCKETS)
+CONVERSIONS_IN_FLIGHT = metrics.gauge(
+    'md2e_conversions_in_flight', '正在进行（含批量转换已提交未完成）的转换数', ('format',))
+CONVERSION_ERRORS = metrics.counter(
+    'md2e_conversion_errors_total', '转换失败次数', ('format',))
+RENDER_CACHE_LOOKUPS = metrics.counter(
+    'md2e_render_cache_lookups_total', '渲染缓存查询次数', ('format', 'result'))
+
+converter.add_hook(lambda stage, seconds: STAGE_SECONDS.observe(seconds, stage=stage))
+
+profiler = ConversionProfiler(
+    ProfileStore(app.config['PROFILE_DIR'], app.config['PROFILE_MAX_STORED']),
+    slow_seconds=app.config['PROFILE_SLOW_MS'] / 1000,
+    sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+)
+
+
+def _size_class(size):
+    for limit, label in INPUT_SIZE_CLASSES:
+        if size <= limit:
+            return label
+    return '>8MiB'
+
+
+@contextmanager
+def _track_conversion(format_type, digest, size, md_content):
+    """记录一次实际转换的进行中计数、耗时和失败，慢转换和抽中的转换保存剖析结果"""
+    CONVERSIONS_IN_FLIGHT.inc(format=format_type)
+    info = {'format': format_type, 'input_sha256': digest, 'input_size': size}
+    start = time.perf_counter()
+    try:
+        with profiler.profile(info, lambda: document_stats(md_content)):
+            yield
+    except Exception:
+        CONVERSION_ERRORS.inc(format=format_type)
+        raise
+    else:
+        CONVERSION_SECONDS.observe(time.perf_counter() - start,
+                                   format=format_type, input_size=_size_class(size))
+    finally:
+        CONVERSIONS_IN_FLIGHT.dec(format=format_type)
+
+
+def _server_timing(stages):
+    """{阶段: 秒} -> Server-Timing 响应头的值（毫秒）"""
+    return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in stages.items())
 
 # Web 界面 HTML
 HTML_UI = """
@@ -203,15 +377,16 @@ HTML_UI = """
     <div class="container">
         <div class="header">
             <h1>📝 Markdown 转换工具</h1>
-            <p>支持转换为 HTML 和 Word (DOCX)</p>
+            <p>支持转换为 HTML、Word (DOCX) 和 PDF</p>
+            <p style="font-size: 0.9em; margin-top: 8px;">含 Mermaid 图表的文档请先在 <a href="/preview" style="color: white;">预览页</a> 中打开，导出时会嵌入渲染好的图表</p>
         </div>
         
         <div class="content">
             <div class="upload-area" id="uploadArea">
                 <div class="upload-icon">📄</div>
                 <div class="upload-text">点击或拖拽上传 Markdown 文件</div>
-                <div class="upload-hint">支持 .md 和 .markdown 格式 (最大 16MB)</div>
-                <input type="file" id="fileInput" accept=".md,.markdown">
+                <div class="upload-hint">支持 .md 和 .markdown 格式，可多选批量转换为 ZIP (最大 {{ max_upload_mb }}MB)</div>
+                <input type="file" id="fileInput" accept=".md,.markdown" multiple>
             </div>
             
             <div class="file-info" id="fileInfo"></div>
@@ -226,16 +401,18 @@ HTML_UI = """
                     <span class="btn-icon">📥</span>
                     <span>转换为 Word</span>
                 </button>
+                <button class="btn" onclick="convert('pdf')">
+                    <span class="btn-icon">📥</span>
+                    <span>转换为 PDF</span>
+                </button>
             </div>
             
             <div class="status" id="status"></div>
             
             <div class="tip">
                 <strong>💡 导出 PDF 的方法：</strong><br>
-                1. 点击"转换为 HTML" 按钮下载 HTML 文件<br>
-                2. 用浏览器打开 HTML 文件<br>
-                3. 按 Ctrl+P 或点击页面右上角"打印/保存为PDF"按钮<br>
-                4. 在打印对话框中选择"保存为 PDF"
+                1. 点击"转换为 PDF" 按钮，服务端直接生成 PDF<br>
+                2. 需要保留网页样式时，也可以下载 HTML 后在浏览器中按 Ctrl+P 保存为 PDF
             </div>
             
             <div class="features">
@@ -259,7 +436,7 @@ HTML_UI = """
     </div>
     
     <script>
-        let currentFile = null;
+        let currentFiles = [];
         const uploadArea = document.getElementById('uploadArea');
         const fileInput = document.getElementById('fileInput');
         const fileInfo = document.getElementById('fileInfo');
@@ -269,7 +446,7 @@ HTML_UI = """
         
         uploadArea.addEventListener('click', () => fileInput.click());
         fileInput.addEventListener('change', (e) => {
-            if (e.target.files[0]) handleFile(e.target.files[0]);
+            if (e.target.files.length) handleFiles(e.target.files);
         });
         
         uploadArea.addEventListener('dragover', (e) => {
@@ -284,64 +461,88 @@ HTML_UI = """
         uploadArea.addEventListener('drop', (e) => {
             e.preventDefault();
             uploadArea.classList.remove('dragover');
-            if (e.dataTransfer.files[0]) handleFile(e.dataTransfer.files[0]);
+            if (e.dataTransfer.files.length) handleFiles(e.dataTransfer.files);
         });
         
-        function handleFile(file) {
-            if (!file.name.match(/\\.(md|markdown)$/i)) {
+        function handleFiles(fileList) {
+            const files = Array.from(fileList).filter(f => f.name.match(/\\.(md|markdown)$/i));
+            if (!files.length) {
                 showStatus('error', '❌ 请上传 .md 或 .markdown 格式的文件');
                 return;
             }
             
-            currentFile = file;
+            currentFiles = files;
+            const totalSize = files.reduce((sum, f) => sum + f.size, 0);
+            const names = files.length === 1
+                ? files[0].name
+                : `${files.length} 个文件（${files.slice(0, 3).map(f => f.name).join('、')}${files.length > 3 ? ' 等' : ''}）`;
             fileInfo.innerHTML = `
                 <div style="display: flex; justify-content: space-between; align-items: center;">
                     <div>
-                        <strong>📄 文件名：</strong>${file.name}<br>
-                        <strong>📦 大小：</strong>${(file.size / 1024).toFixed(2)} KB
+                        <strong>📄 文件：</strong>${names}<br>
+                        <strong>📦 大小：</strong>${(totalSize / 1024).toFixed(2)} KB
                     </div>
                     <div style="font-size: 2em;">✅</div>
                 </div>
             `;
             fileInfo.classList.add('show');
             exportButtons.style.display = 'grid';
-            showStatus('info', '✨ 文件已就绪，请选择导出格式');
+            if (files.length > 1) {
+                showStatus('info', `✨ 已选择 ${files.length} 个文件，将并行转换并打包为 ZIP`);
+            } else {
+                showStatus('info', '✨ 文件已就绪，请选择导出格式');
+            }
+        }
+        
+        function download(blob, filename) {
+            const url = window.URL.createObjectURL(blob);
+            const a = document.createElement('a');
+            a.href = url;
+            a.download = filename;
+            document.body.appendChild(a);
+            a.click();
+            document.body.removeChild(a);
+            window.URL.revokeObjectURL(url);
         }
         
         async function convert(format) {
-            if (!currentFile) return;
+            if (!currentFiles.length) return;
             
-            const formatNames = { html: 'HTML', docx: 'Word' };
-            showStatus('info', `⏳ 正在转换为 ${formatNames[format]}...`);
+            const formatNames = { html: 'HTML', docx: 'Word', pdf: 'PDF' };
+            const isBatch = currentFiles.length > 1;
+            showStatus('info', isBatch
+                ? `⏳ 正在把 ${currentFiles.length} 个文件转换为 ${formatNames[format]}...`
+                : `⏳ 正在转换为 ${formatNames[format]}...`);
             progress.classList.add('show');
             
             const formData = new FormData();
-            formData.append('file', currentFile);
+            if (isBatch) {
+                currentFiles.forEach(f => formData.append('files', f));
+            } else {
+                formData.append('file', currentFiles[0]);
+            }
             formData.append('format', format);
             
             try {
-                const response = await fetch('/convert', {
+                const response = await fetch(isBatch ? '/batch' : '/convert', {
                     method: 'POST',
                     body: formData
                 });
                 
                 if (response.ok) {
                     const blob = await response.blob();
-                    const url = window.URL.createObjectURL(blob);
-                    const a = document.createElement('a');
-                    a.href = url;
-                    a.download = currentFile.name.replace(/\\.(md|markdown)$/i, `.${format}`);
-                    document.body.appendChild(a);
-                    a.click();
-                    document.body.removeChild(a);
-                    window.URL.revokeObjectURL(url);
-                    
                     progress.classList.remove('show');
                     
-                    if (format === 'html') {
-                        showStatus('success', '✅ HTML 已下载！打开文件后按 Ctrl+P 即可保存为 PDF');
+                    if (isBatch) {
+                        download(blob, `md2everything-${format}.zip`);
+                        showStatus('success', `✅ ${currentFiles.length} 个文件已打包下载（转换失败的文件在 ZIP 中附有 .error.txt 说明）`);
                     } else {
-                        showStatus('success', `✅ ${formatNames[format]} 转换成功！文件已下载`);
+                        download(blob, currentFiles[0].name.replace(/\\.(md|markdown)$/i, `.${format}`));
+                        if (format === 'html') {
+                            showStatus('success', '✅ HTML 已下载！打开文件后按 Ctrl+P 即可保存为 PDF');
+                        } else {
+                            showStatus('success', `✅ ${formatNames[format]} 转换成功！文件已下载`);
+                        }
                     }
                 } else {
                     const error = await response.text();
@@ -366,48 +567,198 @@ HTML_UI = """
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_UI)
+    return render_template_string(
+        HTML_UI, max_upload_mb=app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024))
 
 
-@app.route('/convert', methods=['POST'])
-def convert():
+def _check_upload():
+    """校验上传文件和输出格式，返回 (文件, 格式, 错误信息)"""
     if 'file' not in request.files:
-        return '未上传文件', 400
+        return None, None, '未上传文件'
     
     file = request.files['file']
     format_type = request.form.get('format', 'html')
     
     if not file.filename or not file.filename.endswith(('.md', '.markdown')):
-        return '不支持的文件格式', 400
+        return None, None, '不支持的文件格式'
+    
+    if format_type not in MIMETYPES:
+        return None, None, '不支持的输出格式'
+    return file, format_type, None
+
+
+def _html_options(format_type):
+    """从表单读取 HTML 导出选项，不合法时抛出 ValueError"""
+    if format_type != 'html':
+        return {}
+    stylesheet = request.form.get('stylesheet', app.config['HTML_STYLESHEET'])
+    if stylesheet not in ('inline', 'external'):
+        raise ValueError('不支持的样式模式')
+    minify = request.form.get('minify')
+    html_options = {
+        'stylesheet': stylesheet,
+        'minify': app.config['HTML_MINIFY'] if minify is None else minify in ('1', 'true', 'yes'),
+    }
+    if stylesheet == 'external':
+        # 下载后的文件离开本服务打开，需要绝对地址
+        html_options['asset_url'] = request.host_url + 'assets/'
+    return html_options
+
+
+# 上传文件每次读取的字节数
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _read_upload(file):
+    """分块读取上传文件，边计算哈希边增量解码 UTF-8，返回 (哈希, 文本, 字节数)
+
+    原始字节只以单个分块的形式存在；解码后的分块直接追加到结果字符串上并随即释放。
+    局部字符串只有一个引用时 CPython 原地扩容，不会像 ''.join(parts) 那样
+    在拼接的瞬间同时持有全部分块和拼接结果两份完整文本。
+    """
+    digest = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    text = ''
+    size = 0
+    while True:
+        chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        digest.update(chunk)
+        text += decoder.decode(chunk)
+    text += decoder.decode(b'', final=True)
+    file.close()
+    return digest.hexdigest(), text, size
+
+
+def _cache_key(source_digest, format_type, filename, html_options, diagrams=None):
+    """diagrams 为文档中已有图片的图表（DiagramCache.lookup），图片上传后旧的输出不再命中"""
+    options = dict(converter.cache_options(), **html_options)
+    if diagrams:
+        options['mermaid'] = sorted(f'{digest}.{kind}'
+                                    for digest, images in diagrams.items() for kind in images)
+    return render_cache.make_key(source_digest, format_type, filename, options)
+
+
+def _render(key, md_content, format_type, filename, html_options, digest, size):
+    """完整转换为字节串并写入渲染缓存；digest、size 为输入的哈希和字节数（用于指标和剖析）"""
+    with _track_conversion(format_type, digest, size, md_content):
+        data = converter.render(md_content, format_type, filename, **html_options)
+    render_cache.put(key, data)
+    return data
+
+
+def _render_docx(key, md_content, digest, size):
+    """把 DOCX 直接写入临时文件并存入渲染缓存
+
+    不超过 OUTPUT_SPOOL_THRESHOLD 时返回字节串；更大的输出已经落盘，
+    返回指向开头的临时文件（缓存以流式复制写入磁盘层），由 send_file 发送后关闭。
+    """
+    threshold = app.config['OUTPUT_SPOOL_THRESHOLD']
+    output = tempfile.SpooledTemporaryFile(max_size=threshold)
+    try:
+        with _track_conversion('docx', digest, size, md_content):
+            converter.to_docx(md_content, out=output)
+        output_size = output.tell()
+        output.seek(0)
+        if output_size <= threshold:
+            data = output.read()
+            output.close()
+            render_cache.put(key, data)
+            return data
+        render_cache.put_file(key, output, output_size)
+        output.seek(0)
+        return output
+    except BaseException:
+        output.close()
+        raise
+
+
+def _send_output(output, format_type, download_name, cache_status=None, timings=None):
+    """output 为字节串或二进制文件对象；磁盘上的文件由 send_file 发送
+    （WSGI 服务器提供 wsgi.file_wrapper 时可走 sendfile），发送完自动关闭"""
+    response = send_file(
+        BytesIO(output) if isinstance(output, bytes) else output,
+        mimetype=MIMETYPES[format_type],
+        as_attachment=True,
+        download_name=download_name
+    )
+    if response.content_length is None:
+        # send_file 只知道 BytesIO 的大小；磁盘文件从当前位置发送到末尾
+        response.content_length = os.fstat(output.fileno()).st_size - output.tell()
+    if cache_status:
+        response.headers['X-Render-Cache'] = cache_status
+    if timings:
+        response.headers['Server-Timing'] = _server_timing(timings)
+    return response
+
+
+@app.route('/convert', methods=['POST'])
+def convert():
+    file, format_type, error = _check_upload()
+    if error:
+        return error, 400
     
     try:
-        md_content = file.read().decode('utf-8')
-        converter = MarkdownConverter()
-        
+        html_options = _html_options(format_type)
+    except ValueError as e:
+        return str(e), 400
+    
+    try:
+        # Server-Timing：读取上传、查缓存和转换器各阶段的耗时
+        timings = {}
+        request_start = start = time.perf_counter()
+        # 读取上传时已经得到哈希；缓存命中时解码出的文本直接丢弃
+        try:
+            digest, md_content, size = _read_upload(file)
+        except UnicodeDecodeError as e:
+            return f'文件不是 UTF-8 编码: {e}', 400
+        timings['upload'] = time.perf_counter() - start
         filename = secure_filename(file.filename.rsplit('.', 1)[0])
+        download_name = f'{filename}.{format_type}'
         
-        if format_type == 'html':
-            html_content = converter.to_html(md_content, title=filename)
-            from io import BytesIO
-            html_bytes = BytesIO(html_content.encode('utf-8'))
-            return send_file(
-                html_bytes,
-                mimetype='text/html',
-                as_attachment=True,
-                download_name=f'{filename}.html'
-            )
+        # 相同内容、格式、标题和选项的结果直接取缓存，不再调用转换器
+        start = time.perf_counter()
+        key = _cache_key(digest, format_type, filename, html_options,
+                         diagram_cache.lookup(md_content))
+        # 命中超过内存层上限的大输出时得到磁盘上的缓存文件，不读入内存
+        cached = render_cache.open(key)
+        timings['cache'] = time.perf_counter() - start
+        RENDER_CACHE_LOOKUPS.inc(format=format_type, result='miss' if cached is None else 'hit')
+        
+        if cached is not None:
+            timings['total'] = time.perf_counter() - request_start
+            return _send_output(cached, format_type, download_name, 'hit', timings)
         
-        elif format_type == 'docx':
-            docx_bytes = converter.to_docx(md_content)
-            return send_file(
-                docx_bytes,
-                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                as_attachment=True,
-                download_name=f'{filename}.docx'
+        if format_type == 'html':
+            # 先完成转换（出错时返回 500），再流式输出：正文分段编码，不拼出完整的字节串
+            with converter.timed() as stages:
+                with _track_conversion('html', digest, size, md_content):
+                    chunks = converter.iter_html(md_content, title=filename, **html_options)
+            del md_content
+            timings.update(stages)
+            timings['total'] = time.perf_counter() - request_start
+            return Response(
+                _stream_into_cache(key, chunks),
+                mimetype=MIMETYPES['html'],
+                headers={
+                    'Content-Disposition': dump_options_header(
+                        'attachment', {'filename': download_name}),
+                    'X-Render-Cache': 'miss',
+                    'Server-Timing': _server_timing(timings),
+                }
             )
         
-        else:
-            return '不支持的输出格式', 400
+        with converter.timed() as stages:
+            if format_type == 'docx':
+                output = _render_docx(key, md_content, digest, size)
+            else:
+                output = _render(key, md_content, format_type, filename, html_options, digest, size)
+        del md_content
+        timings.update(stages)
+        timings['total'] = time.perf_counter() - request_start
+        return _send_output(output, format_type, download_name, 'miss', timings)
     
     except Exception as e:
         import traceback
@@ -415,6 +766,358 @@ def convert():
         return f'转换失败: {str(e)}', 500
 
 
+# ---------------------------------------------------------------------------
+# 异步任务：提交后立即返回任务 id，转换在后台线程池中执行
+# ---------------------------------------------------------------------------
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """提交转换任务，表单字段同 /convert，另可带 callback_url（任务结束时 POST 状态 JSON）"""
+    file, format_type, error = _check_upload()
+    if error:
+        return jsonify(error=error), 400
+    
+    try:
+        html_options = _html_options(format_type)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    
+    callback_url = request.form.get('callback_url') or None
+    if callback_url:
+        try:
+            job_queue.check_callback(callback_url)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+    
+    try:
+        digest, md_content, size = _read_upload(file)
+    except UnicodeDecodeError as e:
+        return jsonify(error=f'文件不是 UTF-8 编码: {e}'), 400
+    filename = secure_filename(file.filename.rsplit('.', 1)[0])
+    key = _cache_key(digest, format_type, filename, html_options,
+                     diagram_cache.lookup(md_content))
+    
+    def run():
+        data = render_cache.get(key)
+        if data is None:
+            data = _render(key, md_content, format_type, filename, html_options, digest, size)
+        return data
+    
+    info = {
+        'format': format_type,
+        'filename': f'{filename}.{format_type}',
+        'input_size': size,
+    }
+    try:
+        job = job_queue.submit(run, info, callback_url, base_url=request.host_url + 'jobs/')
+    except QueueFull as e:
+        response = jsonify(error=str(e))
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    data = job.to_dict()
+    response = jsonify(data)
+    response.status_code = 202
+    response.headers['Location'] = data['status_url']
+    return response
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """查询任务状态；?wait=秒数 时长轮询，任务结束或超时后返回"""
+    wait = request.args.get('wait', type=float)
+    if wait:
+        job = job_queue.wait(job_id, min(wait, app.config['JOB_MAX_WAIT']))
+    else:
+        job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(error='任务不存在或已过期'), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """下载任务结果；任务未完成返回 409，失败返回 500"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(error='任务不存在或已过期'), 404
+    if job.status != DONE:
+        status = 500 if job.error else 409
+        return jsonify(job.to_dict()), status
+    return _send_output(job.result, job.info['format'], job.info['filename'])
+
+
+@app.route('/jobs/stats')
+def jobs_stats():
+    """任务队列计数"""
+    return jsonify(job_queue.stats())
+
+
+# ---------------------------------------------------------------------------
+# 批量转换：多个文件在进程池中并行转换，结果边完成边写入 ZIP 流式返回
+# ---------------------------------------------------------------------------
+
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def _get_batch_pool():
+    """进程池在第一次批量请求时创建，之后复用"""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ProcessPoolExecutor(max_workers=app.config['BATCH_WORKERS'])
+        return _batch_pool
+
+
+class _ZipStream:
+    """ZipFile 的只写输出目标：不支持 seek，zipfile 会改用数据描述符，
+    每个条目写完即可把已写出的字节交给响应"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry_stem(filename, used):
+    """ZIP 条目名（保留中文，去掉路径；重名时追加序号）"""
+    stem = os.path.basename(filename.replace('\\', '/')).rsplit('.', 1)[0].strip() or 'document'
+    name, n = stem, 1
+    while name in used:
+        n += 1
+        name = f'{stem} ({n})'
+    used.add(name)
+    return name
+
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """批量转换：表单字段 files（可多个）和 format，返回 ZIP；单个文件失败时 ZIP 中附带 .error.txt"""
+    files = request.files.getlist('files')
+    format_type = request.form.get('format', 'html')
+    if not files:
+        return '未上传文件', 400
+    if len(files) > app.config['BATCH_MAX_FILES']:
+        return f'单次最多 {app.config["BATCH_MAX_FILES"]} 个文件', 400
+    if format_type not in MIMETYPES:
+        return '不支持的输出格式', 400
+    try:
+        html_options = _html_options(format_type)
+    except ValueError as e:
+        return str(e), 400
+    
+    used = set()
+    items = []  # (条目名, Markdown 原始字节或 None, 缓存键, 已有图片的图表, 错误信息)
+    for file in files:
+        stem = _entry_stem(file.filename or '', used)
+        if not (file.filename or '').endswith(('.md', '.markdown')):
+            items.append((stem, None, None, None, f'不支持的文件格式: {file.filename}'))
+            continue
+        raw = file.read()
+        # 图表图片随任务一起交给工作进程（工作进程访问不到本进程的缓存）
+        diagrams = (diagram_cache.lookup(raw.decode('utf-8', 'replace'))
+                    if b'mermaid' in raw else {})
+        key = _cache_key(hash_source(raw), format_type, stem, html_options, diagrams)
+        items.append((stem, raw, key, diagrams, None))
+    
+    return Response(
+        _stream_batch(items, format_type, html_options),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': dump_options_header(
+                'attachment', {'filename': f'md2everything-{format_type}.zip'}),
+        }
+    )
+
+
+def _stream_batch(items, format_type, html_options):
+    """提交全部转换后，先写入缓存命中和无效文件，再按完成顺序写入其余结果"""
+    # DOCX/PDF 本身已压缩，只有 HTML 值得再压缩
+    compression = zipfile.ZIP_DEFLATED if format_type == 'html' else zipfile.ZIP_STORED
+    stream = _ZipStream()
+    futures = {}
+    try:
+        with zipfile.ZipFile(stream, 'w', compression) as archive:
+            ready = []
+            for stem, raw, key, diagrams, error in items:
+                entry = f'{stem}.{format_type}'
+                if error:
+                    ready.append((f'{entry}.error.txt', error.encode('utf-8')))
+                    continue
+                data = render_cache.get(key)
+                if data is not None:
+                    ready.append((entry, data))
+                    continue
+                job = (entry, raw, format_type, stem, html_options, diagrams)
+                futures[_get_batch_pool().submit(render_worker, job)] = (entry, key, len(raw))
+                CONVERSIONS_IN_FLIGHT.inc(format=format_type)
+            
+            for entry, data in ready:
+                archive.writestr(entry, data)
+                yield stream.take()
+            
+            for future in as_completed(futures):
+                entry, key, size = futures.pop(future)
+                CONVERSIONS_IN_FLIGHT.dec(format=format_type)
+                try:
+                    _, data, seconds, error = future.result()
+                except Exception as e:
+                    data, error = None, f'{type(e).__name__}: {e}'
+                if error:
+                    CONVERSION_ERRORS.inc(format=format_type)
+                    archive.writestr(f'{entry}.error.txt', error.encode('utf-8'))
+                else:
+                    CONVERSION_SECONDS.observe(seconds, format=format_type,
+                                               input_size=_size_class(size))
+                    render_cache.put(key, data)
+                    archive.writestr(entry, data)
+                yield stream.take()
+        yield stream.take()
+    finally:
+        # 客户端中途断开时取消还没开始的转换
+        for future in futures:
+            future.cancel()
+            CONVERSIONS_IN_FLIGHT.dec(format=format_type)
+
+
+@app.route('/assets/<name>')
+def asset(name):
+    """HTML 导出引用的样式和脚本，文件名含内容哈希，可永久缓存"""
+    if name not in HTML_ASSETS:
+        return '资源不存在', 404
+    data, mimetype = HTML_ASSETS[name]
+    response = Response(data, mimetype=mimetype)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.set_etag(name)
+    return response.make_conditional(request)
+
+
+def _stream_into_cache(key, chunks):
+    """边产出边收集分块，完整输出后写入渲染缓存
+
+    输出超过内存缓存上限时不再收集（内存层也放不下），避免为缓存多占一份输出大小的内存。
+    """
+    parts = []
+    size = 0
+    limit = render_cache.max_memory_bytes
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size > limit:
+                parts = None
+            else:
+                parts.append(chunk)
+        yield chunk
+    if parts is not None:
+        data = b''.join(parts)
+        del parts
+        render_cache.put(key, data)
+
+
+@app.route('/preview')
+def preview():
+    """前端预览页（index.html）：在浏览器中渲染 Mermaid 图表并上传到 /mermaid"""
+    return send_file(os.path.join(app.root_path, 'index.html'), mimetype='text/html')
+
+
+@app.route('/mermaid', methods=['POST'])
+def upload_diagram():
+    """上传浏览器渲染好的 Mermaid 图表：表单字段 source（图表源码）和文件 svg / png（至少一个）
+
+    图片按源码哈希保存，之后转换包含相同图表的文档时嵌入图片
+    （HTML 优先用 SVG，DOCX 需要 PNG）。已有的图片不会被替换：
+    stored 为本次保存的类型，existing 为已存在、保留原图的类型。
+    """
+    source = request.form.get('source', '')
+    if not source.strip():
+        return jsonify(error='缺少图表源码'), 400
+    uploads = {kind: request.files[kind] for kind in DIAGRAM_TYPES if kind in request.files}
+    if not uploads:
+        return jsonify(error='未上传图片（svg 或 png）'), 400
+    
+    digest = None
+    stored, existing = [], []
+    try:
+        for kind, file in uploads.items():
+            # 多读一个字节，超过上限时由 put() 报错
+            digest, saved = diagram_cache.put(
+                source, kind, file.read(diagram_cache.max_image_bytes + 1))
+            (stored if saved else existing).append(kind)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(digest=digest, stored=sorted(stored), existing=sorted(existing),
+                   urls={kind: f'{request.host_url}mermaid/{digest}.{kind}' for kind in uploads})
+
+
+@app.route('/mermaid/<digest>.<kind>')
+def diagram_image(digest, kind):
+    """已上传的图表图片"""
+    data = diagram_cache.get_image(digest, kind)
+    if data is None:
+        return '图表不存在', 404
+    response = Response(data, mimetype=DIAGRAM_TYPES[kind])
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    # 上传的 SVG 不可信：直接打开时也不允许执行其中的脚本
+    response.headers['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'"
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 文本格式的运行指标"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+def _is_local_request():
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.route('/profiles')
+def list_profiles():
+    """最近保存的剖析结果（仅本机访问）"""
+    if not _is_local_request():
+        return jsonify(error='只允许本机访问'), 403
+    profiles = profiler.store.list()
+    for meta in profiles:
+        meta['download_url'] = request.host_url + 'profiles/' + meta['id']
+    return jsonify(profiles=profiles, counters=profiler.stats())
+
+
+@app.route('/profiles/<profile_id>')
+def download_profile(profile_id):
+    """下载剖析数据：cProfile 为 .prof（pstats/snakeviz），调用栈采样为 .folded（火焰图）"""
+    if not _is_local_request():
+        return jsonify(error='只允许本机访问'), 403
+    found = profiler.store.get(profile_id)
+    if found is None:
+        return jsonify(error='剖析结果不存在或已被清理'), 404
+    path, _ = found
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=os.path.basename(path))
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    """渲染缓存与代码高亮缓存的命中/未命中/淘汰计数"""
+    stats = render_cache.stats()
+    stats['highlight'] = highlight_cache.stats()
+    stats['mermaid'] = diagram_cache.stats()
+    return jsonify(stats)
+
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("  Markdown 转换工具已启动")
@@ -423,7 +1126,9 @@ if __name__ == '__main__':
     print("\n  支持格式:")
     print("     - HTML (通过浏览器打印可转为 PDF)")
     print("     - Word (DOCX)")
-    print("\n  完整 Mermaid 图表支持请使用 index.html")
+    print("     - PDF (服务端直接生成，需要中文字体，可用 MD2E_PDF_FONT 指定)")
+    print("\n  Mermaid 图表: 在 http://localhost:5000/preview 中预览后，导出时自动嵌入图表")
     print("\n  按 Ctrl+C 停止服务\n")
     
+    warm_up()
     app.run(debug=True, host='0.0.0.0', port=5000)
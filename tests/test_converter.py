@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""转换器的回归测试：python -m pytest tests"""
+
+import os
+import pathlib
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from converter import IncrementalRenderer, MarkdownConverter  # noqa: E402
+
+
+def test_abbreviations_do_not_leak_between_pooled_conversions():
+    converter = MarkdownConverter(pool_size=1)
+    first = converter._convert_markdown('*[HTML]: Secret leaked\n\nHTML\n')
+    assert '<abbr title="Secret leaked">HTML</abbr>' in first
+
+    second = converter._convert_markdown('unrelated HTML doc\n')
+    assert '<abbr' not in second
+    assert converter._pool.created == 1
+    with converter._pool.borrow() as md:
+        assert not [item.name for item in md.inlinePatterns._priority
+                    if item.name.startswith('abbr-')]
+
+
+def _normalized(html):
+    return re.sub(r'>\s+<', '><', html).strip()
+
+
+def _bundled_reports():
+    root = pathlib.Path(__file__).resolve().parent.parent
+    files = sorted(root.glob('*.md')) + sorted(root.glob('task*/*.md'))
+    return [f for f in files if f.name.lower() != 'readme.md']
+
+
+@pytest.mark.parametrize('text', [
+    'Term\n\n: def\n',
+    'T1\n\n: d1\n\nT2\n\n: d2\n\nPara after\n\n# H\n',
+    '*[HTML]: Hyper Text\n\nHTML here\n\n## x\n\nHTML again\n',
+    '```\n*[X]: not an abbreviation\n```\n\nX text\n',
+    '<!--\n\nx\n\n-->\n\npara\n',
+    'Para\n\nOther [x]\n[x]: http://a\n\nSee [x] too\n',
+    '[x]: http://a\nfoo\n\nbar [x]\n',
+    'Para [^1]\n[^1]: note\n\nAgain [^1]\n',
+    '# H {#custom}\n\ntext\n\n# H {#custom}\n\n# Custom\n',
+    '# Custom\n\n# H {#custom}\n\n[TOC]\n',
+] + [path.read_text(encoding='utf-8') for path in _bundled_reports()])
+def test_incremental_render_matches_full_render(text):
+    converter = MarkdownConverter()
+    full = converter._convert_markdown(text)
+    incremental = IncrementalRenderer(converter).render_body(text)
+    assert _normalized(incremental) == _normalized(full)
+
+
+def test_docx_text_is_unescaped():
+    from docx import Document
+
+    md = ('# GET /profiles/<id>\n\nuse `a < b && c` and A&B &copy;\n\n'
+          '| x |\n|---|\n| `<t>` & u |\n\n```\nliteral &amp;\n```\n')
+    doc = Document(MarkdownConverter().to_docx(md))
+    texts = [p.text for p in doc.paragraphs]
+    assert 'use a < b && c and A&B ©' in texts
+    assert 'literal &amp;' in texts
+    assert doc.tables[0].cell(1, 0).text == '<t> & u'
+
+
+def test_mermaid_inside_other_fence_stays_code():
+    from mermaid_ext import mermaid_sources
+
+    md = ('````markdown\n```mermaid\ngraph TD; A-->B\n```\n````\n\n'
+          '```mermaid\ngraph TD; C-->D\n```\n')
+    html = MarkdownConverter()._convert_markdown(md)
+    assert html.count('mermaid-note') == 1
+    assert 'A--&gt;B' in html
+    assert mermaid_sources(md) == ['graph TD; C-->D\n']
+
+
+def test_batch_rejects_colliding_outputs(tmp_path, capsys):
+    from converter import batch_main
+
+    for name in ('a', 'b'):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'x.md').write_text(f'# {name}\n', encoding='utf-8')
+    out = tmp_path / 'out'
+    assert batch_main([str(tmp_path / 'a'), str(tmp_path / 'b'), '-o', str(out)]) == 1
+    assert '输出路径相同' in capsys.readouterr().out
+    assert not out.exists()
+
+
+def test_cli_reports_non_utf8_input(tmp_path, capsys):
+    from converter import main
+
+    source = tmp_path / 'gbk.md'
+    source.write_bytes('# 标题\n'.encode('gbk'))
+    assert main([str(source), str(tmp_path / 'gbk.html')]) == 1
+    output = capsys.readouterr().out
+    assert 'UTF-8' in output
+    assert '不支持的格式' not in output
+
+
+def test_docx_save_without_private_package_writer(monkeypatch):
+    import zipfile
+    from io import BytesIO
+
+    import docx_writer
+
+    converter = MarkdownConverter()
+    converter.docx_compression = 0
+    md = '# 标题\n\n正文 `code`\n\n| a | b |\n|---|---|\n| 1 | 2 |\n'
+    direct = zipfile.ZipFile(converter.to_docx(md))
+    monkeypatch.setattr(docx_writer, '_HAS_PACKAGE_WRITER', False)
+    repacked = zipfile.ZipFile(BytesIO(converter.to_docx(md).getvalue()))
+    assert repacked.namelist() == direct.namelist()
+    assert all(info.compress_type == zipfile.ZIP_STORED for info in repacked.infolist())
+    assert repacked.read('word/document.xml') == direct.read('word/document.xml')
+
+
+def test_minify_keeps_space_before_inline_elements():
+    from converter import minify_html
+
+    html = '<p><em>a</em> <sup id="fnref:1"><a href="#fn:1">1</a></sup></p>\n<p>b</p>'
+    assert minify_html(html) == '<p><em>a</em> <sup id="fnref:1"><a href="#fn:1">1</a></sup></p><p>b</p>'
+
+
+def _png(width, height):
+    """最小的 RGB PNG（不依赖 Pillow）"""
+    import struct
+    import zlib
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    raw = b''.join(b'\x00' + b'\x80\x80\x80' * width for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+
+def test_docx_embeds_images_outside_top_level_paragraphs(tmp_path):
+    import zipfile
+
+    from image_embed import ImageLoader
+
+    (tmp_path / 'a.png').write_bytes(_png(4, 3))
+    md = ('- item ![a](a.png)\n\n| x | y |\n|---|---|\n| ![a](a.png) | t |\n\n'
+          '> quote ![a](a.png)\n\n<div><img src="a.png"></div>\n\ninline <img src=\'a.png\'>\n')
+    converter = MarkdownConverter(image_loader=ImageLoader(max_memory_bytes=0))
+    data = converter.to_docx(md, base_dir=str(tmp_path))
+    document = zipfile.ZipFile(data).read('word/document.xml').decode('utf-8')
+    assert document.count('<pic:pic') == 5
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""异步任务队列的回归测试：python -m pytest tests"""
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import DONE, FAILED, JobQueue, QueueFull, resolve_callback  # noqa: E402
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(max_workers=1)
+    yield queue
+    queue.shutdown()
+
+
+@pytest.mark.parametrize('url', [
+    'ftp://example.com/done',
+    'http://127.0.0.1:9000/done',
+    'http://localhost/done',
+    'http://169.254.169.254/latest/meta-data',
+    'http://10.0.0.5/hook',
+    'http://[::1]/hook',
+    'http://[::ffff:127.0.0.1]/hook',
+])
+def test_callback_rejects_internal_addresses(url):
+    with pytest.raises(ValueError):
+        resolve_callback(url)
+
+
+def test_callback_allowlist():
+    _, port, address = resolve_callback('http://127.0.0.1:9000/done', {'127.0.0.1'})
+    assert (port, address) == (9000, '127.0.0.1')
+    with pytest.raises(ValueError):
+        resolve_callback('http://localhost:9000/done', {'127.0.0.1'})
+
+
+class _Stub(BaseHTTPRequestHandler):
+    """记录收到的回调；路径为 /redirect 时返回 302"""
+
+    received = []
+
+    def do_POST(self):
+        self.received.append((self.path, self.rfile.read(int(self.headers['Content-Length']))))
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/done')
+        else:
+            self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = HTTPServer(('127.0.0.1', 0), _Stub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _Stub.received.clear()
+    yield server.server_port
+    server.shutdown()
+
+
+def test_callback_is_sent_without_following_redirects(queue, stub):
+    queue.callback_hosts = {'127.0.0.1'}
+    for path in ('/done?x=1', '/redirect'):
+        job = queue.submit(lambda: b'ok', callback_url=f'http://127.0.0.1:{stub}{path}')
+        queue.wait(job.id, 5)
+    queue.shutdown()
+    stats = queue.stats()
+    assert [path for path, _ in _Stub.received] == ['/done?x=1', '/redirect']
+    assert stats['callbacks_sent'] == 1
+    assert stats['callbacks_failed'] == 1
+
+
+def test_results_are_evicted_oldest_first_over_byte_cap(queue):
+    queue.max_result_bytes = 25
+    jobs = []
+    for _ in range(4):
+        jobs.append(queue.submit(lambda: b'x' * 10))
+        assert queue.wait(jobs[-1].id, 5).status == DONE
+    assert [queue.get(job.id) is not None for job in jobs] == [False, False, True, True]
+    stats = queue.stats()
+    assert stats['stored_bytes'] == 20
+    assert stats['evicted'] == 2
+
+
+def test_finished_jobs_expire_after_ttl(queue):
+    queue.ttl = 0.05
+    job = queue.submit(lambda: b'ok')
+    assert queue.wait(job.id, 5).status == DONE
+    time.sleep(0.1)
+    assert queue.get(job.id) is None
+    stats = queue.stats()
+    assert stats['expired'] == 1
+    assert stats['stored'] == 0 and stats['stored_bytes'] == 0
+
+
+def test_full_queue_rejects_until_a_job_finishes(queue):
+    queue.max_pending = 1
+    release = threading.Event()
+    blocked = queue.submit(lambda: b'ok' if release.wait(5) else b'')
+    with pytest.raises(QueueFull):
+        queue.submit(lambda: b'rejected')
+    release.set()
+    assert queue.wait(blocked.id, 5).status == DONE
+    failed = queue.submit(lambda: 1 / 0)
+    assert queue.wait(failed.id, 5).status == FAILED
+    stats = queue.stats()
+    assert (stats['rejected'], stats['done'], stats['failed']) == (1, 1, 1)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""大文档模式的回归测试：python -m pytest tests"""
+
+import io
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import large_document  # noqa: E402
+from converter import MarkdownConverter  # noqa: E402
+
+
+def _body(html):
+    return re.sub(r'>\s+<', '><', html[html.index('<body'):]).strip()
+
+
+@pytest.mark.parametrize('text', [
+    '# A\n\npara\n\n<div>\n\n# inside\n\n</div>\n\n# B\n\nx\n',
+    '# A\n\n<!--\n\n# hidden\n\n-->\n\n# B\n',
+    '# A\n\nref [^n] here\n\n# B\n\nagain [^n] and [^m]\n\n# C\n\n'
+    '[^n]: note n\n[^m]: note m\n[^u]: unused\n',
+    '# H {#custom}\n\n# H {#custom}\n\n# Custom\n',
+])
+def test_chunked_html_matches_full_render(text):
+    converter = MarkdownConverter()
+    out = io.BytesIO()
+    # chunk_bytes=1：每个可切分的标题处都切开
+    large_document.write_html(converter, text.encode('utf-8'), out, chunk_bytes=1)
+    assert _body(out.getvalue().decode('utf-8')) == _body(converter.to_html(text))
+
+
+def test_no_boundaries_inside_html_blocks():
+    data = b'# A\n\n<div>\n\n# inside\n\n</div>\n\n# B\n\n<div>\n\n# unclosed\n'
+    chunks = list(large_document.iter_chunks(data, chunk_bytes=1))
+    assert chunks == ['# A\n\n<div>\n\n# inside\n\n</div>\n\n',
+                      '# B\n\n<div>\n\n# unclosed\n']
+
+
+def test_chunked_docx_matches_full_render(tmp_path):
+    import zipfile
+
+    from docx import Document
+    from test_converter import _png
+
+    (tmp_path / 'a.png').write_bytes(_png(4, 3))
+    text = '# A\n\n![a](a.png)\n\n# B\n\npara\n\n# C\n\n![a](a.png) and ![a](a.png)\n'
+    converter = MarkdownConverter()
+    out = io.BytesIO()
+    large_document.write_docx(converter, text.encode('utf-8'), out,
+                              base_dir=str(tmp_path), chunk_bytes=1)
+    full = converter.to_docx(text, base_dir=str(tmp_path))
+
+    def paragraphs(data):
+        return [p.text for p in Document(data).paragraphs]
+
+    assert paragraphs(out) == paragraphs(full)
+    # 图片 id 跨分块顺延，与整篇写入相同
+    document = zipfile.ZipFile(out).read('word/document.xml').decode('utf-8')
+    assert re.findall(r'<wp:docPr id="(\d+)"', document) == ['1', '2', '3']
+
+
+def test_body_spool_rolls_over_to_disk():
+    from docx import Document
+    from docx_writer import BodySpool, save_document
+
+    doc = Document()
+    with BodySpool(doc, max_memory_bytes=64) as body:
+        for i in range(3):
+            doc.add_paragraph(f'段落 {i} ' + 'x' * 40)
+            body.flush()
+            # 写出的正文从文档树中移除，只留下 sectPr
+            assert len(doc.paragraphs) == 0
+        assert body._file._rolled
+        out = io.BytesIO()
+        save_document(doc, out, body=body)
+    assert [p.text for p in Document(out).paragraphs] == [
+        f'段落 {i} ' + 'x' * 40 for i in range(3)]
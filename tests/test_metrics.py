@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""运行指标文本输出的回归测试：python -m pytest tests"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry  # noqa: E402
+
+
+def test_counter_and_gauge_text():
+    registry = MetricsRegistry()
+    counter = registry.counter('md2e_requests_total', '请求数', ['format'])
+    gauge = registry.gauge('md2e_in_flight', '进行中')
+    counter.inc(format='pdf')
+    counter.inc(2, format='html')
+    gauge.inc(3)
+    gauge.dec()
+    assert registry.render() == (
+        '# HELP md2e_requests_total 请求数\n'
+        '# TYPE md2e_requests_total counter\n'
+        'md2e_requests_total{format="html"} 2\n'
+        'md2e_requests_total{format="pdf"} 1\n'
+        '# HELP md2e_in_flight 进行中\n'
+        '# TYPE md2e_in_flight gauge\n'
+        'md2e_in_flight 2\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('md2e_seconds', '耗时', ['format'], buckets=[0.1, 1])
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, format='html')
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'md2e_seconds_bucket{format="html",le="0.1"} 1',
+        'md2e_seconds_bucket{format="html",le="1"} 3',
+        'md2e_seconds_bucket{format="html",le="+Inf"} 4',
+        'md2e_seconds_sum{format="html"} 6.05',
+        'md2e_seconds_count{format="html"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter('c', 'doc', ['name']).inc(name='a"b\\c\nd')
+    assert 'c{name="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+
+def test_wrong_labels_are_rejected():
+    counter = MetricsRegistry().counter('c', 'doc', ['format'])
+    with pytest.raises(ValueError):
+        counter.inc(fmt='html')
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""渲染缓存的回归测试：python -m pytest tests"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render_cache import RenderCache  # noqa: E402
+
+
+def test_memory_lru_evicts_least_recently_used():
+    cache = RenderCache(max_memory_items=2)
+    cache.put('a', b'1')
+    cache.put('b', b'2')
+    assert cache.get('a') == b'1'   # a 变为最近使用，淘汰 b
+    cache.put('c', b'3')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1' and cache.get('c') == b'3'
+    stats = cache.stats()
+    assert stats['memory_evictions'] == 1
+    assert stats['memory_items'] == 2
+
+
+def test_memory_lru_respects_byte_limit():
+    cache = RenderCache(max_memory_bytes=10)
+    cache.put('a', b'x' * 6)
+    cache.put('b', b'y' * 6)
+    cache.put('big', b'z' * 11)   # 超过上限的条目不进入内存层
+    assert cache.get('a') is None and cache.get('big') is None
+    assert cache.stats()['memory_bytes'] == 6
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    cache = RenderCache(str(tmp_path), max_memory_items=1)
+    cache.put('a', b'first')
+    cache.put('b', b'second')   # a 被挤出内存层，仍在磁盘上
+    assert cache.get('a') == b'first'
+    assert cache.stats()['disk_hits'] == 1
+
+    restarted = RenderCache(str(tmp_path))
+    assert restarted.stats()['disk_items'] == 2
+    assert restarted.get('b') == b'second'
+    assert restarted.stats()['disk_hits'] == 1
+
+
+def test_disk_tier_evicts_oldest_over_byte_limit(tmp_path):
+    cache = RenderCache(str(tmp_path), max_memory_items=1, max_disk_bytes=10)
+    cache.put('a', b'x' * 6)
+    cache.put('b', b'y' * 6)
+    stats = cache.stats()
+    assert stats['disk_evictions'] == 1
+    assert stats['disk_bytes'] == 6
+    assert 'a' not in cache and 'b' in cache
+    assert not os.path.exists(os.path.join(str(tmp_path), 'a', 'a'))
+
+
+def test_open_streams_large_entries_from_disk(tmp_path):
+    cache = RenderCache(str(tmp_path), max_memory_bytes=4)
+    cache.put('k', b'0123456789')
+    assert cache.stats()['memory_items'] == 0
+    with cache.open('k') as f:
+        assert f.name.endswith('k')
+        assert f.read() == b'0123456789'
+    assert cache.open('missing') is None
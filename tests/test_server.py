@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Web 服务的回归测试：python -m pytest tests"""
+
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MD2E_CACHE_DIR', tempfile.mkdtemp(prefix='md2e-test-cache-'))
+os.environ.setdefault('MD2E_MERMAID_DIR', tempfile.mkdtemp(prefix='md2e-test-mermaid-'))
+
+from server import app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize('endpoint', ['/convert', '/jobs'])
+def test_non_utf8_upload_is_rejected(client, endpoint):
+    data = {'file': (io.BytesIO('# 标题\n'.encode('gbk')), 'gbk.md'), 'format': 'html'}
+    response = client.post(endpoint, data=data)
+    assert response.status_code == 400
+    assert 'UTF-8' in response.get_data(as_text=True)
+
+
+def _svg(label):
+    return f'<svg xmlns="http://www.w3.org/2000/svg"><text>{label}</text></svg>'.encode('utf-8')
+
+
+def test_mermaid_upload_does_not_replace_existing_image(client):
+    source = 'graph TD; first-write-wins-test-->B'
+    first = client.post('/mermaid', data={'source': source,
+                                          'svg': (io.BytesIO(_svg('original')), 'd.svg')})
+    assert first.status_code == 200
+    assert first.get_json()['stored'] == ['svg']
+
+    second = client.post('/mermaid', data={'source': source,
+                                           'svg': (io.BytesIO(_svg('replaced')), 'd.svg')})
+    assert second.get_json()['stored'] == []
+    assert second.get_json()['existing'] == ['svg']
+
+    image = client.get(f'/mermaid/{first.get_json()["digest"]}.svg')
+    assert b'original' in image.data
+
+
+def test_job_callback_to_internal_address_is_rejected(client):
+    data = {'file': (io.BytesIO(b'# x\n'), 'x.md'), 'format': 'html',
+            'callback_url': 'http://169.254.169.254/latest/meta-data'}
+    response = client.post('/jobs', data=data)
+    assert response.status_code == 400
+    assert '内网' in response.get_json()['error']
+
+
+def test_html_conversion_error_is_reported_before_streaming(client, monkeypatch):
+    import server
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(server.converter, '_convert_markdown', fail)
+    data = {'file': (io.BytesIO(b'# conversion error test\n'), 'err.md'), 'format': 'html'}
+    response = client.post('/convert', data=data)
+    assert response.status_code == 500
+    assert 'boom' in response.get_data(as_text=True)
+
+
+def test_html_is_streamed_with_conversion_timings(client):
+    data = {'file': (io.BytesIO(b'# streamed timing test\n'), 'ok.md'), 'format': 'html'}
+    response = client.post('/convert', data=data)
+    assert response.status_code == 200
+    assert '<h1 id="streamed-timing-test">' in response.get_data(as_text=True)
+    assert 'markdown.blockparser' in response.headers['Server-Timing']
+
+
+def test_diagram_lookup_counts_per_diagram():
+    from diagram_cache import DiagramCache
+
+    cache = DiagramCache()
+    cache.put('graph TD; A-->B', 'svg', _svg('a'))
+    md = '```mermaid\ngraph TD; A-->B\n```\n\n```mermaid\ngraph TD; C-->D\n```\n'
+    for _ in range(3):
+        assert list(cache.lookup(md).values()) == [{'svg': _svg('a')}]
+    stats = cache.stats()
+    assert stats['misses'] == 0
+    assert stats['hits'] == 3
+    assert (stats['diagram_hits'], stats['diagram_misses']) == (3, 3)
+
+
+def test_upload_decodes_characters_split_across_chunks():
+    import server
+    from werkzeug.datastructures import FileStorage
+
+    source = ('a' * (server.UPLOAD_CHUNK_SIZE - 1) + '标题\n').encode('utf-8')
+    digest, text, size = server._read_upload(FileStorage(io.BytesIO(source), 'split.md'))
+    assert text == source.decode('utf-8')
+    assert size == len(source)
+
+
+def test_batch_reports_failed_files_as_error_entries(client):
+    import zipfile
+
+    data = {'format': 'html', 'files': [
+        (io.BytesIO('# 正常\n'.encode('utf-8')), 'good.md'),
+        (io.BytesIO(b'plain text'), 'notes.txt'),
+        (io.BytesIO('# 标题\n'.encode('gbk')), 'gbk.md'),
+    ]}
+    response = client.post('/batch', data=data)
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+    assert sorted(archive.namelist()) == ['gbk.html.error.txt', 'good.html',
+                                          'notes.html.error.txt']
+    assert '正常' in archive.read('good.html').decode('utf-8')
+    assert 'notes.txt' in archive.read('notes.html.error.txt').decode('utf-8')
+    assert 'UnicodeDecodeError' in archive.read('gbk.html.error.txt').decode('utf-8')
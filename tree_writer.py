@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Markdown 元素树遍历的公共部分
+DOCX、PDF 等输出共用的文本提取和 htmlStash 占位符处理
+"""
+
+import html
+import re
+
+from markdown.util import AMP_SUBSTITUTE, HTML_PLACEHOLDER_RE
+
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def _unescape(text):
+    """序列化前的文本 -> 显示出来的字符（与 HTML 输出在浏览器中看到的一致）"""
+    if '\x02' in text:
+        text = text.replace(AMP_SUBSTITUTE, '&')
+    return html.unescape(text) if '&' in text else text
+
+
+class TreeWriter:
+    """遍历 python-markdown 树处理器输出的 ElementTree
+
+    代码块和原始 HTML 在树中只是 htmlStash 的占位符，
+    需要在 Markdown 实例 reset() 之前通过 html_stash 取回原始内容。
+    """
+
+    def __init__(self, html_stash):
+        self.stash = html_stash.rawHtmlBlocks
+        self._stash_text = {}
+
+    def write(self, root):
+        """写入整棵树"""
+        self._process_element(root)
+
+    def _process_element(self, element):
+        raise NotImplementedError
+
+    def _stash_item_text(self, index):
+        """htmlStash 中第 index 项的纯文本（带缓存）"""
+        text = self._stash_text.get(index)
+        if text is None:
+            item = self.stash[index]
+            if isinstance(item, str):
+                text = html.unescape(_TAG_RE.sub('', item))
+            else:
+                text = ''.join(item.itertext())
+            self._stash_text[index] = text
+        return text
+
+    def _text(self, element):
+        """元素及其子树的纯文本（一次遍历，占位符替换为原始内容的文本）
+
+        树中的文本是序列化前的形式：行内代码等已转义为 &lt; 之类的实体，
+        序列化时原样输出，浏览器显示为对应字符；这里同样还原为字符。
+        """
+        text = ''.join(element.itertext())
+        if '\x02' not in text:
+            return _unescape(text)
+        # split 结果中奇数位置是占位符序号；取回的原始内容已是纯文本，不再还原
+        parts = HTML_PLACEHOLDER_RE.split(text)
+        for i, part in enumerate(parts):
+            parts[i] = self._stash_item_text(int(part)) if i % 2 else _unescape(part)
+        return ''.join(parts)
+
+    def _block_placeholder(self, element):
+        """只包含一个 htmlStash 占位符的段落返回占位符序号，否则返回 None"""
+        if len(element) or not element.text:
+            return None
+        m = HTML_PLACEHOLDER_RE.fullmatch(element.text.strip())
+        if m is None:
+            return None
+        return int(m.group(1))
+
+    def _is_stashed_code(self, index):
+        """占位符是否对应 fenced_code / codehilite 生成的代码块"""
+        item = self.stash[index]
+        return isinstance(item, str) and '<pre' in item
+
+    def _table_rows(self, table_element):
+        """表格各行单元格的纯文本"""
+        return [[self._text(cell).strip() for cell in tr if cell.tag in ('th', 'td')]
+                for tr in table_element.iter('tr')]
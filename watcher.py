@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+监听模式：监视目录中的 Markdown 文件，保存后只重新生成受影响的输出
+Linux 下使用 inotify，其他平台或 inotify 不可用时退回到按修改时间轮询
+"""
+
+import os
+import select
+import struct
+import sys
+import time
+
+from converter import (
+    IncrementalRenderer, MarkdownConverter, MARKDOWN_SUFFIXES, collect_inputs,
+)
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+               | IN_DELETE | IN_DELETE_SELF)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _is_markdown(path):
+    return path.lower().endswith(MARKDOWN_SUFFIXES)
+
+
+def _markdown_files(root):
+    return [source for source, _ in collect_inputs([root])]
+
+
+class InotifyWatcher:
+    """基于 inotify 的目录监视（递归，新建的子目录自动加入）"""
+
+    def __init__(self, root):
+        import ctypes
+        import ctypes.util
+
+        self.root = root
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+        self._watches = {}
+        self._add_tree(root)
+
+    def _add_tree(self, top):
+        for dirpath, _, _ in os.walk(top):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd >= 0:
+                self._watches[wd] = dirpath
+
+    def wait(self, timeout=None):
+        """等待变化，返回变化的 Markdown 文件路径集合（超时返回空集合）"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        data = b''
+        while True:
+            try:
+                data += os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length]
+            offset += _EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出：无法知道丢了哪些事件，全部视为已变化
+                changed.update(_markdown_files(self.root))
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            base = self._watches.get(wd)
+            if base is None or not name:
+                continue
+
+            path = os.path.join(base, os.fsdecode(name.rstrip(b'\0')))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+                    changed.update(_markdown_files(path))
+            elif _is_markdown(path):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """按修改时间轮询的目录监视"""
+
+    def __init__(self, root, interval=0.5):
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for path in _markdown_files(self.root):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout=None):
+        """等待变化，返回变化的 Markdown 文件路径集合（超时返回空集合）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self._scan()
+            changed = {path for path in current.keys() | self._snapshot.keys()
+                       if current.get(path) != self._snapshot.get(path)}
+            self._snapshot = current
+            if changed:
+                return changed
+            if deadline is None:
+                time.sleep(self.interval)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+def create_watcher(root, polling=False, interval=0.5):
+    """优先使用 inotify，不可用时退回轮询"""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root, interval)
+
+
+class WatchBuilder:
+    """常驻进程中的输出生成器：每个 Markdown 文件保留一个增量渲染器"""
+
+    def __init__(self, root, output_dir, formats, embed_images=False):
+        self.root = os.path.abspath(root)
+        self.output_dir = output_dir
+        self.formats = formats
+        self.embed_images = embed_images
+        self.converter = MarkdownConverter()
+        self._renderers = {}
+
+    def output_path(self, source, fmt):
+        rel = os.path.relpath(source, self.root)
+        return os.path.join(self.output_dir, os.path.splitext(rel)[0] + '.' + fmt)
+
+    def build(self, source):
+        """重新生成 source 的全部输出，返回 [(格式, 耗时, 说明)]"""
+        with open(source, 'r', encoding='utf-8') as f:
+            md_content = f.read()
+        title = os.path.splitext(os.path.basename(source))[0]
+
+        results = []
+        for fmt in self.formats:
+            start = time.perf_counter()
+            output = self.output_path(source, fmt)
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            if fmt == 'html':
+                renderer = self._renderers.get(source)
+                if renderer is None:
+                    renderer = self._renderers[source] = IncrementalRenderer(self.converter)
+                html = renderer.to_html(md_content, title=title, base_dir=os.path.dirname(source),
+                                        embed_images=self.embed_images)
+                _write_atomic(output, html.encode('utf-8'))
+                stats = renderer.last_stats
+                note = f'重渲染 {stats["rendered"]}/{stats["blocks"]} 块'
+            elif fmt == 'pdf':
+                _write_atomic(output, self.converter.to_pdf(md_content, title=title).getvalue())
+                note = ''
+            else:
+                # 直接写入临时文件再替换，不在内存中保留整份文档
+                tmp_path = output + '.tmp'
+                self.converter.to_docx(md_content, base_dir=os.path.dirname(source), out=tmp_path)
+                os.replace(tmp_path, output)
+                note = ''
+            results.append((fmt, time.perf_counter() - start, note))
+        return results
+
+    def forget(self, source):
+        self._renderers.pop(source, None)
+
+
+def _write_atomic(path, data):
+    """先写临时文件再替换，浏览器/Word 不会读到写了一半的输出"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _report(builder, source):
+    name = os.path.relpath(source, builder.root)
+    try:
+        results = builder.build(source)
+    except Exception as e:
+        print(f'  ✗ {name}  {type(e).__name__}: {e}', flush=True)
+        return
+    detail = '，'.join(f'{fmt} {seconds * 1000:.1f} ms' + (f'（{note}）' if note else '')
+                      for fmt, seconds, note in results)
+    print(f'  ↻ {name}  {detail}', flush=True)
+
+
+def watch_main(argv):
+    """监听模式：python converter.py watch <目录> -o <输出目录>"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='python converter.py watch',
+        description='监视目录，Markdown 文件保存后自动重新生成输出')
+    parser.add_argument('directory', help='要监视的目录')
+    parser.add_argument('-o', '--output-dir', required=True, help='输出目录')
+    parser.add_argument('-f', '--format', nargs='+', choices=['html', 'docx', 'pdf'],
+                        default=['html'], help='输出格式，可同时指定多个')
+    parser.add_argument('--debounce', type=int, default=200,
+                        help='连续保存的合并窗口（毫秒），默认 200')
+    parser.add_argument('--poll', action='store_true', help='强制使用轮询而不是 inotify')
+    parser.add_argument('--interval', type=float, default=0.5, help='轮询间隔（秒）')
+    parser.add_argument('--embed-images', action='store_true',
+                        help='HTML 中以 data URI 嵌入本地图片（DOCX 总是嵌入）')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f'目录不存在: {args.directory}')
+        return 1
+
+    builder = WatchBuilder(args.directory, args.output_dir, args.format, args.embed_images)
+    watcher = create_watcher(builder.root, args.poll, args.interval)
+    mode = 'inotify' if isinstance(watcher, InotifyWatcher) else f'轮询 {args.interval}s'
+
+    sources = _markdown_files(builder.root)
+    print(f'首次生成 {len(sources)} 个文件...', flush=True)
+    for source in sources:
+        _report(builder, source)
+    print(f'\n正在监视 {builder.root}（{mode}），按 Ctrl+C 停止\n', flush=True)
+
+    debounce = args.debounce / 1000
+    try:
+        while True:
+            changed = watcher.wait()
+            # 防抖：编辑器一次保存可能产生多个事件，等安静下来再统一处理
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                changed |= more
+
+            for source in sorted(changed):
+                if os.path.exists(source):
+                    _report(builder, source)
+                else:
+                    builder.forget(source)
+                    print(f'  - {os.path.relpath(source, builder.root)} 已删除', flush=True)
+    except KeyboardInterrupt:
+        print('\n已停止监视')
+    finally:
+        watcher.close()
+    return 0